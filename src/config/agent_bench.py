@@ -0,0 +1,370 @@
+"""
+Offline benchmark harness for the research agent in deepseek.py.
+
+Runs the real agent loop against two local stand-ins:
+
+- a scripted Ollama server (/api/chat, streaming and non-streaming) that
+  replays each question's turns, tool calls included, with configurable
+  prefill and per-token latency;
+- a fixture web server that serves a DuckDuckGo Lite style results page
+  (/lite?q=...) and the pages it links to (/pages/<slug>).
+
+Each question in the corpus is answered non-interactively and reported with
+its total time, model turns, tool calls and per-stage timing (model, search,
+fetch, scrape, parse). Results are printed as JSON for regression comparison.
+
+Usage:
+    python agent_bench.py
+    python agent_bench.py --corpus questions.json --passes 2 --output run.json
+
+Static fixture pages are read over plain HTTP; the "javascript" page is a
+client-rendered shell that goes through the shared Playwright browser pool,
+so Chromium must be installed for it to return content.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import re
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+STAGES = ("model", "search", "fetch", "scrape", "parse")
+
+# Used when no --corpus is given. "{base}" in a turn is replaced with the
+# fixture server's URL, so scripted tool calls can point at fixture pages.
+DEFAULT_CORPUS = {
+    "pages": {
+        "photosynthesis": {
+            "title": "Photosynthesis - Biology Notes",
+            "text": "Photosynthesis is the process by which green plants use sunlight, water and carbon dioxide "
+                    "to make glucose and oxygen.\nIt takes place in the chloroplasts, which contain chlorophyll.\n"
+                    "The overall equation is 6CO2 + 6H2O -> C6H12O6 + 6O2.\n"
+                    "The light-dependent reactions split water and release oxygen, while the Calvin cycle uses "
+                    "the energy captured to fix carbon dioxide into sugar."
+        },
+        "chlorophyll": {
+            "title": "Chlorophyll and light absorption",
+            "text": "Chlorophyll absorbs red and blue light and reflects green light, which is why leaves look green.\n"
+                    "Plants need sunlight for photosynthesis.\n"
+                    "Leaves also contain carotenoids, yellow and orange pigments that absorb blue-green light and "
+                    "pass the energy on to chlorophyll; they become visible in autumn when chlorophyll breaks down."
+        },
+        "great-zimbabwe": {
+            "title": "Great Zimbabwe - History",
+            "text": "Great Zimbabwe was a medieval city in the south-eastern hills of Zimbabwe.\n"
+                    "It was the capital of a kingdom that traded gold and ivory with the coast between the 11th "
+                    "and 15th centuries.\nIts dry-stone walls were built without mortar."
+        },
+        "fractions": {
+            "title": "Adding fractions",
+            "text": "To add fractions with different denominators, first find a common denominator.\n"
+                    "Rewrite each fraction with that denominator, then add the numerators.\n"
+                    "For example, 1/3 + 1/4: the lowest common denominator is 12, so the sum is 4/12 + 3/12 = 7/12.\n"
+                    "Keep the denominator unchanged and simplify the answer if the numerator and denominator share a factor."
+        },
+        "weather-live": {
+            "title": "Live weather dashboard",
+            "text": "Today's weather in Harare is sunny with a high of 27 degrees.",
+            "javascript": True
+        },
+    },
+    "questions": [
+        {
+            "question": "How does photosynthesis work?",
+            "turns": [
+                '{"tool_call": {"name": "search_and_read", "args": {"query": "photosynthesis chlorophyll", "k": 2}}}',
+                "Plants use sunlight, water and carbon dioxide to make glucose and oxygen in their chloroplasts."
+            ]
+        },
+        {
+            "question": "When was Great Zimbabwe built?",
+            "turns": [
+                '{"tool_call": {"name": "search", "args": {"query": "Great Zimbabwe history"}}}',
+                '{"tool_call": {"name": "scrape_and_read", "args": {"url": "{base}/pages/great-zimbabwe"}}}',
+                "Great Zimbabwe was built and occupied between the 11th and 15th centuries."
+            ]
+        },
+        {
+            "question": "How do I add fractions with different denominators?",
+            "turns": [
+                '{"tool_call": {"name": "search", "args": {"query": "adding fractions denominators"}}}',
+                "Find a common denominator, rewrite both fractions with it, then add the numerators."
+            ]
+        },
+        {
+            "question": "Why are leaves green, and who built Great Zimbabwe?",
+            "turns": [
+                '[{"tool_call": {"name": "scrape_and_read", "args": {"url": "{base}/pages/chlorophyll"}}}, '
+                '{"tool_call": {"name": "search", "args": {"query": "Great Zimbabwe history"}}}]',
+                "Chlorophyll reflects green light; Great Zimbabwe was built by a medieval Shona kingdom."
+            ]
+        },
+        {
+            "question": "What is the weather in Harare today?",
+            "turns": [
+                '{"tool_call": {"name": "scrape_and_read", "args": {"url": "{base}/pages/weather-live"}}}',
+                "It is sunny in Harare today with a high of 27 degrees."
+            ]
+        },
+        {
+            "question": "Say hello to the class.",
+            "turns": ["Hello everyone, welcome to today's lesson!"]
+        },
+    ]
+}
+
+
+def _words(text: str) -> set[str]:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _serve(handler_class, **attrs) -> ThreadingHTTPServer:
+    """Starts a threaded HTTP server on a free local port in a daemon thread."""
+    handler = type(handler_class.__name__, (handler_class,), attrs)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FixtureWebHandler(_QuietHandler):
+    """Serves search results and pages from the corpus."""
+
+    pages = {}
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        parts = urlsplit(self.path)
+        if parts.path == "/lite":
+            query = parse_qs(parts.query).get("q", [""])[0]
+            self._send(200, self._results_page(query).encode("utf-8"), "text/html; charset=utf-8")
+        elif parts.path.startswith("/pages/") and parts.path[len("/pages/"):] in self.pages:
+            page = self.pages[parts.path[len("/pages/"):]]
+            paragraphs = "".join(f"<p>{line}</p>" for line in page["text"].split("\n"))
+            if page.get("javascript"):
+                # A client-rendered app shell: the text only exists after the script runs.
+                html = (f"<html><head><title>{page['title']}</title></head><body><div id=\"root\"></div>"
+                        f"<script>document.getElementById('root').innerHTML = {json.dumps(paragraphs)};</script>"
+                        f"</body></html>")
+            else:
+                html = (f"<html><head><title>{page['title']}</title></head><body>"
+                        f"<nav>Home | Subjects | Login</nav><h1>{page['title']}</h1>{paragraphs}"
+                        f"<footer>Chikoro fixture site</footer></body></html>")
+            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+        else:
+            self._send(404, b"Not found", "text/plain")
+
+    def _results_page(self, query: str) -> str:
+        """DuckDuckGo Lite layout: two navigation tables, then one row per result."""
+        base = f"http://{self.headers.get('Host')}"
+        wanted = _words(query)
+        ranked = sorted(
+            self.pages.items(),
+            key=lambda item: -len(wanted & _words(item[1]["title"] + " " + item[1]["text"]))
+        )
+        rows = []
+        for slug, page in ranked:
+            if not wanted & _words(page["title"] + " " + page["text"]):
+                continue
+            target = quote(f"{base}/pages/{slug}", safe="")
+            rows.append(f'<tr><td><a href="//duckduckgo.com/l/?uddg={target}&amp;rut=x">{page["title"]}</a></td></tr>')
+        return ("<html><body><table><tr><td>nav</td></tr></table><table><tr><td>filters</td></tr></table>"
+                f"<table>{''.join(rows)}</table></body></html>")
+
+
+class StubOllamaHandler(_QuietHandler):
+    """Replays the scripted turns of the question found in the request's first user message."""
+
+    scripts = {}
+    base_url = ""
+    prefill = 0.0
+    per_token = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        messages = body.get("messages", [])
+        question = next((m["content"] for m in messages if m["role"] == "user"), "")
+        turn = sum(1 for m in messages if m["role"] == "assistant")
+        turns = self.scripts.get(question) or ["I don't know."]
+        content = turns[min(turn, len(turns) - 1)].replace("{base}", self.base_url)
+        tokens = re.findall(r"\S+\s*|\s+", content)
+
+        time.sleep(self.prefill)
+        if not body.get("stream", True):
+            time.sleep(self.per_token * len(tokens))
+            reply = {"model": body.get("model"), "message": {"role": "assistant", "content": content}, "done": True}
+            self._send(200, json.dumps(reply).encode("utf-8"), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(self.per_token)
+                self._chunk({"message": {"role": "assistant", "content": token}, "done": False})
+            self._chunk({"message": {"role": "assistant", "content": ""}, "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The agent stops reading once it has a complete tool call
+            self.close_connection = True
+
+    def _chunk(self, payload: dict):
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def _percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1]
+
+
+def run_pass(agent, questions: list[dict], verbose: bool = False) -> list[dict]:
+    """Answers every question once and returns one result record per question."""
+    results = []
+    for item in questions:
+        trace = agent.AgentTrace()
+        output = io.StringIO()
+        started = time.perf_counter()
+        error = None
+        with contextlib.redirect_stdout(sys.stdout if verbose else output):
+            try:
+                answer = agent.run_agent(item["question"], trace=trace)
+            except Exception as e:
+                answer, error = "", f"{type(e).__name__}: {e}"
+        record = {"question": item["question"], "total_seconds": round(time.perf_counter() - started, 4)}
+        record.update(trace.as_dict())
+        record["answer_chars"] = len(answer)
+        if error:
+            record["error"] = error
+        results.append(record)
+    return results
+
+
+def summarize(results: list[dict]) -> dict:
+    """Aggregates per-question records of one pass."""
+    totals = [r["total_seconds"] for r in results]
+    return {
+        "questions": len(results),
+        "errors": sum(1 for r in results if "error" in r),
+        "total_seconds": round(sum(totals), 4),
+        "question_p50": _percentile(totals, 50),
+        "question_p95": _percentile(totals, 95),
+        "turns_mean": round(statistics.mean(r["turns"] for r in results), 2) if results else None,
+        "tool_calls": sum(len(r["tool_calls"]) for r in results),
+        "answer_cache_hits": sum(1 for r in results if r.get("answer_cache") in ("exact", "similar")),
+        "stages": {stage: round(sum(r["stages"].get(stage, 0.0) for r in results), 4) for stage in STAGES},
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark for the research agent loop")
+    parser.add_argument("--corpus", help="JSON file with 'pages' and 'questions' (default: built-in corpus)")
+    parser.add_argument("--passes", type=int, default=1, help="Run the corpus this many times (later passes hit warm caches, answers included)")
+    parser.add_argument("--no-stream", action="store_true", help="Use non-streaming model calls")
+    parser.add_argument("--no-answer-cache", action="store_true",
+                        help="Run the agent loop for every question, even ones answered in an earlier pass")
+    parser.add_argument("--model-prefill-ms", type=float, default=50, help="Stub model delay before the first token")
+    parser.add_argument("--model-token-ms", type=float, default=5, help="Stub model delay per token")
+    parser.add_argument("--web-latency-ms", type=float, default=20, help="Fixture web server delay per request")
+    parser.add_argument("--output", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--verbose", action="store_true", help="Show the agent's own output")
+    args = parser.parse_args(argv)
+
+    corpus = DEFAULT_CORPUS
+    if args.corpus:
+        with open(args.corpus) as f:
+            corpus = json.load(f)
+
+    web = _serve(FixtureWebHandler, pages=corpus["pages"], latency=args.web_latency_ms / 1000)
+    web_url = f"http://127.0.0.1:{web.server_address[1]}"
+    model = _serve(
+        StubOllamaHandler,
+        scripts={q["question"]: q["turns"] for q in corpus["questions"]},
+        base_url=web_url,
+        prefill=args.model_prefill_ms / 1000,
+        per_token=args.model_token_ms / 1000,
+    )
+
+    # Importing the agent pulls in requests, bs4 and playwright; point it at the stand-ins
+    # with fresh in-memory caches so runs do not depend on (or pollute) the on-disk cache.
+    import deepseek as agent
+    from answer_cache import AnswerCache
+    from web_cache import TwoTierCache
+    agent.MODEL_BACKEND = "ollama"
+    agent.OLLAMA_URL = f"http://127.0.0.1:{model.server_address[1]}/api/chat"
+    agent.SEARCH_URL = f"{web_url}/lite"
+    agent.STREAM_RESPONSES = not args.no_stream
+    agent.SEARCH_CACHE = TwoTierCache("search", ttl=agent.SEARCH_CACHE_TTL, path=None)
+    agent.PAGE_CACHE = TwoTierCache("page", ttl=agent.PAGE_CACHE_TTL, path=None)
+    agent.ANSWER_CACHE = AnswerCache(ttl=agent.ANSWER_CACHE_TTL, path=None, similarity=agent.ANSWER_CACHE_SIMILARITY)
+    agent.ANSWER_CACHE_ENABLED = not args.no_answer_cache
+
+    passes = []
+    try:
+        for number in range(1, args.passes + 1):
+            results = run_pass(agent, corpus["questions"], args.verbose)
+            summary = summarize(results)
+            passes.append({"pass": number, "summary": summary, "questions": results})
+            stages = "  ".join(f"{stage} {seconds:.3f}s" for stage, seconds in summary["stages"].items())
+            print(f"pass {number}: {summary['total_seconds']:.3f}s for {summary['questions']} questions, "
+                  f"{summary['turns_mean']} turns/answer, {summary['answer_cache_hits']} cached answers, "
+                  f"errors {summary['errors']} | {stages}", file=sys.stderr)
+    finally:
+        web.shutdown()
+        model.shutdown()
+
+    output = json.dumps({
+        "config": {
+            "corpus": args.corpus or "built-in",
+            "stream": not args.no_stream,
+            "answer_cache": not args.no_answer_cache,
+            "model_prefill_ms": args.model_prefill_ms,
+            "model_token_ms": args.model_token_ms,
+            "web_latency_ms": args.web_latency_ms,
+        },
+        "passes": passes,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
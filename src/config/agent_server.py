@@ -0,0 +1,244 @@
+"""
+Asyncio HTTP service exposing the research agent to many students at once.
+
+One process serves every conversation:
+
+- Sessions (a student's earlier questions and answers) live in a
+  TwoTierCache: an LRU bounded in memory and written through to SQLite, so
+  sessions evicted from memory (or from before a restart) are reloaded on
+  their next message.
+- The model client, browser pool and web caches of deepseek.py are
+  shared by all sessions. Tool calls run on a thread pool of TOOL_THREADS
+  (by default one per admitted question) in place of deepseek.py's small
+  default pool, so one question's searches do not queue behind hundreds
+  of others.
+- At most MAX_CONCURRENT_MODEL_CALLS model requests are in flight (by
+  default the backend's own suggestion: a few for Ollama, many more for
+  vLLM, which batches them); other conversations wait for a slot as
+  coroutines, not threads. Messages to the
+  same session are answered one at a time, in order.
+
+Endpoints:
+    POST   /sessions                   -> {"session_id": ...}
+    POST   /sessions/{id}/messages     {"message": "..."} -> {"answer": ..., ...}
+    GET    /sessions/{id}              -> the session's messages
+    DELETE /sessions/{id}
+    GET    /health
+    GET    /metrics
+
+Usage:
+    python agent_server.py --port 8090
+
+Requires aiohttp (pip install aiohttp).
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from aiohttp import web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+import deepseek
+from metrics import CONTENT_TYPE, REGISTRY
+from web_cache import DEFAULT_CACHE_PATH, TwoTierCache
+
+# --- CONFIGURATION ---
+SERVER_PORT = 8090
+SESSION_STORE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "sessions.sqlite3")  # None = memory only
+SESSION_TTL = 7 * 24 * 60 * 60  # Seconds an idle session is kept
+SESSION_MEMORY_BYTES = 32 * 1024 * 1024  # Sessions held in memory; older ones are reloaded from disk
+SESSION_DISK_BYTES = 1024 * 1024 * 1024  # Size bound for the session table
+SESSION_MAX_MESSAGES = 40  # Messages kept per session (the model sees as many as fit its budget)
+MAX_CONCURRENT_MODEL_CALLS = None  # Model requests in flight across all sessions; None = deepseek.model_backend().concurrency
+MAX_ACTIVE_QUESTIONS = 512  # Questions being answered at once; beyond this, 503 with Retry-After
+TOOL_THREADS = None  # Tool calls running at once across all sessions; None = MAX_ACTIVE_QUESTIONS
+MAX_MESSAGE_CHARS = 4000  # Longest accepted question
+
+SESSIONS = TwoTierCache("sessions", ttl=SESSION_TTL, path=SESSION_STORE_PATH,
+                        max_memory_bytes=SESSION_MEMORY_BYTES, max_disk_bytes=SESSION_DISK_BYTES)
+
+ACTIVE_QUESTIONS = "active_questions"
+MODEL_SLOTS = "model_slots"
+SESSION_LOCKS = "session_locks"
+
+
+class ModelSlots(asyncio.Semaphore):
+    """A semaphore that also reports how many of its slots are taken."""
+
+    def __init__(self, limit: int):
+        super().__init__(limit)
+        self.in_use = 0
+
+    async def acquire(self):
+        await super().acquire()
+        self.in_use += 1
+        return True
+
+    def release(self):
+        self.in_use -= 1
+        super().release()
+
+
+def _error(status: int, message: str, **headers) -> "web.Response":
+    return web.json_response({"error": message}, status=status, headers=headers or None)
+
+
+def _session_lock(app, session_id: str) -> asyncio.Lock:
+    """One lock per session with messages in progress; dropped once nobody holds it."""
+    lock = app[SESSION_LOCKS].get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        app[SESSION_LOCKS][session_id] = lock
+    return lock
+
+
+async def create_session(request):
+    session_id = secrets.token_urlsafe(16)
+    now = time.time()
+    # SQLite writes run off the event loop
+    await asyncio.to_thread(SESSIONS.set, session_id, {"created_at": now, "updated_at": now, "messages": []})
+    return web.json_response({"session_id": session_id}, status=201)
+
+
+async def get_session(request):
+    session_id = request.match_info["session_id"]
+    session = await asyncio.to_thread(SESSIONS.get, session_id)
+    if session is None:
+        return _error(404, "Unknown or expired session")
+    return web.json_response(dict(session, session_id=session_id))
+
+
+async def delete_session(request):
+    session_id = request.match_info["session_id"]
+    await asyncio.to_thread(SESSIONS.delete, session_id)
+    return web.json_response({"deleted": session_id})
+
+
+async def post_message(request):
+    """Answers one question in a session, with the session's earlier messages as context."""
+    session_id = request.match_info["session_id"]
+    try:
+        body = await request.json()
+    except ValueError:
+        return _error(400, "Body must be JSON")
+    message = body.get("message") if isinstance(body, dict) else None
+    if not isinstance(message, str) or not message.strip():
+        return _error(400, "No message provided")
+    if len(message) > MAX_MESSAGE_CHARS:
+        return _error(413, f"Message exceeds {MAX_MESSAGE_CHARS} characters")
+
+    app = request.app
+    if app[ACTIVE_QUESTIONS] >= MAX_ACTIVE_QUESTIONS:
+        return _error(503, "Server busy, try again shortly", **{"Retry-After": "5"})
+
+    app[ACTIVE_QUESTIONS] += 1
+    try:
+        async with _session_lock(app, session_id):
+            session = await asyncio.to_thread(SESSIONS.get, session_id)
+            if session is None:
+                return _error(404, "Unknown or expired session")
+
+            trace = deepseek.AgentTrace()
+            started = time.perf_counter()
+            answer = await deepseek.run_agent_async(message, history=session["messages"], trace=trace,
+                                                    model_slots=app[MODEL_SLOTS])
+            seconds = time.perf_counter() - started
+
+            session["messages"] = (session["messages"] + [
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": answer},
+            ])[-SESSION_MAX_MESSAGES:]
+            session["updated_at"] = time.time()
+            await asyncio.to_thread(SESSIONS.set, session_id, session)
+    finally:
+        app[ACTIVE_QUESTIONS] -= 1
+
+    details = trace.as_dict()
+    return web.json_response({
+        "session_id": session_id,
+        "answer": answer,
+        "turns": details["turns"],
+        "tool_calls": details["tool_calls"],
+        "sources": details["sources"],
+        "answer_cache": details["answer_cache"],
+        "seconds": round(seconds, 3),
+    })
+
+
+async def health(request):
+    app = request.app
+    return web.json_response({
+        "status": "healthy",
+        "active_questions": app[ACTIVE_QUESTIONS],
+        "model_calls_in_flight": app[MODEL_SLOTS].in_use,
+        "sessions": SESSIONS.stats(),
+        "search_cache": deepseek.SEARCH_CACHE.stats(),
+        "page_cache": deepseek.PAGE_CACHE.stats(),
+        "answer_cache": deepseek.ANSWER_CACHE.stats(),
+    })
+
+
+async def metrics(request):
+    return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+def create_app() -> "web.Application":
+    """Builds the aiohttp application with its shared per-process state."""
+    app = web.Application(client_max_size=64 * 1024)
+    app[ACTIVE_QUESTIONS] = 0
+    app[MODEL_SLOTS] = ModelSlots(MAX_CONCURRENT_MODEL_CALLS or deepseek.model_backend().concurrency)
+    app[SESSION_LOCKS] = weakref.WeakValueDictionary()
+    # Tools block on the network and browser, so the pool must cover every admitted question.
+    deepseek.TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=TOOL_THREADS or MAX_ACTIVE_QUESTIONS,
+                                                thread_name_prefix="agent-tool")
+
+    def collect_server_metrics():
+        stats = SESSIONS.stats()
+        return [
+            ("agent_server_active_questions", "gauge", "Questions being answered",
+             [({}, app[ACTIVE_QUESTIONS])]),
+            ("agent_server_model_calls_in_flight", "gauge", "Model requests holding a slot",
+             [({}, app[MODEL_SLOTS].in_use)]),
+            ("agent_server_sessions_in_memory", "gauge", "Sessions held in the memory tier",
+             [({}, stats["memory_entries"])]),
+        ]
+
+    REGISTRY.add_collector(collect_server_metrics)
+
+    async def close_clients(app):
+        await deepseek.ASYNC_HTTP.close()
+        deepseek.TOOL_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+    app.on_cleanup.append(close_clients)
+    app.add_routes([
+        web.post("/sessions", create_session),
+        web.get("/sessions/{session_id}", get_session),
+        web.delete("/sessions/{session_id}", delete_session),
+        web.post("/sessions/{session_id}/messages", post_message),
+        web.get("/health", health),
+        web.get("/metrics", metrics),
+    ])
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the research agent to many concurrent sessions")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args(argv)
+    if not AIOHTTP_AVAILABLE:
+        raise SystemExit("agent_server.py requires aiohttp: pip install aiohttp")
+    print(f"🌐 Agent server listening on http://{args.host}:{args.port}")
+    web.run_app(create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Cache of final answers in front of the research agent.
+
+Students in different classes ask the same questions, and each one used to
+run the whole agent loop of model calls, searches and page reads. Answers
+are now stored in a TwoTierCache (memory LRU over SQLite, with a TTL and a
+size bound) keyed by the normalized question, together with the sources the
+agent read, and a repeat is answered without calling the model.
+
+Near-duplicate questions ("Who built the Great Zimbabwe?" and "who built
+Great Zimbabwe") can share an answer too. Each question is turned into a
+sparse vector of hashed character trigrams and words, with no model or
+external service involved, and the most similar cached question is used when
+its cosine similarity reaches `similarity`. Only questions with the same
+content words and numbers in the same order are compared. The vectors ignore
+word order ("Is Harare bigger than Bulawayo" scores 0.91 against its
+reverse), and a similarity averaged over a long question hardly moves when
+one key word changes ("water conservation" and "soil conservation", "First
+Chimurenga" and "Second Chimurenga"), so the vectors only decide between
+wordings of the same word sequence. Questions about the present ("today",
+"latest", "weather", ...) are neither stored nor served.
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+
+from web_cache import DEFAULT_CACHE_PATH, TwoTierCache
+
+VECTOR_DIMENSIONS = 1 << 20  # Hash space for n-gram features; collisions are negligible at this size
+NGRAM_SIZE = 3
+# Words too common to narrow down the candidates worth comparing.
+STOPWORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "did", "do", "does", "for", "from", "how", "i", "in",
+    "is", "it", "its", "me", "of", "on", "or", "please", "tell", "that", "the", "to", "was", "were", "what",
+    "when", "where", "which", "who", "why", "with", "you",
+))
+# Answers to these go stale within the TTL, so such questions always run the agent.
+TIME_SENSITIVE = re.compile(
+    r"\b(today|tonight|tomorrow|yesterday|now|right now|current(ly)?|latest|recent(ly)?|this (week|month|year)|"
+    r"news|weather|forecast|price|exchange rate|score)\b")
+# Left out of the vectors: they change the wording, not the question.
+FILLER_WORDS = frozenset(("a", "an", "the", "please", "kindly"))
+
+
+def normalize_question(question: str) -> str:
+    """Case-folds a question and drops punctuation that does not change its meaning."""
+    text = unicodedata.normalize("NFKC", question).casefold().replace("’", "'")
+    text = re.sub(r"\b(what|who|where|when|why|how|that|it|there)'s\b", r"\1 is", text)
+    text = re.sub(r"[?!;:\"“”‘`()\[\]]", " ", text).replace("'", "")
+    text = re.sub(r"(?<!\d)[.,]|[.,](?!\d)", " ", text)  # Keeps 2.5 and 1,000 intact
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _key_sequence(text: str) -> tuple[str, ...] | None:
+    """
+    Content words and numbers of a question, in the order they appear, which
+    another question must repeat exactly to reuse its answer ("5 minus 3" and
+    "3 minus 5" differ); None when it has no content words, so only exact
+    repeats match.
+    """
+    tokens = [token for token in re.findall(r"\d+(?:[.,]\d+)*|[^\W\d]\w*", text)
+              if token[0].isdigit() or (token not in STOPWORDS and len(token) > 1)]
+    if not any(not token[0].isdigit() for token in tokens):
+        return None
+    return tuple(tokens)
+
+
+def question_vector(normalized: str) -> dict[int, float]:
+    """Unit-length sparse vector of hashed character n-grams and words."""
+    counts = {}
+    words = [word for word in normalized.split() if word not in FILLER_WORDS]
+    padded = f" {' '.join(words)} "
+    features = [padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)]
+    features += [f"w:{word}" for word in words]
+    for feature in features:
+        index = zlib.crc32(feature.encode("utf-8")) % VECTOR_DIMENSIONS
+        counts[index] = counts.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(value * value for value in counts.values())) or 1.0
+    return {index: value / norm for index, value in counts.items()}
+
+
+def _cosine(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+class AnswerCache:
+    """
+    Final answers keyed by normalized question, with optional near-duplicate matching.
+
+    Args:
+        ttl: Seconds an answer is reused.
+        path: SQLite file for the disk tier (None keeps answers in memory only).
+        similarity: Cosine similarity at which a different wording of the
+            same content-word sequence counts as the same question; None matches
+            normalized questions exactly.
+        max_index_entries: Questions held in the in-memory similarity index
+            (least recently used are dropped first).
+        max_memory_bytes / max_disk_bytes: Size bounds for the two tiers.
+    """
+
+    def __init__(self, ttl: float, path: str | None = DEFAULT_CACHE_PATH, similarity: float | None = 0.9,
+                 max_index_entries: int = 50000, max_memory_bytes: int = 16 * 1024 * 1024,
+                 max_disk_bytes: int = 256 * 1024 * 1024):
+        self.store = TwoTierCache("answers", ttl=ttl, path=path,
+                                  max_memory_bytes=max_memory_bytes, max_disk_bytes=max_disk_bytes)
+        self.similarity = similarity
+        self.max_index_entries = max_index_entries
+        self._vectors = OrderedDict()  # key -> (vector, content-word sequence)
+        self._groups = {}  # content-word sequence -> keys of questions that may share an answer
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "similar_hits": 0, "misses": 0}
+        if similarity is not None:
+            # Answers stored before a restart are matchable again straight away.
+            for key, _ in self.store.items(limit=max_index_entries):
+                self._index(key)
+
+    def get(self, question: str) -> dict | None:
+        """
+        Returns the stored answer for `question` or a near-duplicate of it:
+        {"question", "answer", "sources", "created_at", "match", "similarity"},
+        where "match" is "exact" or "similar". None on a miss.
+        """
+        key = normalize_question(question)
+        if not key or TIME_SENSITIVE.search(key):
+            return None
+        entry = self.store.get(key)
+        if entry is not None:
+            self._touch(key)
+            return self._hit("exact", entry, 1.0)
+
+        if self.similarity is not None:
+            for score, candidate in self._nearest(key):
+                entry = self.store.get(candidate)
+                if entry is None:
+                    # Expired or evicted from the store since it was indexed.
+                    self._forget(candidate)
+                    continue
+                self._touch(candidate)
+                return self._hit("similar", entry, score)
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def set(self, question: str, answer: str, sources: list[str] | None = None):
+        """Stores the final `answer` to `question` with the URLs it was based on."""
+        key = normalize_question(question)
+        if not key or TIME_SENSITIVE.search(key):
+            return
+        self.store.set(key, {"question": question, "answer": answer, "sources": list(sources or []),
+                             "created_at": time.time()})
+        if self.similarity is not None:
+            self._index(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["index_entries"] = len(self._vectors)
+        stats["store"] = self.store.stats()
+        return stats
+
+    # --- similarity index ---
+
+    def _hit(self, match: str, entry: dict, score: float) -> dict:
+        with self._lock:
+            self._counters[f"{match}_hits"] += 1
+        return dict(entry, match=match, similarity=round(score, 4))
+
+    def _nearest(self, key: str) -> list[tuple[float, str]]:
+        """
+        Indexed questions with the same ordered content words and numbers as
+        `key` and at or above the similarity threshold, most similar first.
+        """
+        group = _key_sequence(key)
+        if group is None:
+            return []
+        vector = question_vector(key)
+        with self._lock:
+            scored = []
+            for candidate in self._groups.get(group, ()):
+                score = _cosine(vector, self._vectors[candidate][0])
+                if score >= self.similarity:
+                    scored.append((score, candidate))
+        return sorted(scored, reverse=True)
+
+    def _index(self, key: str):
+        with self._lock:
+            if key in self._vectors:
+                self._vectors.move_to_end(key)
+                return
+            group = _key_sequence(key)
+            if group is None:
+                return
+            self._vectors[key] = (question_vector(key), group)
+            self._groups.setdefault(group, set()).add(key)
+            while len(self._vectors) > self.max_index_entries:
+                self._forget_locked(next(iter(self._vectors)))
+
+    def _touch(self, key: str):
+        with self._lock:
+            if key in self._vectors:
+                self._vectors.move_to_end(key)
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._forget_locked(key)
+
+    def _forget_locked(self, key: str):
+        entry = self._vectors.pop(key, None)
+        if entry is None:
+            return
+        keys = self._groups.get(entry[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[entry[1]]
@@ -0,0 +1,264 @@
+"""
+Long-lived headless Chromium shared by the research agent's scraping tools.
+
+Playwright objects are bound to the thread (and event loop) that created them,
+so the pool owns a private background thread running an asyncio loop. Callers
+on any thread borrow a pooled browser context/page through the blocking
+`fetch_html` helper; the browser itself is launched once per process.
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import re
+import threading
+import time
+
+from playwright.async_api import async_playwright, Error as PlaywrightError
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
+
+# Requests that never contribute text: aborted before they leave the browser.
+BLOCKED_RESOURCE_TYPES = frozenset(("image", "media", "font", "stylesheet", "texttrack", "eventsource", "websocket", "manifest"))
+TRACKER_HOSTS = re.compile(
+    r'(^|\.)(google-analytics\.com|googletagmanager\.com|doubleclick\.net|googlesyndication\.com|'
+    r'facebook\.net|connect\.facebook\.com|hotjar\.com|scorecardresearch\.com|quantserve\.com|'
+    r'adservice\.google\.com|amazon-adsystem\.com|taboola\.com|outbrain\.com|criteo\.com)$')
+
+
+class _Slot:
+    """A browser context with one reusable page, plus bookkeeping for recycling."""
+
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.crashed = False
+        page.on("crash", self._on_crash)
+
+    def _on_crash(self, *_):
+        self.crashed = True
+
+    def healthy(self, browser) -> bool:
+        return not self.crashed and not self.page.is_closed() and browser is not None and browser.is_connected()
+
+    async def close(self):
+        try:
+            await self.context.close()
+        except PlaywrightError:
+            pass
+
+
+class BrowserPool:
+    """
+    A bounded pool of browser contexts backed by a single Chromium process.
+
+    Args:
+        size: Maximum number of contexts (and therefore concurrent page loads).
+        max_uses: Recycle a context after it has served this many pages.
+        user_agent: User agent string for every context.
+        block_resources: Abort images, fonts, stylesheets, media and known
+            trackers, which only slow down text extraction.
+    """
+
+    def __init__(self, size: int = 4, max_uses: int = 50, user_agent: str = DEFAULT_USER_AGENT,
+                 block_resources: bool = True):
+        self.size = size
+        self.max_uses = max_uses
+        self.user_agent = user_agent
+        self.block_resources = block_resources
+
+        self._loop = None
+        self._thread = None
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+        self._start_error = None
+
+        # Only touched from inside the pool's event loop.
+        self._playwright = None
+        self._browser = None
+        self._idle = []
+        self._slots = None
+        self._launch_lock = None
+
+    # --- lifecycle ---
+
+    def start(self):
+        """Starts the background loop and launches Chromium (idempotent)."""
+        with self._start_lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._started.clear()
+                self._start_error = None
+                self._thread = threading.Thread(target=self._run_loop, name="browser-pool", daemon=True)
+                self._thread.start()
+        # Concurrent callers also wait for the launch, and see its error if it failed.
+        self._started.wait()
+        if self._start_error:
+            raise self._start_error
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._slots = asyncio.Semaphore(self.size)
+        self._launch_lock = asyncio.Lock()
+        try:
+            self._loop.run_until_complete(self._ensure_browser())
+        except Exception as e:
+            self._start_error = e
+            # Playwright is bound to this loop; stop it so a later start() begins clean.
+            try:
+                self._loop.run_until_complete(self._shutdown())
+            except Exception:
+                self._playwright = None
+            self._started.set()
+            self._loop.close()
+            return
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    def close(self):
+        """Closes every context, the browser and the background loop."""
+        if not self._thread or not self._thread.is_alive():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        try:
+            future.result(timeout=10)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+    async def _shutdown(self):
+        for slot in self._idle:
+            await slot.close()
+        self._idle.clear()
+        if self._browser:
+            try:
+                await self._browser.close()
+            except PlaywrightError:
+                pass
+            self._browser = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _ensure_browser(self):
+        """(Re)launches Chromium if it has never started or has crashed."""
+        async with self._launch_lock:
+            if self._browser and self._browser.is_connected():
+                return
+            if self._browser:
+                print("⚠️  [BROWSER] Chromium disconnected, relaunching...")
+                # Contexts belonged to the dead browser; drop them.
+                self._idle.clear()
+            if not self._playwright:
+                self._playwright = await async_playwright().start()
+            started = time.perf_counter()
+            self._browser = await self._playwright.chromium.launch(headless=True)
+            print(f"🌐  [BROWSER] Chromium launched in {time.perf_counter() - started:.2f}s (pool size {self.size}).")
+
+    # --- borrowing ---
+
+    async def _acquire(self) -> _Slot:
+        await self._slots.acquire()
+        try:
+            await self._ensure_browser()
+            while self._idle:
+                slot = self._idle.pop()
+                if slot.healthy(self._browser):
+                    return slot
+                await slot.close()
+            context = await self._browser.new_context(user_agent=self.user_agent)
+            if self.block_resources:
+                await context.route("**/*", _block_nonessential)
+            page = await context.new_page()
+            return _Slot(context, page)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _release(self, slot: _Slot, failed: bool):
+        try:
+            slot.uses += 1
+            if failed or slot.uses >= self.max_uses or not slot.healthy(self._browser):
+                await slot.close()
+            else:
+                self._idle.append(slot)
+        finally:
+            self._slots.release()
+
+    async def _with_page(self, fn):
+        slot = await self._acquire()
+        failed = True
+        try:
+            result = await fn(slot.page)
+            failed = False
+            return result
+        finally:
+            await self._release(slot, failed)
+
+    def run(self, fn, timeout: float | None = None):
+        """
+        Runs `await fn(page)` on a pooled page and blocks for the result.
+
+        Args:
+            fn: An async callable taking a Playwright `Page`.
+            timeout: Seconds to wait for a free page plus the call itself.
+
+        Returns:
+            Whatever `fn` returns. Exceptions raised by `fn` propagate.
+        """
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._with_page(fn), self._loop)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def fetch_html(self, url: str, wait_until: str = "networkidle", timeout_ms: int = 30000,
+                   min_text_chars: int = 0, settle_ms: int = 3000) -> str:
+        """
+        Navigates a pooled page to `url` and returns the rendered HTML.
+
+        With `min_text_chars`, waits up to `settle_ms` after `wait_until` for
+        client-side rendering to put that much text on the page, so an early
+        "domcontentloaded" does not return an empty app shell.
+        """
+        async def load(page):
+            await page.goto(url, wait_until=wait_until, timeout=timeout_ms)
+            if min_text_chars:
+                try:
+                    await page.wait_for_function(
+                        "n => document.body && document.body.innerText.length >= n",
+                        arg=min_text_chars, timeout=settle_ms)
+                except PlaywrightError:
+                    pass  # Take whatever has rendered by now
+            return await page.content()
+
+        # Leave headroom beyond the navigation timeout for queueing and content().
+        return self.run(load, timeout=timeout_ms / 1000 + 30)
+
+
+async def _block_nonessential(route):
+    request = route.request
+    host = request.url.split("/", 3)[2].split(":", 1)[0] if "://" in request.url else ""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or TRACKER_HOSTS.search(host):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool(size: int = 4, max_uses: int = 50) -> BrowserPool:
+    """Returns the process-wide browser pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(size=size, max_uses=max_uses)
+            atexit.register(_pool.close)
+        return _pool
@@ -1,13 +1,167 @@
+import asyncio
+import contextvars
 import requests
 import json
 import re
+import threading
 import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlsplit
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
 from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+from answer_cache import AnswerCache
+from browser_pool import get_browser_pool
+from html_extract import extract_main_text, needs_javascript
+from http_client import AsyncHTTPClient, HTTPClient
+from metrics import REGISTRY, start_metrics_server
+from model_backend import ModelBackend, create_backend
+from prompt_builder import PromptAssembler
+from web_cache import DEFAULT_CACHE_PATH, TwoTierCache, canonical_url, normalize_query
 
 # --- CONFIGURATION ---
+MODEL_BACKEND = "ollama"  # "ollama" (native /api/chat) or "openai" (vLLM or another OpenAI-compatible server)
 OLLAMA_URL = "http://localhost:11434/api/chat"
-MODEL_NAME = "chikoro-ai"
+OPENAI_BASE_URL = "http://localhost:8000/v1"  # API base used when MODEL_BACKEND = "openai"
+OPENAI_API_KEY = None  # Bearer token for hosted OpenAI-compatible endpoints; local vLLM needs none
+MODEL_NAME = "chikoro-ai"  # For vLLM, start the server with --served-model-name chikoro-ai
+MODEL_OPTIONS = {}  # Sampling options for every request, e.g. {"temperature": 0, "max_tokens": 2000}
+MODEL_CONCURRENCY = None  # Model requests worth keeping in flight (agent_server.py); None = the backend's default
+SEARCH_URL = "https://lite.duckduckgo.com/lite"
+SEARCH_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'}
+STREAM_RESPONSES = True  # Stream tokens from the model and dispatch tool calls as soon as they are complete
+BROWSER_POOL_SIZE = 4          # Concurrent pages the shared Chromium may render
+BROWSER_MAX_PAGES_PER_CONTEXT = 50  # Recycle a browser context after this many pages
+SEARCH_AND_READ_CONCURRENCY = BROWSER_POOL_SIZE  # Pages fetched in parallel by search_and_read
+SEARCH_AND_READ_DEADLINE = 15  # Seconds allowed per page before search_and_read gives up on it
+WEB_CACHE_PATH = DEFAULT_CACHE_PATH  # SQLite file backing the search/page caches (None = memory only)
+SEARCH_CACHE_TTL = 6 * 60 * 60  # Seconds a cached search result list stays fresh
+PAGE_CACHE_TTL = 24 * 60 * 60  # Seconds a cached page text stays fresh
+PAGE_CACHE_MAX_CHARS = 20000  # Cleaned page text kept per cached page
+ANSWER_CACHE_ENABLED = True  # Answer repeated standalone questions from stored final answers, without the model
+ANSWER_CACHE_TTL = 7 * 24 * 60 * 60  # Seconds a stored answer is reused
+ANSWER_CACHE_SIMILARITY = 0.9  # Cosine similarity for a rewording (same content words and numbers) to reuse an answer; None = exact only
+STATIC_FETCH_FIRST = True  # Try a plain HTTP GET before rendering a page in the browser
+STATIC_FETCH_TIMEOUT = 8  # Seconds to wait for a plain page fetch to respond
+STATIC_FETCH_MAX_BYTES = 3 * 1024 * 1024  # Larger documents are truncated before parsing
+STATIC_FETCH_POOL_SIZE = 4  # Keep-alive connections per page host
+MODEL_POOL_SIZE = 64  # Keep-alive connections to the model server shared by all agent sessions
+SEARCH_POOL_SIZE = 8  # Keep-alive connections to the search backend
+HTTP_CONNECT_TIMEOUT = 5  # Seconds to establish a connection to any backend
+MODEL_READ_TIMEOUT = 300  # Seconds to wait between bytes from the model server (covers prompt prefill)
+SEARCH_READ_TIMEOUT = 10  # Seconds to wait for the search backend to respond
+HTTP_RETRIES = 3  # Retries (with exponential backoff) on connection errors and 429/502/503/504
+MAX_AGENT_TURNS = 8  # Model turns allowed per question before the last response is returned as-is
+MAX_TOOL_CALLS_PER_TURN = 6  # Tool calls honoured from one model response; extra calls are ignored
+TOOL_CONCURRENCY = 4  # Tool calls run in parallel across the process
+TOOL_TIMEOUTS = {"search": 20, "scrape_and_read": 45, "search_and_read": SEARCH_AND_READ_DEADLINE + 15}  # Seconds per call
+DEFAULT_TOOL_TIMEOUT = 30  # Seconds for tools not listed in TOOL_TIMEOUTS
+PROMPT_TOKEN_BUDGET = 6000  # Approximate tokens per model request; page text is ranked to fit
+PROMPT_CHUNK_CHARS = 800  # Page text is split into chunks of this size for ranking
+METRICS_PORT = None  # Serve Prometheus metrics on this port (e.g. 9108) when set
+
+# Pooled keep-alive sessions shared by every model and search call in this process.
+HTTP = HTTPClient(
+    pool_sizes={urlsplit(OLLAMA_URL).netloc: MODEL_POOL_SIZE, urlsplit(OPENAI_BASE_URL).netloc: MODEL_POOL_SIZE,
+                urlsplit(SEARCH_URL).netloc: SEARCH_POOL_SIZE},
+    connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=MODEL_READ_TIMEOUT, retries=HTTP_RETRIES,
+)
+ASYNC_HTTP = AsyncHTTPClient(HTTP)
+# Page fetches get one quick retry only: a slow or failing site falls through to the browser.
+PAGE_HTTP = HTTPClient(default_pool_size=STATIC_FETCH_POOL_SIZE, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                       read_timeout=STATIC_FETCH_TIMEOUT, retries=1, backoff=0.2)
+
+# Repeated curriculum questions are served from here without network or browser work.
+SEARCH_CACHE = TwoTierCache("search", ttl=SEARCH_CACHE_TTL, path=WEB_CACHE_PATH)
+PAGE_CACHE = TwoTierCache("page", ttl=PAGE_CACHE_TTL, path=WEB_CACHE_PATH, max_memory_bytes=64 * 1024 * 1024)
+# Final answers with their sources, keyed by normalized question (see answer_cache.py).
+ANSWER_CACHE = AnswerCache(ttl=ANSWER_CACHE_TTL, path=WEB_CACHE_PATH, similarity=ANSWER_CACHE_SIMILARITY)
+
+# --- STAGE TIMING ---
+
+class AgentTrace:
+    """
+    Record of one question: model turns, tool calls, the pages read
+    (`sources`), whether the answer came from the answer cache, and the wall
+    time spent in each stage ("model", "search", "scrape", "parse").
+
+    Stages that run concurrently (parallel tool calls, pages read by
+    `search_and_read`) are each
+    counted in full, so stage totals can exceed the question's wall time.
+    """
+
+    def __init__(self):
+        self.turns = 0
+        self.tool_calls = []
+        self.sources = []
+        self.answer_cache = None  # "exact", "similar" or "miss" when the answer cache was consulted
+        self.stage_seconds = defaultdict(float)
+        self.stage_counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_counts[stage] += 1
+
+    def add_source(self, url: str):
+        with self._lock:
+            if url not in self.sources:
+                self.sources.append(url)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "tool_calls": list(self.tool_calls),
+                "sources": list(self.sources),
+                "answer_cache": self.answer_cache,
+                "stages": {stage: round(seconds, 4) for stage, seconds in self.stage_seconds.items()},
+                "stage_counts": dict(self.stage_counts),
+            }
+
+_CURRENT_TRACE = contextvars.ContextVar("agent_trace", default=None)
+
+# Process-wide metrics (see metrics.py); served when METRICS_PORT is set.
+STAGE_SECONDS = REGISTRY.histogram("agent_stage_seconds", "Time spent per agent stage (model, search, fetch, scrape, parse)", ("stage",))
+QUESTION_SECONDS = REGISTRY.histogram("agent_question_seconds", "Time to answer one question")
+QUESTION_TURNS = REGISTRY.histogram("agent_question_turns", "Model turns used per question", buckets=(1, 2, 3, 4, 5, 6, 8, 12))
+TOOL_CALLS = REGISTRY.counter("agent_tool_calls_total", "Tool calls made by the model", ("tool",))
+ERRORS = REGISTRY.counter("agent_errors_total", "Errors by stage and exception type", ("stage", "type"))
+
+def _collect_cache_metrics():
+    """Exports the web caches' own hit counters at scrape time."""
+    samples = []
+    for name, cache in (("search", SEARCH_CACHE), ("page", PAGE_CACHE)):
+        stats = cache.stats()
+        for result in ("memory_hits", "disk_hits", "misses"):
+            samples.append(({"cache": name, "result": result}, stats[result]))
+    answer_stats = ANSWER_CACHE.stats()
+    answer_samples = [({"result": result}, answer_stats[result]) for result in ("exact_hits", "similar_hits", "misses")]
+    return [
+        ("agent_cache_lookups_total", "counter", "Web cache lookups by cache and result", samples),
+        ("agent_answer_cache_lookups_total", "counter", "Answer cache lookups by result", answer_samples),
+    ]
+
+REGISTRY.add_collector(_collect_cache_metrics)
+
+@contextmanager
+def _stage(name: str):
+    """Times the enclosed block into the stage metrics and the current question's trace, if any."""
+    trace = _CURRENT_TRACE.get()
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        ERRORS.inc(stage=name, type=type(e).__name__)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if trace is not None:
+            trace.add(name, seconds)
 
 # --- NEW: TOOL IMPLEMENTATIONS ---
 
@@ -23,51 +177,161 @@ def search(query: str, max_results: int = 5) -> list[dict]:
     Returns:
         A list of dictionaries, where each dictionary contains 'title' and 'url'.
     """
-    search_url = f"https://lite.duckduckgo.com/lite?q={requests.utils.quote(query)}"
+    cache_key = f"{normalize_query(query)}|{max_results}"
+    cached = SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"⚡  [CACHE] Search results for: {query}")
+        return cached
+
     print(f"🛠️  [TOOL] Searching for: {query}")
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36'}
-    
     try:
-        response = requests.get(search_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        results = []
-        
-        # Find the tables containing results. This is specific to lite.duckduckgo.com's structure.
-        results_tables = soup.find_all('table')[2:] # The first two tables are for navigation/header
-
-        for table in results_tables:
-            for row in table.find_all('tr'):
-                if len(results) >= max_results:
-                    break
-                
-                link = row.find('a')
-                if link and link.get('href'):
-                    raw_url = link.get('href')
-                    # Decode the URL from the 'uddg' parameter
-                    decoded_url_match = re.search(r'uddg=([^&]+)', raw_url)
-                    if decoded_url_match:
-                        final_url = requests.utils.unquote(decoded_url_match.group(1))
-                        if not final_url.startswith('https://duckduckgo.com'):
-                            results.append({
-                                "title": link.text.strip(),
-                                "url": final_url
-                            })
-            if len(results) >= max_results:
-                break
+        with _stage("search"):
+            response = HTTP.get(SEARCH_URL, params={"q": query}, headers=SEARCH_HEADERS,
+                                timeout=(HTTP_CONNECT_TIMEOUT, SEARCH_READ_TIMEOUT))
+            response.raise_for_status()
+        with _stage("parse"):
+            results = _parse_search_results(response.content, max_results)
 
         print(f"✅  [TOOL] Found {len(results)} search results.")
+        if results:
+            SEARCH_CACHE.set(cache_key, results)
         return results
 
     except requests.exceptions.RequestException as e:
         print(f"❌  [TOOL] Error fetching search results: {e}")
         return []
 
+async def search_async(query: str, max_results: int = 5) -> list[dict]:
+    """Async variant of `search` sharing its cache and connection pool."""
+    cache_key = f"{normalize_query(query)}|{max_results}"
+    cached = SEARCH_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"⚡  [CACHE] Search results for: {query}")
+        return cached
+
+    print(f"🛠️  [TOOL] Searching for: {query}")
+    try:
+        with _stage("search"):
+            status, _, body = await ASYNC_HTTP.request(
+                "GET", SEARCH_URL, params={"q": query}, headers=SEARCH_HEADERS,
+                timeout=(HTTP_CONNECT_TIMEOUT, SEARCH_READ_TIMEOUT))
+        if status >= 400:
+            raise RuntimeError(f"HTTP {status} from search backend")
+        # Parsing is CPU-bound; keep it off the event loop.
+        with _stage("parse"):
+            results = await asyncio.to_thread(_parse_search_results, body, max_results)
+        print(f"✅  [TOOL] Found {len(results)} search results.")
+        if results:
+            SEARCH_CACHE.set(cache_key, results)
+        return results
+    except Exception as e:
+        print(f"❌  [TOOL] Error fetching search results: {e}")
+        return []
+
+def _parse_search_results(content: bytes, max_results: int) -> list[dict]:
+    """Extracts result titles and URLs from a DuckDuckGo Lite results page."""
+    soup = BeautifulSoup(content, 'html.parser')
+    results = []
+
+    # Find the tables containing results. This is specific to lite.duckduckgo.com's structure.
+    results_tables = soup.find_all('table')[2:] # The first two tables are for navigation/header
+
+    for table in results_tables:
+        for row in table.find_all('tr'):
+            if len(results) >= max_results:
+                break
+
+            link = row.find('a')
+            if link and link.get('href'):
+                raw_url = link.get('href')
+                # Decode the URL from the 'uddg' parameter
+                decoded_url_match = re.search(r'uddg=([^&]+)', raw_url)
+                if decoded_url_match:
+                    final_url = requests.utils.unquote(decoded_url_match.group(1))
+                    if not final_url.startswith('https://duckduckgo.com'):
+                        results.append({
+                            "title": link.text.strip(),
+                            "url": final_url
+                        })
+        if len(results) >= max_results:
+            break
+    return results
+
+def _truncate(text: str, max_length: int) -> str:
+    return text[:max_length] + "..." if len(text) > max_length else text
+
+def _fetch_static(url: str) -> str | None:
+    """
+    Fetches `url` with a plain HTTP GET and extracts its main text.
+
+    Returns:
+        The page text, or None when the page has to be rendered in the
+        browser (request failed, not HTML, or a JavaScript shell).
+    """
+    try:
+        with _stage("fetch"):
+            with PAGE_HTTP.get(url, headers=SEARCH_HEADERS, stream=True) as response:
+                content_type = response.headers.get('Content-Type', '')
+                if response.status_code >= 400 or ('html' not in content_type and 'xml' not in content_type):
+                    print(f"🛠️  [TOOL] Plain fetch unusable (HTTP {response.status_code}, {content_type or 'no type'}), rendering: {url}")
+                    return None
+                body = bytearray()
+                for block in response.iter_content(64 * 1024):
+                    body += block
+                    if len(body) >= STATIC_FETCH_MAX_BYTES:
+                        break
+    except requests.RequestException as e:
+        print(f"🛠️  [TOOL] Plain fetch failed ({type(e).__name__}), rendering: {url}")
+        return None
+
+    with _stage("parse"):
+        html = bytes(body)
+        text = extract_main_text(html)
+        if needs_javascript(html, text):
+            print(f"🛠️  [TOOL] Page needs JavaScript, rendering: {url}")
+            return None
+    return text
+
+def _read_page(url: str, timeout_ms: int) -> str:
+    """
+    Returns the main text of `url`: from the page cache, else from a plain
+    HTTP fetch, else from the browser pool for pages that need JavaScript.
+    """
+    cache_key = canonical_url(url)
+    cached = PAGE_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"⚡  [CACHE] Page content for: {url}")
+        _note_source(url)
+        return cached
+
+    text = _fetch_static(url) if STATIC_FETCH_FIRST else None
+    if text is None:
+        # Borrow a page from the long-lived browser instead of launching Chromium per call.
+        # Images, fonts and stylesheets are blocked, so the DOM is ready well before
+        # the network goes idle; give scripts a moment to render text into it.
+        pool = get_browser_pool(size=BROWSER_POOL_SIZE, max_uses=BROWSER_MAX_PAGES_PER_CONTEXT)
+        with _stage("scrape"):
+            html = pool.fetch_html(url, wait_until='domcontentloaded', timeout_ms=timeout_ms, min_text_chars=200)
+        with _stage("parse"):
+            text = extract_main_text(html)
+    text = text[:PAGE_CACHE_MAX_CHARS]
+    if text:
+        PAGE_CACHE.set(cache_key, text)
+        _note_source(url)
+    return text
+
+def _note_source(url: str):
+    """Records a page the current question's answer may draw on."""
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add_source(url)
+
 def scrape_and_read(url: str) -> str:
     """
-    Scrapes a webpage using Playwright (Python's equivalent to Puppeteer) 
-    to handle JavaScript-rendered sites and returns cleaned text content.
+    Reads a webpage and returns its main text content. Static pages are
+    fetched over plain HTTP; JavaScript-rendered sites fall back to
+    Playwright in a shared, long-lived browser (see browser_pool.py). Page
+    text is cached by canonical URL (see web_cache.py).
     
     Args:
         url: The URL to scrape.
@@ -75,33 +339,12 @@ def scrape_and_read(url: str) -> str:
     Returns:
         The cleaned text content of the page, or an error message.
     """
-    print(f"🛠️  [TOOL] Scraping URL with Playwright: {url}")
+    print(f"🛠️  [TOOL] Scraping URL: {url}")
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page(user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36')
-            
-            # Navigate to the URL, waiting for the page to be fully loaded.
-            page.goto(url, wait_until='networkidle', timeout=30000)
-            
-            html = page.content()
-            browser.close()
-
-            # Use BeautifulSoup to parse and clean the HTML
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Remove irrelevant tags
-            for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside', 'form', '[aria-hidden="true"]']):
-                element.decompose()
-                
-            body_text = soup.body.get_text(separator='\n', strip=True)
-            cleaned_text = re.sub(r'\s{2,}', ' ', body_text) # Replace multiple spaces/newlines with a single space
-            
-            # Truncate to a reasonable length for the model
-            max_length = 8000
-            final_text = cleaned_text[:max_length] + "..." if len(cleaned_text) > max_length else cleaned_text
-            print(f"✅  [TOOL] Scraped content successfully (length: {len(final_text)}).")
-            return final_text
+        # Truncate to a reasonable length for the model
+        final_text = _truncate(_read_page(url, timeout_ms=30000), 8000)
+        print(f"✅  [TOOL] Scraped content successfully (length: {len(final_text)}).")
+        return final_text
 
     except PlaywrightTimeoutError:
         error_msg = f"Failed to retrieve content from the URL due to a timeout. The page may be too slow or complex."
@@ -112,89 +355,608 @@ def scrape_and_read(url: str) -> str:
         print(f"❌  [TOOL] Error scraping URL {url}: {e}")
         return error_msg
 
+def _dedupe_key(url: str) -> str:
+    """Reduces a URL to a key that treats trivially different links as the same page."""
+    url = url.split('#', 1)[0].rstrip('/')
+    return re.sub(r'^https?://(www\.)?', '', url.lower())
+
+def search_and_read(query: str, k: int = 3, max_chars_per_page: int = 3000) -> str:
+    """
+    Searches the web and reads the top `k` results concurrently in one tool call.
+
+    Pages are fetched in parallel (see `_read_page`), bounded by
+    SEARCH_AND_READ_CONCURRENCY; any page not finished within
+    SEARCH_AND_READ_DEADLINE seconds is skipped. Lines already seen on an
+    earlier page (cookie banners, navigation, syndicated text) are dropped.
+
+    Args:
+        query: The search query.
+        k: How many of the top results to read.
+        max_chars_per_page: Truncation limit applied to each page's text.
+
+    Returns:
+        The merged text of the pages read, each headed by its title and URL,
+        or an error message if nothing could be read.
+    """
+    print(f"🛠️  [TOOL] Searching and reading top {k} results for: {query}")
+    k = max(1, int(k))
+    # Over-fetch a little so duplicate links do not leave us short of k pages.
+    candidates, seen_urls = [], set()
+    for result in search(query, max_results=k * 2):
+        key = _dedupe_key(result["url"])
+        if key not in seen_urls:
+            seen_urls.add(key)
+            candidates.append(result)
+        if len(candidates) >= k:
+            break
+    if not candidates:
+        return "No search results found."
+
+    timeout_ms = SEARCH_AND_READ_DEADLINE * 1000
+
+    def read(result):
+        return _read_page(result["url"], timeout_ms=timeout_ms)
+
+    executor = ThreadPoolExecutor(max_workers=min(SEARCH_AND_READ_CONCURRENCY, len(candidates)))
+    try:
+        # Each page gets its own copy of the context so stage timings reach the caller's trace.
+        futures = {executor.submit(contextvars.copy_context().run, read, result): result
+                   for result in candidates}
+        # Pages load in parallel, so the per-page deadline also bounds the whole call.
+        done, not_done = wait(futures, timeout=SEARCH_AND_READ_DEADLINE + 5)
+        for future in not_done:
+            future.cancel()
+            print(f"❌  [TOOL] Gave up on {futures[future]['url']} after {SEARCH_AND_READ_DEADLINE}s.")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    sections, seen_lines = [], set()
+    for future, result in futures.items():  # Keep search-rank order
+        if future not in done:
+            continue
+        try:
+            text = future.result()
+        except Exception as e:
+            print(f"❌  [TOOL] Error scraping URL {result['url']}: {e}")
+            continue
+        lines = []
+        for line in text.split('\n'):
+            key = line.strip().lower()
+            if key and key not in seen_lines:
+                seen_lines.add(key)
+                lines.append(line)
+        if lines:
+            content = _truncate('\n'.join(lines), max_chars_per_page)
+            sections.append(f"## {result['title']}\nSource: {result['url']}\n{content}")
+
+    if not sections:
+        return "Failed to retrieve content from any of the search results."
+    merged = "\n\n".join(sections)
+    print(f"✅  [TOOL] Read {len(sections)}/{len(candidates)} pages (length: {len(merged)}).")
+    return merged
+
 # A dictionary to map tool names to their functions
 AVAILABLE_TOOLS = {
     "search": search,
-    "scrape_and_read": scrape_and_read
+    "scrape_and_read": scrape_and_read,
+    "search_and_read": search_and_read
 }
 
+# Shared by every question, so parallel tool calls cannot oversubscribe the browser and network.
+# agent_server.py replaces it with a pool sized to its own admission limit.
+TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=TOOL_CONCURRENCY, thread_name_prefix="agent-tool")
+
+def _run_tool(tool_name: str, tool_args: dict):
+    try:
+        return AVAILABLE_TOOLS[tool_name](**tool_args)
+    except TypeError as e:
+        return f"Error: invalid arguments for {tool_name}: {e}"
+
+class _ToolRun:
+    """
+    One tool call as submitted to TOOL_EXECUTOR.
+
+    Records when a worker thread picks the call up, so its timeout counts
+    from the start of the tool itself rather than from the time spent
+    queued behind other questions' tools.
+    """
+
+    def __init__(self, tool_name: str, tool_args: dict):
+        self.tool_name = tool_name
+        self.tool_args = tool_args
+        self.timeout = TOOL_TIMEOUTS.get(tool_name, DEFAULT_TOOL_TIMEOUT)
+        # A copy of the context per call so stage timings reach this question's trace.
+        self.context = contextvars.copy_context()
+        self.started_at = None
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+        self._on_start = []
+
+    def __call__(self):
+        self.mark_started()
+        return self.context.run(_run_tool, self.tool_name, self.tool_args)
+
+    def mark_started(self):
+        """Records the start (once) and wakes anyone waiting for it; also called if the call is cancelled."""
+        with self._lock:
+            if self.started.is_set():
+                return
+            self.started_at = time.monotonic()
+            self.started.set()
+            callbacks, self._on_start = self._on_start, []
+        for callback in callbacks:
+            callback()
+
+    def on_start(self, callback):
+        """Calls `callback()` once the call has started (at once if it already has)."""
+        with self._lock:
+            if not self.started.is_set():
+                self._on_start.append(callback)
+                return
+        callback()
+
+    def remaining(self) -> float:
+        """Seconds left before the call's timeout, counted from when it started."""
+        return max(0.0, self.started_at + self.timeout - time.monotonic())
+
+    async def wait_started(self):
+        """Waits, without blocking the event loop, until a worker thread has picked the call up."""
+        loop = asyncio.get_running_loop()
+        started = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: started.done() or started.set_result(None))
+
+        self.on_start(wake)
+        await started
+
+def start_tool_call(tool_call: dict) -> tuple[str, dict, Future | str, _ToolRun | None]:
+    """
+    Validates a tool call and queues it on TOOL_EXECUTOR without waiting.
+
+    Returns:
+        `(name, args, future, run)`, or `(name, args, error text, None)`
+        if the call names an unknown tool or has malformed args.
+    """
+    tool_name = tool_call.get("name")
+    tool_args = tool_call.get("args") or {}
+    if tool_name not in AVAILABLE_TOOLS:
+        return str(tool_name), {}, f"Error: unknown tool '{tool_name}'. Available tools: {', '.join(AVAILABLE_TOOLS)}.", None
+    if not isinstance(tool_args, dict):
+        return tool_name, {}, "Error: tool args must be a JSON object.", None
+
+    TOOL_CALLS.inc(tool=tool_name)
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.tool_calls.append(tool_name)
+    run = _ToolRun(tool_name, tool_args)
+    future = TOOL_EXECUTOR.submit(run)
+    # A call cancelled while queued (executor shutdown) never starts; wake its waiters anyway.
+    future.add_done_callback(lambda _: run.mark_started())
+    return tool_name, tool_args, future, run
+
+def finish_tool_calls(started: list[tuple[str, dict, Future | str, _ToolRun | None]]) -> list[tuple[str, dict, object]]:
+    """
+    Waits for calls begun with `start_tool_call`, each until its own timeout.
+
+    The timeout runs from when the tool starts, not from when it was queued,
+    so a call waiting for a free TOOL_EXECUTOR thread is not failed before it
+    runs. A call that times out is reported to the model as an error; its
+    thread finishes in the background (the tools bound their own network work).
+
+    Returns:
+        `(name, args, result)` per call, in call order.
+    """
+    results = []
+    for tool_name, tool_args, pending, run in started:
+        if run is None:
+            results.append((tool_name, tool_args, pending))
+            continue
+        run.started.wait()
+        try:
+            result = pending.result(timeout=run.remaining())
+        except FutureTimeoutError:
+            result = _tool_timeout_result(tool_name)
+        except Exception as e:
+            result = _tool_error_result(tool_name, e)
+        results.append((tool_name, tool_args, result))
+    return results
+
+async def finish_tool_calls_async(started: list[tuple[str, dict, Future | str, _ToolRun | None]]) -> list[tuple[str, dict, object]]:
+    """Awaitable `finish_tool_calls`: waits for the calls without blocking the event loop."""
+    async def finish(tool_name, tool_args, pending, run):
+        if run is None:
+            return tool_name, tool_args, pending
+        await run.wait_started()
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(pending), run.remaining())
+        except asyncio.TimeoutError:
+            result = _tool_timeout_result(tool_name)
+        except Exception as e:
+            result = _tool_error_result(tool_name, e)
+        return tool_name, tool_args, result
+
+    return list(await asyncio.gather(*(finish(*call) for call in started)))
+
+def _tool_timeout_result(tool_name: str) -> str:
+    ERRORS.inc(stage="tool", type="Timeout")
+    timeout = TOOL_TIMEOUTS.get(tool_name, DEFAULT_TOOL_TIMEOUT)
+    print(f"❌  [TOOL] {tool_name} timed out after {timeout}s.")
+    return f"Error: {tool_name} did not finish within {timeout} seconds."
+
+def _tool_error_result(tool_name: str, error: Exception) -> str:
+    ERRORS.inc(stage="tool", type=type(error).__name__)
+    print(f"❌  [TOOL] {tool_name} failed: {error}")
+    return f"Error: {tool_name} failed: {error}"
+
 # --- AGENT LOGIC ---
 
+_BACKENDS = {}
+
+def model_backend() -> ModelBackend:
+    """
+    Returns the backend selected by MODEL_BACKEND.
+
+    Built on first use and rebuilt when the settings change, so MODEL_BACKEND,
+    the URLs or MODEL_NAME may be reassigned after import (as agent_bench.py does).
+    """
+    url = OPENAI_BASE_URL if MODEL_BACKEND == "openai" else OLLAMA_URL
+    key = (MODEL_BACKEND, url, MODEL_NAME, OPENAI_API_KEY, json.dumps(MODEL_OPTIONS, sort_keys=True), MODEL_CONCURRENCY)
+    backend = _BACKENDS.get(key)
+    if backend is None:
+        backend = _BACKENDS[key] = create_backend(
+            MODEL_BACKEND, url, MODEL_NAME, HTTP, async_http=ASYNC_HTTP, api_key=OPENAI_API_KEY,
+            options=MODEL_OPTIONS, concurrency=MODEL_CONCURRENCY)
+    return backend
+
+class ModelRequestError(Exception):
+    """A model request failed; the message is what the user is shown instead of an answer."""
+
+def _model_error(backend: ModelBackend, error: Exception) -> ModelRequestError:
+    ERRORS.inc(stage="model", type=type(error).__name__)
+    print(f"❌ Error connecting to {backend.name}: {error}")
+    return ModelRequestError(f"Error: Could not connect to {backend.name} at {backend.url}.")
+
 def query_model(messages):
-    """Sends the message history to the Ollama model and gets a response."""
+    """
+    Sends the message history to the model and gets a response.
+
+    Raises:
+        ModelRequestError: If the request fails.
+    """
     print("🤔 Querying model...")
+    backend = model_backend()
     try:
-        response = requests.post(OLLAMA_URL, json={
-            "model": MODEL_NAME,
-            "stream": False,
-            "messages": messages
-        })
-        response.raise_for_status()
-        data = response.json()
-        return data.get("message", {}).get("content", "Error: Empty response from model.")
+        return backend.chat(messages)
     except Exception as e:
-        print(f"❌ Error connecting to Ollama: {e}")
-        return f"Error: Could not connect to Ollama at {OLLAMA_URL}."
-
-def parse_tool_call(response: str) -> tuple[str | None, dict | None]:
-    """Parses a tool call from the model's response using regex."""
-    json_match = re.search(r'\{.*"tool_call".*\}', response, re.DOTALL)
-    if not json_match:
-        return None, None
-    
+        raise _model_error(backend, e) from e
+
+async def query_model_async(messages):
+    """Async variant of `query_model` sharing its connection pool."""
+    print("🤔 Querying model...")
+    backend = model_backend()
     try:
-        data = json.loads(json_match.group(0))
-        if "tool_call" in data:
-            tool_name = data["tool_call"].get("name")
-            tool_args = data["tool_call"].get("args", {})
-            print(f"✅  [TOOL CALL DETECTED] Name: {tool_name}, Args: {tool_args}")
-            return tool_name, tool_args
-    except json.JSONDecodeError:
-        return None, None
-    return None, None
-
-def run_agent():
-    """Initializes and runs the main agent loop."""
-    system_prompt = (
-        "You are a helpful research assistant. Your goal is to answer user questions accurately by searching the web.\n\n"
-        "You have access to the following tools:\n"
-        "1. `search(query: str)`: Searches the web and returns a list of pages with titles and URLs.\n"
-        "2. `scrape_and_read(url: str)`: Reads the full text content of a given URL.\n\n"
-        "Here is your workflow:\n"
-        "1. The user will ask a question. First, use the `search` tool to find relevant web pages.\n"
-        "2. Review the search results. Choose the most promising URL to investigate further.\n"
-        "3. Use the `scrape_and_read` tool with that URL to get the page content.\n"
-        "4. Finally, answer the user's question based on the information you have gathered.\n\n"
-        "To call a tool, you MUST output ONLY a JSON object in this exact format:\n"
-        '{"tool_call": {"name": "tool_name", "args": {"arg_name": "value"}}}\n'
-    )
-    
-    messages = [{"role": "system", "content": system_prompt}]
-    
-    user_input = input("User: ")
-    messages.append({"role": "user", "content": user_input})
+        return await backend.chat_async(messages)
+    except Exception as e:
+        raise _model_error(backend, e) from e
 
-    while True:
-        model_response = query_model(messages)
-        print(f"\n🤖 Model:\n{model_response}\n")
-        
-        tool_name, tool_args = parse_tool_call(model_response)
-        
-        if tool_name and tool_name in AVAILABLE_TOOLS:
-            messages.append({"role": "assistant", "content": model_response})
-            
-            tool_function = AVAILABLE_TOOLS[tool_name]
-            # Ensure args are passed as a dictionary
-            result = tool_function(**tool_args) 
+def query_model_stream(messages):
+    """
+    Streams the model's reply, yielding content tokens as they arrive.
+
+    Closing the generator early (e.g. once a tool call has been detected)
+    closes the HTTP response, which makes the server abandon the generation.
+
+    Raises:
+        ModelRequestError: If the request fails, including part way through
+            the reply (the tokens already yielded are then incomplete).
+    """
+    print("🤔 Querying model (streaming)...")
+    backend = model_backend()
+    try:
+        yield from backend.chat_stream(messages)
+    except Exception as e:
+        raise _model_error(backend, e) from e
+
+def _extract_tool_calls(data) -> list[dict]:
+    """
+    Returns the tool calls in a parsed JSON value: {"tool_call": {...}},
+    {"tool_calls": [...]}, a bare {"name": ..., "args": {...}} or a list of these.
+    """
+    if isinstance(data, list):
+        return [call for item in data for call in _extract_tool_calls(item)]
+    if not isinstance(data, dict):
+        return []
+    if isinstance(data.get("tool_call"), dict):
+        return [data["tool_call"]]
+    if isinstance(data.get("tool_calls"), list):
+        return _extract_tool_calls(data["tool_calls"])
+    if isinstance(data.get("name"), str) and isinstance(data.get("args"), dict):
+        return [data]
+    return []
+
+class ToolCallDetector:
+    """
+    Incrementally scans streamed text for complete top-level JSON objects
+    containing tool calls.
+
+    Tracks brace depth and string/escape state so each character is examined
+    once, however the text is split into tokens. Brackets are not tracked,
+    so each object of a JSON array of calls is found as soon as it closes.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def idle(self) -> bool:
+        """True when the scanner is not inside a JSON object."""
+        return self._depth == 0
+
+    def feed(self, chunk: str) -> list[tuple[dict, int]]:
+        """
+        Adds streamed text and returns `(tool_call, end)` for each tool call
+        completed by it, where `end` is the index in `text` just past the
+        closing brace of the object containing the call.
+        """
+        self.text += chunk
+        found = []
+        for i in range(self._pos, len(self.text)):
+            ch = self.text[i]
+            if self._depth == 0:
+                if ch == '{':
+                    self._start, self._depth = i, 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._depth += 1
+            elif ch == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        data = json.loads(self.text[self._start:i + 1])
+                    except json.JSONDecodeError:
+                        continue
+                    found.extend((call, i + 1) for call in _extract_tool_calls(data))
+        self._pos = len(self.text)
+        return found
+
+def stream_model_turn(messages, on_tool_call=None) -> tuple[str, list[dict]]:
+    """
+    Runs one streamed model turn, printing tokens as they arrive.
+
+    Each tool call is handed to `on_tool_call` as soon as it is complete, so
+    it runs while the model is still writing the next one. Reading stops
+    once the model writes something after its last call that is not another
+    call, or after MAX_TOOL_CALLS_PER_TURN calls.
+
+    Returns:
+        The response text (cut just after the last tool call, if any) and
+        the tool calls, or (text, []) for a final answer.
+
+    Raises:
+        ModelRequestError: If the stream fails before the turn is complete.
+    """
+    detector = ToolCallDetector()
+    stream = query_model_stream(messages)
+    calls, end = [], None
+    print("\n🤖 Model:")
+    try:
+        for token in stream:
+            print(token, end="", flush=True)
+            for tool_call, call_end in detector.feed(token)[:MAX_TOOL_CALLS_PER_TURN - len(calls)]:
+                print(f"\n✅  [TOOL CALL DETECTED] Name: {tool_call.get('name')}, Args: {tool_call.get('args', {})}")
+                calls.append(tool_call)
+                end = call_end
+                if on_tool_call:
+                    on_tool_call(tool_call)
+            if len(calls) >= MAX_TOOL_CALLS_PER_TURN:
+                break
+            if end is not None and detector.idle:
+                tail = detector.text[end:].lstrip(" \t\r\n,]`")
+                if tail and not tail.startswith(("{", "[")):
+                    break
+    finally:
+        stream.close()
+    print("\n")
+    if calls:
+        return detector.text[:end], calls
+    return detector.text, []
+
+def parse_tool_calls(response: str) -> list[dict]:
+    """Parses the tool calls (one or several) from a complete model response."""
+    calls = [call for call, _ in ToolCallDetector().feed(response)][:MAX_TOOL_CALLS_PER_TURN]
+    for call in calls:
+        print(f"✅  [TOOL CALL DETECTED] Name: {call.get('name')}, Args: {call.get('args', {})}")
+    return calls
+
+SYSTEM_PROMPT = (
+    "You are a helpful research assistant. Your goal is to answer user questions accurately by searching the web.\n\n"
+    "You have access to the following tools:\n"
+    "1. `search(query: str)`: Searches the web and returns a list of pages with titles and URLs.\n"
+    "2. `scrape_and_read(url: str)`: Reads the full text content of a given URL.\n"
+    "3. `search_and_read(query: str, k: int = 3)`: Searches the web and reads the top k pages at once.\n\n"
+    "Here is your workflow:\n"
+    "1. The user will ask a question. Prefer `search_and_read` to gather several relevant pages in one step; "
+    "otherwise use the `search` tool to find relevant web pages.\n"
+    "2. If you used `search`, review the results and choose the most promising URL to investigate further.\n"
+    "3. Use the `scrape_and_read` tool with that URL to get the page content.\n"
+    "4. Finally, answer the user's question based on the information you have gathered.\n\n"
+    "To call a tool, you MUST output ONLY a JSON object in this exact format:\n"
+    '{"tool_call": {"name": "tool_name", "args": {"arg_name": "value"}}}\n'
+    "To make several independent calls at once (for example, searches on different topics), "
+    "output ONLY a JSON array of such objects; they run in parallel and you receive all results together:\n"
+    '[{"tool_call": {"name": "search", "args": {"query": "first topic"}}}, '
+    '{"tool_call": {"name": "search", "args": {"query": "second topic"}}}]\n'
+)
+
+def _cached_answer(question: str, trace: AgentTrace) -> str | None:
+    """Returns the stored answer to `question` (or a near-duplicate of it), if any."""
+    hit = ANSWER_CACHE.get(question)
+    if hit is None:
+        trace.answer_cache = "miss"
+        return None
+    trace.answer_cache = hit["match"]
+    for url in hit["sources"]:
+        trace.add_source(url)
+    print(f"⚡  [CACHE] Answer ({hit['match']} match) for: {hit['question']}")
+    return hit["answer"]
+
+def _store_answer(question: str, answer: str, trace: AgentTrace):
+    # Responses that still call tools (the turn limit ran out) are not answers worth
+    # repeating. Failed model requests never get here: they raise ModelRequestError.
+    if answer.strip() and not ToolCallDetector().feed(answer):
+        ANSWER_CACHE.set(question, answer, trace.sources)
+
+def run_agent(question: str | None = None, trace: AgentTrace | None = None) -> str:
+    """
+    Initializes and runs the main agent loop for one question.
+
+    Args:
+        question: The user's question. Read from stdin when omitted.
+        trace: Optional AgentTrace that receives turn counts, tool calls,
+            sources and per-stage timings for this question.
+
+    Returns:
+        The model's final answer (or its last response if MAX_AGENT_TURNS ran
+        out). Questions answered before are served from ANSWER_CACHE without
+        calling the model.
+    """
+    if question is None:
+        question = input("User: ")
+    if trace is None and ANSWER_CACHE_ENABLED:
+        trace = AgentTrace()  # Collects the sources stored with the answer
+    # Rebuilds each request within PROMPT_TOKEN_BUDGET instead of growing the history forever.
+    prompt = PromptAssembler(SYSTEM_PROMPT, question, budget_tokens=PROMPT_TOKEN_BUDGET,
+                             chunk_chars=PROMPT_CHUNK_CHARS)
+
+    token = _CURRENT_TRACE.set(trace)
+    started, turns = time.perf_counter(), 0
+    try:
+        if ANSWER_CACHE_ENABLED:
+            answer = _cached_answer(question, trace)
+            if answer is not None:
+                print(f"\n🤖 Model:\n{answer}\n")
+                return answer
+
+        for _ in range(MAX_AGENT_TURNS):
+            messages = prompt.messages()
+            started_calls = []
+            with _stage("model"):
+                try:
+                    if STREAM_RESPONSES:
+                        # Tools start as soon as each call is complete, while the model keeps writing.
+                        model_response, _ = stream_model_turn(
+                            messages, on_tool_call=lambda call: started_calls.append(start_tool_call(call)))
+                    else:
+                        model_response = query_model(messages)
+                        print(f"\n🤖 Model:\n{model_response}\n")
+                        started_calls = [start_tool_call(call) for call in parse_tool_calls(model_response)]
+                except ModelRequestError as e:
+                    # Shown in place of an answer and never cached; a failed stream may
+                    # already have printed part of a reply.
+                    print(f"\n{e}\n")
+                    return str(e)
+            turns += 1
+            if trace is not None:
+                trace.turns += 1
             
-            # Format the result nicely for the model
-            tool_result_content = json.dumps({"tool_result": result}, indent=2)
-            messages.append({"role": "user", "content": tool_result_content})
-        else:
-            # If no tool is called, the response is the final answer.
-            break
+            if started_calls:
+                # All calls of this response overlap; their results go back in one message.
+                # Long page text is chunked and ranked against the question for the next request.
+                # Unknown tools and malformed args come back as error text for the model to correct.
+                prompt.add_tool_results(model_response, finish_tool_calls(started_calls))
+            else:
+                # If no tool is called, the response is the final answer.
+                if ANSWER_CACHE_ENABLED:
+                    _store_answer(question, model_response, trace)
+                break
+        return model_response
+    finally:
+        QUESTION_SECONDS.observe(time.perf_counter() - started)
+        QUESTION_TURNS.observe(turns)
+        _CURRENT_TRACE.reset(token)
+
+async def run_agent_async(question: str, history: list[dict] | None = None, trace: AgentTrace | None = None,
+                          model_slots: asyncio.Semaphore | None = None) -> str:
+    """
+    Asyncio counterpart of `run_agent` for serving many conversations in one
+    process (see agent_server.py).
+
+    Model requests go through the shared async client without a thread per
+    conversation; tool calls run on TOOL_EXECUTOR and are awaited.
+
+    Args:
+        question: The user's question.
+        history: Earlier messages of this conversation (`{"role", "content"}`
+            dicts, oldest first), included as far as the token budget allows.
+            Only questions without history use ANSWER_CACHE, since follow-up
+            questions depend on what came before.
+        trace: Optional AgentTrace for turn counts, tool calls, sources and
+            stage timings.
+        model_slots: Semaphore bounding model requests in flight across
+            conversations; waiting for a slot is not counted as model time.
+
+    Returns:
+        The model's final answer (or its last response if MAX_AGENT_TURNS ran out).
+    """
+    prompt = PromptAssembler(SYSTEM_PROMPT, question, budget_tokens=PROMPT_TOKEN_BUDGET,
+                             chunk_chars=PROMPT_CHUNK_CHARS, conversation=history)
+    use_answer_cache = ANSWER_CACHE_ENABLED and not history
+    if trace is None and use_answer_cache:
+        trace = AgentTrace()
+
+    token = _CURRENT_TRACE.set(trace)
+    started, turns = time.perf_counter(), 0
+    try:
+        if use_answer_cache:
+            # SQLite lookups and writes run off the event loop
+            answer = await asyncio.to_thread(_cached_answer, question, trace)
+            if answer is not None:
+                return answer
+
+        for _ in range(MAX_AGENT_TURNS):
+            messages = prompt.messages()
+            async with model_slots or nullcontext():
+                with _stage("model"):
+                    try:
+                        model_response = await query_model_async(messages)
+                    except ModelRequestError as e:
+                        return str(e)  # Shown in place of an answer and never cached
+            turns += 1
+            if trace is not None:
+                trace.turns += 1
+
+            started_calls = [start_tool_call(call) for call in parse_tool_calls(model_response)]
+            if started_calls:
+                prompt.add_tool_results(model_response, await finish_tool_calls_async(started_calls))
+            else:
+                if use_answer_cache:
+                    await asyncio.to_thread(_store_answer, question, model_response, trace)
+                break
+        return model_response
+    finally:
+        QUESTION_SECONDS.observe(time.perf_counter() - started)
+        QUESTION_TURNS.observe(turns)
+        _CURRENT_TRACE.reset(token)
 
 if __name__ == "__main__":
     print("Upgraded Python Agent Initialized.")
     print("NOTE: The first time you run `scrape_and_read`, Playwright will download necessary browser files. This may take a moment.")
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+        print(f"📈 Metrics available at http://localhost:{METRICS_PORT}/metrics")
     run_agent()
@@ -0,0 +1,178 @@
+"""
+Main-content extraction for pages read by the research agent.
+
+Parses with lxml when it is installed (an order of magnitude faster than
+BeautifulSoup's pure-Python `html.parser`) and picks the element holding
+the article body with a readability-style score: paragraphs add weight to
+their container, class and id names such as "content" or "sidebar" push it
+up or down, and link-heavy blocks (menus, footers) are penalized. Without
+lxml the whole body text is returned, as before.
+
+`needs_javascript` decides whether a plain HTTP fetch was good enough or
+the page is a script-rendered shell that has to go through the browser.
+"""
+
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+BOILERPLATE_TAGS = ('script', 'style', 'noscript', 'nav', 'footer', 'header', 'aside', 'form', 'iframe', 'svg', 'button')
+BLOCK_TAGS = frozenset((
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'tr', 'table', 'pre', 'blockquote',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'dd', 'dt', 'br', 'figcaption',
+))
+POSITIVE_NAMES = re.compile(r'article|body|content|entry|main|page|post|text|lesson|story', re.I)
+NEGATIVE_NAMES = re.compile(
+    r'comment|sidebar|footer|foot|nav|menu|cookie|consent|banner|share|social|related|popup|'
+    r'subscribe|newsletter|promo|sponsor|advert|breadcrumb|masthead|widget', re.I)
+# Whole class/id tokens of blocks that are clearly chrome. Tokens, not substrings:
+# "social-studies" is a subject and "shared-layout" a page wrapper.
+STRIP_TOKENS = re.compile(
+    r'(cookies?|gdpr|consent|cookie[-_](banner|consent|notice|bar)|consent[-_](banner|modal)|'
+    r'share|sharing|share[-_](buttons|bar|links|tools)|social[-_](share|sharing|links|icons|buttons|media)|'
+    r'newsletter|newsletter[-_](signup|form)|subscribe|subscribe[-_](box|form)|popup|'
+    r'advert|advertisement|ads?|ad[-_](slot|banner|container)|breadcrumbs?)', re.I)
+
+# Markers of client-side rendered apps whose HTML carries no content.
+JS_SHELL_MARKERS = re.compile(
+    r'id=["\'](?:root|app|__next|__nuxt|svelte)["\']|data-reactroot|ng-app|'
+    r'enable javascript|requires? javascript|javascript is (?:disabled|required)', re.I)
+
+MIN_ARTICLE_CHARS = 250  # Below this the best candidate is not trusted and the whole body is used
+MIN_STATIC_CHARS = 200  # Plain fetches yielding less text always go to the browser
+CONFIDENT_STATIC_CHARS = 500  # Above this a plain fetch is accepted even if the page also ships an app shell
+
+
+def _lines(text: str) -> str:
+    """Collapses whitespace within lines and drops empty ones."""
+    lines = (re.sub(r'[ \t\r\f\v\xa0]+', ' ', line).strip() for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def _class_weight(element) -> int:
+    names = f"{element.get('class', '')} {element.get('id', '')}"
+    weight = 0
+    if POSITIVE_NAMES.search(names):
+        weight += 25
+    if NEGATIVE_NAMES.search(names):
+        weight -= 25
+    return weight
+
+
+def _is_chrome(element) -> bool:
+    tokens = f"{element.get('class', '')} {element.get('id', '')}".split()
+    return any(STRIP_TOKENS.fullmatch(token) for token in tokens)
+
+
+def _paragraph_chars(element) -> int:
+    return sum(len(p.text_content()) for p in element.iter('p', 'pre'))
+
+
+def _link_density(element) -> float:
+    text_length = len(element.text_content())
+    if not text_length:
+        return 1.0
+    link_length = sum(len(a.text_content()) for a in element.iter('a'))
+    return link_length / text_length
+
+
+def _block_text(element) -> str:
+    """Element text with a line break after every block-level element."""
+    for node in element.iter():
+        if isinstance(node.tag, str) and node.tag in BLOCK_TAGS:
+            node.tail = '\n' + (node.tail or '')
+    return _lines(element.text_content())
+
+
+def _extract_lxml(html) -> str:
+    if isinstance(html, str):
+        # lxml refuses str input that still carries an XML encoding declaration
+        html = re.sub(r'^\s*<\?xml[^>]*\?>', '', html)
+    try:
+        doc = lxml.html.fromstring(html)
+    except (etree.ParserError, ValueError):
+        return ""
+    for element in doc.xpath('//' + ' | //'.join(BOILERPLATE_TAGS) + ' | //*[@aria-hidden="true"]'):
+        element.drop_tree()
+    # Never strip a block holding most of the page's paragraphs; the negative-name score deals with it.
+    total_paragraph_chars = _paragraph_chars(doc)
+    for element in doc.xpath('//*[@class or @id]'):
+        if element.getparent() is None or not _is_chrome(element):
+            continue
+        if _paragraph_chars(element) * 2 > total_paragraph_chars > 0:
+            continue
+        element.drop_tree()
+
+    body = doc.find('body') if doc.tag != 'body' else doc
+    if body is None:
+        body = doc
+
+    # Paragraph-like elements vote for their parent (full weight) and grandparent (half).
+    scores = {}
+    for paragraph in body.iter('p', 'pre', 'td', 'li'):
+        text = paragraph.text_content().strip()
+        if len(text) < 25:
+            continue
+        points = 1 + text.count(',') + min(len(text) // 100, 3)
+        parent = paragraph.getparent()
+        grandparent = parent.getparent() if parent is not None else None
+        for ancestor, share in ((parent, 1.0), (grandparent, 0.5)):
+            if ancestor is None or not isinstance(ancestor.tag, str):
+                continue
+            if ancestor not in scores:
+                base = {'article': 10, 'main': 10, 'div': 5, 'section': 3, 'td': 3, 'blockquote': 3}.get(ancestor.tag, 0)
+                scores[ancestor] = base + _class_weight(ancestor)
+            scores[ancestor] += points * share
+
+    best = max(scores, key=lambda el: scores[el] * (1 - _link_density(el)), default=None)
+    if best is not None:
+        text = _block_text(best)
+        if len(text) >= MIN_ARTICLE_CHARS:
+            return text
+    return _block_text(body)
+
+
+def _extract_bs4(html) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(list(BOILERPLATE_TAGS)):
+        element.decompose()
+    if not soup.body:
+        return ""
+    return _lines(soup.body.get_text(separator='\n', strip=True))
+
+
+def extract_main_text(html: str | bytes) -> str:
+    """
+    Returns the readable main text of an HTML page, one block per line.
+
+    Args:
+        html: The page markup. Bytes are preferred so lxml can honour the
+            page's declared charset.
+    """
+    if not html:
+        return ""
+    if LXML_AVAILABLE:
+        return _extract_lxml(html)
+    return _extract_bs4(html)
+
+
+def needs_javascript(html: str | bytes, text: str) -> bool:
+    """
+    True when a plain fetch of `html` produced too little text to trust,
+    i.e. the page is (probably) rendered by client-side JavaScript or the
+    site served a block page instead of content.
+    """
+    if len(text) >= CONFIDENT_STATIC_CHARS:
+        return False
+    if len(text) < MIN_STATIC_CHARS:
+        return True
+    if isinstance(html, bytes):
+        html = html[:200000].decode('utf-8', 'replace')
+    return bool(JS_SHELL_MARKERS.search(html[:200000]))
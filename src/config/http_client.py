@@ -0,0 +1,157 @@
+"""
+Shared HTTP client layer for the research agent's model and search backends.
+
+`HTTPClient` wraps one pooled keep-alive `requests.Session` with per-host
+connection pool sizes, default connect/read timeouts and retries with
+exponential backoff. `AsyncHTTPClient` offers the same policy to asyncio
+code; it uses aiohttp when installed and otherwise runs the pooled sync
+client on worker threads, so callers never need to care which is present.
+"""
+
+import asyncio
+import random
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+    # ConnectionTimeoutError (aiohttp >= 3.10) separates connect timeouts from read timeouts.
+    CONNECT_ERRORS = (aiohttp.ClientConnectorError,) + (
+        (aiohttp.ConnectionTimeoutError,) if hasattr(aiohttp, "ConnectionTimeoutError") else ())
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class HTTPClient:
+    """
+    A pooled, retrying `requests.Session` shared across threads.
+
+    Args:
+        pool_sizes: Keep-alive connections to hold per host, e.g.
+            {"localhost:11434": 16}. Hosts not listed use `default_pool_size`.
+        default_pool_size: Pool size for any other host.
+        max_hosts: Hosts whose pools are kept alive at once by the default
+            adapter (least recently used hosts are dropped beyond that).
+        connect_timeout: Seconds to establish a connection.
+        read_timeout: Seconds to wait between bytes of the response.
+        retries: Retry attempts for connection errors and RETRY_STATUSES. Read
+            timeouts are never retried: a POST that timed out may still be
+            running on the server (e.g. a model generation), and re-sending
+            it would only queue the same work again.
+        backoff: Base backoff in seconds (doubles per attempt).
+    """
+
+    def __init__(self, pool_sizes: dict[str, int] | None = None, default_pool_size: int = 10, max_hosts: int = 32,
+                 connect_timeout: float = 5, read_timeout: float = 60, retries: int = 3, backoff: float = 0.5):
+        self.pool_sizes = pool_sizes or {}
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter(default_pool_size, max_hosts))
+        self.session.mount("https://", self._adapter(default_pool_size, max_hosts))
+        for host, size in self.pool_sizes.items():
+            # requests picks the longest matching mount prefix, so these win over the defaults.
+            self.session.mount(f"http://{host}", self._adapter(size))
+            self.session.mount(f"https://{host}", self._adapter(size))
+
+    def _adapter(self, pool_size: int, hosts: int = 1) -> HTTPAdapter:
+        retry = Retry(
+            total=self.retries,
+            read=0,
+            backoff_factor=self.backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        # pool_block=False: requests cannot bound the wait for a free connection, so a burst
+        # beyond pool_size opens extra connections (closed after use) instead of hanging.
+        return HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size, pool_block=False, max_retries=retry)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Issues a request through the shared session with the default timeouts."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHTTPClient:
+    """
+    The asyncio counterpart of `HTTPClient`, with the same pooling policy.
+
+    Responses are returned as `(status, headers, body_bytes)` so callers do
+    not depend on which transport is in use.
+    """
+
+    def __init__(self, sync_client: HTTPClient, total_pool_size: int = 100):
+        self.sync_client = sync_client
+        self.total_pool_size = total_pool_size
+        self._session = None
+        self._host_limits = {}
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            connect_timeout, read_timeout = self.sync_client.timeout
+            connector = aiohttp.TCPConnector(limit=self.total_pool_size, limit_per_host=0, keepalive_timeout=60)
+            timeout = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        # aiohttp only has one per-host limit, so per-host pool sizes are enforced here.
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.sync_client.pool_sizes.get(host, 10))
+        return self._host_limits[host]
+
+    async def request(self, method: str, url: str, **kwargs) -> tuple[int, dict, bytes]:
+        """
+        Issues a request with retries and backoff, returning (status, headers, body).
+
+        `timeout` may be a (connect, read) tuple, as for `HTTPClient`, to
+        override the session's defaults for this request.
+        """
+        if not AIOHTTP_AVAILABLE:
+            response = await asyncio.to_thread(self.sync_client.request, method, url, **kwargs)
+            return response.status_code, dict(response.headers), response.content
+
+        if isinstance(kwargs.get("timeout"), tuple):
+            connect_timeout, read_timeout = kwargs["timeout"]
+            kwargs["timeout"] = aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+        session = await self._get_session()
+        attempt = 0
+        while True:
+            try:
+                async with self._host_limit(url):
+                    async with session.request(method, url, **kwargs) as response:
+                        body = await response.read()
+                        if response.status not in RETRY_STATUSES or attempt >= self.sync_client.retries:
+                            return response.status, dict(response.headers), body
+            except CONNECT_ERRORS:
+                # Same policy as the sync client: only retry when the request never reached the
+                # server; after a read timeout or disconnect it may still be running there.
+                if attempt >= self.sync_client.retries:
+                    raise
+            attempt += 1
+            # Exponential backoff with jitter so concurrent sessions do not retry in lockstep.
+            await asyncio.sleep(self.sync_client.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,194 @@
+"""
+Chat model backends for the research agent.
+
+The agent talks to its model through a `ModelBackend`, so the same loop can
+run against Ollama's native `/api/chat` or any OpenAI-compatible
+`/v1/chat/completions` server (vLLM, llama.cpp's server, TGI, ...).
+
+Backends differ only in request payloads and response framing: Ollama
+streams newline-delimited JSON objects, OpenAI-compatible servers stream
+server-sent events ending in `data: [DONE]`. Both share the process-wide
+pooled `HTTPClient` / `AsyncHTTPClient` of their caller.
+
+vLLM schedules every request in flight into one continuously batched
+forward pass, so its total throughput keeps growing with the number of
+concurrent requests; Ollama runs a handful of requests in parallel at most.
+`concurrency` is the number of in-flight requests worth issuing to each
+(agent_server.py uses it for its model-call limit; measure your own server
+with vllm_bench.py).
+"""
+
+import json
+from collections.abc import Iterator
+
+from http_client import AsyncHTTPClient, HTTPClient
+
+
+class ModelBackendError(RuntimeError):
+    """The model server rejected a request or returned something unusable."""
+
+
+class ModelBackend:
+    """
+    Base class: one chat model behind one HTTP endpoint.
+
+    Args:
+        url: Endpoint of the server (see the subclasses for what is expected).
+        model: Model name sent with every request.
+        http: Pooled client used for blocking and streaming calls.
+        async_http: Client used by `chat_async`; built from `http` if omitted.
+        options: Sampling options such as {"temperature": 0, "max_tokens": 512}.
+        concurrency: In-flight requests worth issuing; None = the backend's default.
+    """
+
+    name = "model"
+    default_concurrency = 4
+
+    def __init__(self, url: str, model: str, http: HTTPClient, async_http: AsyncHTTPClient | None = None,
+                 options: dict | None = None, concurrency: int | None = None):
+        self.url = url
+        self.model = model
+        self.http = http
+        self.async_http = async_http or AsyncHTTPClient(http)
+        self.options = dict(options or {})
+        self.concurrency = concurrency or self.default_concurrency
+
+    # --- protocol hooks ---
+
+    @property
+    def endpoint(self) -> str:
+        return self.url
+
+    def headers(self) -> dict:
+        return {}
+
+    def payload(self, messages: list[dict], stream: bool) -> dict:
+        raise NotImplementedError
+
+    def parse_reply(self, data: dict) -> str:
+        raise NotImplementedError
+
+    def parse_stream_line(self, line: bytes) -> tuple[str, bool]:
+        """Returns (content token, done) for one line of a streamed reply."""
+        raise NotImplementedError
+
+    # --- requests ---
+
+    def chat(self, messages: list[dict]) -> str:
+        """Returns the model's complete reply to `messages`."""
+        response = self.http.post(self.endpoint, headers=self.headers(), json=self.payload(messages, stream=False))
+        if response.status_code >= 400:
+            raise ModelBackendError(f"HTTP {response.status_code} from {self.name}: {response.text[:200]}")
+        return self.parse_reply(response.json())
+
+    async def chat_async(self, messages: list[dict]) -> str:
+        """Awaitable `chat` sharing the same connection pool."""
+        status, _, body = await self.async_http.request(
+            "POST", self.endpoint, headers=self.headers(), json=self.payload(messages, stream=False))
+        if status >= 400:
+            raise ModelBackendError(f"HTTP {status} from {self.name}: {body[:200].decode('utf-8', 'replace')}")
+        return self.parse_reply(json.loads(body))
+
+    def chat_stream(self, messages: list[dict]) -> Iterator[str]:
+        """
+        Yields content tokens of the reply as they arrive.
+
+        Closing the generator early closes the HTTP response, which makes
+        the server abandon the generation.
+        """
+        with self.http.post(self.endpoint, headers=self.headers(), json=self.payload(messages, stream=True),
+                            stream=True) as response:
+            if response.status_code >= 400:
+                raise ModelBackendError(f"HTTP {response.status_code} from {self.name}: {response.text[:200]}")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                token, done = self.parse_stream_line(line)
+                if token:
+                    yield token
+                if done:
+                    break
+
+
+class OllamaBackend(ModelBackend):
+    """Ollama's native chat API; `url` is the full `/api/chat` endpoint."""
+
+    name = "Ollama"
+    default_concurrency = 4  # Ollama's default OLLAMA_NUM_PARALLEL
+
+    def payload(self, messages, stream):
+        payload = {"model": self.model, "stream": stream, "messages": messages}
+        options = dict(self.options)
+        if "max_tokens" in options:
+            options["num_predict"] = options.pop("max_tokens")
+        if options:
+            payload["options"] = options
+        return payload
+
+    def parse_reply(self, data):
+        return data.get("message", {}).get("content", "Error: Empty response from model.")
+
+    def parse_stream_line(self, line):
+        # One JSON object per line (NDJSON).
+        chunk = json.loads(line)
+        return chunk.get("message", {}).get("content", ""), bool(chunk.get("done"))
+
+
+class OpenAIBackend(ModelBackend):
+    """
+    An OpenAI-compatible server such as vLLM; `url` is the API base, e.g.
+    "http://localhost:8000/v1".
+
+    Args:
+        api_key: Bearer token for hosted endpoints; local vLLM needs none.
+    """
+
+    name = "OpenAI-compatible server"
+    default_concurrency = 32  # vLLM batches concurrent requests; throughput keeps rising well past this
+
+    def __init__(self, *args, api_key: str | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_key = api_key
+
+    @property
+    def endpoint(self):
+        return self.url.rstrip("/") + "/chat/completions"
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def payload(self, messages, stream):
+        return dict(self.options, model=self.model, stream=stream, messages=messages)
+
+    def parse_reply(self, data):
+        choices = data.get("choices") or [{}]
+        return choices[0].get("message", {}).get("content") or "Error: Empty response from model."
+
+    def parse_stream_line(self, line):
+        # Server-sent events: "data: {...}" per chunk, "data: [DONE]" at the end, ":" comment keep-alives.
+        if not line.startswith(b"data:"):
+            return "", False
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return "", True
+        choices = json.loads(data).get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content") or "", False
+
+
+BACKENDS = {"ollama": OllamaBackend, "openai": OpenAIBackend}
+
+
+def create_backend(kind: str, url: str, model: str, http: HTTPClient, **kwargs) -> ModelBackend:
+    """
+    Builds the backend registered as `kind` ("ollama" or "openai").
+
+    Raises:
+        ValueError: If `kind` is not a known backend.
+    """
+    try:
+        backend_class = BACKENDS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown model backend {kind!r}; expected one of {', '.join(BACKENDS)}") from None
+    if backend_class is not OpenAIBackend:
+        kwargs.pop("api_key", None)
+    return backend_class(url, model, http, **kwargs)
@@ -0,0 +1,310 @@
+"""
+Token-budgeted prompt assembly for the research agent.
+
+Instead of appending every tool result to the conversation forever, the
+agent keeps its evidence here. Long page text is split into chunks, and
+each model request is rebuilt from:
+
+1. the system prompt, earlier messages of the conversation (as many of the
+   most recent as fit the history share of the budget) and the question;
+2. the tool-call history, newest first, with older steps compacted into a
+   one-line summary once they no longer fit the history share of the budget;
+3. the page chunks most relevant to the question (ranked with BM25),
+   added until the token budget is full.
+
+Token counts are estimated from character length, which is close enough
+to keep Ollama's prefill bounded without loading the model's tokenizer.
+"""
+
+import json
+import math
+import re
+from collections import Counter
+
+CHARS_PER_TOKEN = 4
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this "
+    "to was were what when where which who why will with do does did i you your".split()
+)
+
+_SECTION = re.compile(r'^## (?P<title>.*)\nSource: (?P<url>\S+)\n', re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximates the token count of `text` (about four characters per token)."""
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased word terms for lexical scoring, without common stopwords."""
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS]
+
+
+def chunk_text(text: str, max_chars: int = 800) -> list[str]:
+    """
+    Splits text into chunks of at most `max_chars`, breaking on lines and
+    then sentences so chunks stay readable.
+    """
+    pieces = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) <= max_chars:
+            pieces.append(line)
+            continue
+        for sentence in re.split(r'(?<=[.!?])\s+', line):
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class BM25:
+    """
+    Okapi BM25 over a fixed set of tokenized documents.
+
+    Args:
+        documents: One list of terms per document.
+        k1: Term frequency saturation.
+        b: Length normalization strength.
+    """
+
+    def __init__(self, documents: list[list[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = (sum(self.lengths) / len(documents)) if documents else 0.0
+        document_frequency = Counter(term for doc in documents for term in set(doc))
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query: list[str]) -> list[float]:
+        results = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            for term in set(query):
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+class PromptAssembler:
+    """
+    Builds bounded model requests for one question from the tool calls made so far.
+
+    Args:
+        system_prompt: The agent's system prompt.
+        question: The user's question; chunks are ranked against it.
+        budget_tokens: Approximate token limit for every request.
+        history_share: Fraction of the budget the tool-call history may use
+            before older steps are compacted.
+        chunk_chars: Maximum characters per page chunk.
+        inline_chars: Text results up to this length (errors, short answers)
+            are kept inline instead of being chunked.
+        conversation: Earlier `{"role", "content"}` messages of the same
+            conversation, oldest first.
+    """
+
+    def __init__(self, system_prompt: str, question: str, budget_tokens: int = 6000,
+                 history_share: float = 0.25, chunk_chars: int = 800, inline_chars: int = 400,
+                 conversation: list[dict] | None = None):
+        self.system_prompt = system_prompt
+        self.question = question
+        self.conversation = list(conversation or [])
+        self.budget_tokens = budget_tokens
+        self.history_share = history_share
+        self.chunk_chars = chunk_chars
+        self.inline_chars = inline_chars
+
+        self._turns = []  # (assistant text, [(tool name, tool args, inline result or None), ...])
+        self._chunks = []  # (source label, text)
+        self._seen_chunks = set()
+        self._query_terms = tokenize(question)
+
+    def add_tool_result(self, assistant_text: str, tool_name: str, tool_args: dict, result) -> None:
+        """Records a single tool call and its result (see `add_tool_results`)."""
+        self.add_tool_results(assistant_text, [(tool_name, tool_args, result)])
+
+    def add_tool_results(self, assistant_text: str, results: list[tuple[str, dict, object]]) -> None:
+        """
+        Records the tool calls of one model response and their results, which
+        go back to the model together in one message. Long text becomes
+        ranked chunks; anything else (search result lists, short messages)
+        stays inline.
+
+        Args:
+            assistant_text: The model response that made the calls.
+            results: `(tool name, tool args, result)` per call, in call order.
+        """
+        calls = []
+        for tool_name, tool_args, result in results:
+            inline = result
+            if isinstance(result, str) and len(result) > self.inline_chars:
+                added = self._add_chunks(result, default_source=tool_args.get("url") or tool_name)
+                inline = None
+                if not added:
+                    inline = "No new content (already read)."
+            calls.append((tool_name, tool_args, inline))
+            # Words the model searched for are good evidence for what it still needs.
+            if isinstance(tool_args.get("query"), str):
+                self._query_terms += tokenize(tool_args["query"])
+        self._turns.append((assistant_text, calls))
+
+    def _add_chunks(self, text: str, default_source: str) -> int:
+        sections = list(_SECTION.finditer(text))
+        if sections:
+            # search_and_read output: "## title\nSource: url\ncontent" per page
+            bounds = [m.start() for m in sections[1:]] + [len(text)]
+            parts = [(f"{m['title']} ({m['url']})", text[m.end():end]) for m, end in zip(sections, bounds)]
+        else:
+            parts = [(default_source, text)]
+
+        added = 0
+        for source, body in parts:
+            for chunk in chunk_text(body, self.chunk_chars):
+                key = ' '.join(chunk.lower().split())
+                if key in self._seen_chunks:
+                    continue
+                self._seen_chunks.add(key)
+                self._chunks.append((source, chunk))
+                added += 1
+        return added
+
+    def _render_result(self, calls: list, excerpts: str | None) -> str:
+        if len(calls) == 1:
+            inline = calls[0][2]
+            payload = {"tool_result": inline if inline is not None else excerpts or "No relevant content found."}
+            if inline is not None and excerpts:
+                payload["relevant_excerpts"] = excerpts
+        else:
+            # One entry per call, in call order; page text from all of them is ranked together.
+            payload = {"tool_results": [
+                {"tool": name, "args": args, "result": inline if inline is not None else "[page text: see relevant_excerpts]"}
+                for name, args, inline in calls
+            ]}
+            payload["relevant_excerpts"] = excerpts or "No relevant content found."
+        return json.dumps(payload, ensure_ascii=False)
+
+    def _compact_result(self, calls: list) -> str:
+        def compact(tool_name, inline):
+            if inline is None:
+                return f"[{tool_name} content stored; the most relevant excerpts are shown in the latest tool result]"
+            return inline
+        if len(calls) == 1:
+            return json.dumps({"tool_result": compact(calls[0][0], calls[0][2])}, ensure_ascii=False)
+        return json.dumps({"tool_results": [{"tool": name, "result": compact(name, inline)} for name, _, inline in calls]},
+                          ensure_ascii=False)
+
+    def _rank_chunks(self) -> list[tuple[str, str]]:
+        if not self._chunks:
+            return []
+        bm25 = BM25([tokenize(f"{source} {text}") for source, text in self._chunks])
+        scores = bm25.scores(self._query_terms)
+        # Ties (e.g. no overlapping terms) keep reading order
+        order = sorted(range(len(self._chunks)), key=lambda i: (-scores[i], i))
+        return [self._chunks[i] for i in order]
+
+    def _excerpts(self, budget: int) -> str | None:
+        lines, used = [], 0
+        for number, (source, text) in enumerate(self._rank_chunks(), 1):
+            entry = f"[{number}] {source}\n{text}"
+            cost = estimate_tokens(entry) + 1
+            if used + cost > budget:
+                continue
+            lines.append(entry)
+            used += cost
+        return "\n\n".join(lines) if lines else None
+
+    def _recent_conversation(self, budget: int) -> list[dict]:
+        """The latest earlier messages that fit `budget`, starting with a user message."""
+        kept, used = [], 0
+        for message in reversed(self.conversation):
+            cost = estimate_tokens(message["content"])
+            if used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+        while kept and kept[0]["role"] != "user":
+            kept.pop(0)
+        return kept
+
+    def messages(self) -> list[dict]:
+        """Returns the chat messages for the next model request, within the token budget."""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        messages += self._recent_conversation(int(self.budget_tokens * self.history_share))
+        messages.append({"role": "user", "content": self.question})
+        if not self._turns:
+            return messages
+        used = sum(estimate_tokens(m["content"]) for m in messages)
+
+        # Latest step is always shown in full; inline results are clipped to a quarter of the budget.
+        *older, latest = self._turns
+        clip_chars = self.budget_tokens * CHARS_PER_TOKEN // 4
+        history = []
+        history_budget = int(self.budget_tokens * self.history_share)
+        history_used = 0
+        kept = 0
+        for assistant_text, calls in reversed(older):
+            pair = [
+                {"role": "assistant", "content": assistant_text},
+                {"role": "user", "content": self._compact_result(_clip_calls(calls, clip_chars))},
+            ]
+            cost = sum(estimate_tokens(m["content"]) for m in pair)
+            if history_used + cost > history_budget:
+                break
+            history = pair + history
+            history_used += cost
+            kept += 1
+
+        dropped = older[:len(older) - kept]
+        if dropped:
+            calls = [(name, args) for _, turn_calls in dropped for name, args, _ in turn_calls]
+            steps = [f"{name}({json.dumps(args, ensure_ascii=False)})" for name, args in calls[-10:]]
+            if len(calls) > 10:
+                steps.insert(0, f"... {len(calls) - 10} earlier steps")
+            summary = "Earlier steps (results summarized in the excerpts below): " + "; ".join(steps)
+            history = [{"role": "user", "content": summary}] + history
+            history_used += estimate_tokens(summary)
+
+        assistant_text, calls = latest
+        calls = _clip_calls(calls, clip_chars)
+        latest_messages = [{"role": "assistant", "content": assistant_text}]
+        fixed = used + history_used + estimate_tokens(assistant_text) + estimate_tokens(self._render_result(calls, None))
+        excerpts = self._excerpts(max(0, self.budget_tokens - fixed))
+        latest_messages.append({"role": "user", "content": self._render_result(calls, excerpts)})
+        return messages + history + latest_messages
+
+
+def _clip_calls(calls: list, max_chars: int) -> list:
+    """Clips the inline results of one turn's calls to share `max_chars` between them."""
+    share = max_chars // max(1, len(calls))
+    return [(name, args, _clip(inline, share)) for name, args, inline in calls]
+
+
+def _clip(value, max_chars: int):
+    """Shortens inline results that would crowd out everything else."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars] + "..."
+    encoded = json.dumps(value, ensure_ascii=False)
+    return value if len(encoded) <= max_chars else encoded[:max_chars] + "..."
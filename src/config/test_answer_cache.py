@@ -0,0 +1,38 @@
+"""Tests for near-duplicate matching in answer_cache.py (run with pytest from src/config)."""
+
+import pytest
+
+from answer_cache import AnswerCache
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(ttl=3600, path=None)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("What is 5 minus 3", "What is 3 minus 5"),
+    ("Is Harare bigger than Bulawayo", "Is Bulawayo bigger than Harare"),
+    ("What is the difference between mitosis and meiosis",
+     "What is the difference between meiosis and mitosis"),
+])
+def test_reversed_questions_do_not_share_an_answer(cache, stored, asked):
+    cache.set(stored, "stored answer")
+    assert cache.get(asked) is None
+    assert cache.get(stored)["match"] == "exact"
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Who built the Great Zimbabwe?", "who built Great Zimbabwe"),
+    ("What's the capital of Zimbabwe?", "What is the capital of Zimbabwe"),
+])
+def test_rewordings_share_an_answer(cache, stored, asked):
+    cache.set(stored, "stored answer")
+    hit = cache.get(asked)
+    assert hit is not None
+    assert hit["answer"] == "stored answer"
+
+
+def test_different_numbers_do_not_share_an_answer(cache):
+    cache.set("What is 12 times 4", "48")
+    assert cache.get("What is 12 times 5") is None
@@ -3,48 +3,158 @@
 # Save this as: tts_service.py
 # ============================================
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-import torch
 import base64
+import importlib.util
 import io
 import os
 import tempfile
 import json
+import hashlib
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
-# Import TTS
-try:
-    from TTS.api import TTS
-    COQUI_AVAILABLE = True
-except ImportError:
-    COQUI_AVAILABLE = False
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
+
+from tts_admission import AdmissionController, Overloaded
+from tts_audio import (MIME_TYPES, SENTENCE_GAP_SECONDS, AudioFormatError, concat_wavs, decode_wav, encode_audio,
+                       encode_wav, format_info, join_waveforms, supported_formats)
+from tts_batch import MANIFEST_NAME, manifest_entry, parse_items, plan_batch, read_items, stream_zip
+from tts_cache import SynthesisCache
+from tts_frontend import PhonemeCache, install_phoneme_cache, normalize_text, split_sentences
+from tts_scheduler import DeadlineExceeded, InferenceScheduler
+from tts_models import ModelRegistry, SpeakerLatentCache
+from tts_startup import StartupTracker
+from tts_workers import ProcessWorkerPool, WorkerProcessError
+
+# torch and Coqui take seconds to import, so they are imported on the startup
+# thread (see load_engines); here we only check that they are installed
+TTS = None
+COQUI_AVAILABLE = importlib.util.find_spec('TTS') is not None
+if not COQUI_AVAILABLE:
     print("Warning: Coqui TTS not available. Install with: pip install TTS")
 
+# Deterministic stand-in for Coqui (benchmarks, CI): no model downloads needed
+if os.environ.get('TTS_STUB_ENGINE'):
+    COQUI_AVAILABLE = True
+    print("Using the stub TTS engine (TTS_STUB_ENGINE is set)")
+
 # Fallback to pyttsx3
-try:
-    import pyttsx3
-    PYTTSX3_AVAILABLE = True
-except ImportError:
-    PYTTSX3_AVAILABLE = False
+PYTTSX3_AVAILABLE = importlib.util.find_spec('pyttsx3') is not None
+if not PYTTSX3_AVAILABLE:
     print("Warning: pyttsx3 not available. Install with: pip install pyttsx3")
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for your Express backend
 
 # Global TTS instance
+DEFAULT_MODEL = "tts_models/en/ljspeech/glow-tts"
+XTTS_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
 tts_engine = None
+tts_model_name = None
 voice_engine = None
 
+# Synthesis cache: whole responses plus individual sentences, so long texts
+# reuse sentences that were synthesized before
+CACHE_DIR = os.environ.get('TTS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'chikoro-tts-cache'))
+CACHE_MEMORY_MB = int(os.environ.get('TTS_CACHE_MEMORY_MB', 128))
+CACHE_DISK_MB = int(os.environ.get('TTS_CACHE_DISK_MB', 2048))
+response_cache = SynthesisCache('responses', CACHE_MEMORY_MB * 1024 * 1024 // 2, CACHE_DIR, CACHE_DISK_MB * 1024 * 1024 // 2)
+sentence_cache = SynthesisCache('sentences', CACHE_MEMORY_MB * 1024 * 1024 // 2, CACHE_DIR, CACHE_DISK_MB * 1024 * 1024 // 2)
+
+# Micro-batching: how many pending sentences to group, and how long to wait for them
+MAX_BATCH_SIZE = int(os.environ.get('TTS_MAX_BATCH_SIZE', 8))
+MAX_BATCH_WAIT_MS = float(os.environ.get('TTS_MAX_BATCH_WAIT_MS', 10))
+
+# Resident models: loaded lazily, evicted LRU beyond this budget (the default model is pinned)
+MODEL_MEMORY_MB = int(os.environ.get('TTS_MODEL_MEMORY_MB', 4096))
+PRELOAD_MODELS = [m.strip() for m in os.environ.get('TTS_PRELOAD_MODELS', '').split(',') if m.strip()]
+SPEAKER_CACHE_SIZE = int(os.environ.get('TTS_SPEAKER_CACHE_SIZE', 64))
+
+# Process pool mode for CPU nodes: N forked workers sharing the model weights copy-on-write
+NUM_WORKERS = int(os.environ.get('TTS_WORKERS', 1))
+THREADS_PER_WORKER = int(os.environ.get('TTS_THREADS_PER_WORKER', 0)) or None
+WORKER_TIMEOUT = float(os.environ.get('TTS_WORKER_TIMEOUT', 120))
+
+# Phonemes of recently seen clauses and words, so espeak is not re-run for known vocabulary
+# (in process pool mode each worker fills its own copy after the fork)
+PHONEME_CACHE_SIZE = int(os.environ.get('TTS_PHONEME_CACHE_SIZE', 50000))
+phoneme_cache = PhonemeCache(PHONEME_CACHE_SIZE)
+
+# Admission control: requests doing synthesis at once, how many more may wait for a slot,
+# and how long a request may wait before its work starts (clients may ask for less
+# with an X-Request-Timeout header, in seconds). Beyond that: 429/503 with Retry-After
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('TTS_MAX_CONCURRENT', 0)) or MAX_BATCH_SIZE * max(1, NUM_WORKERS)
+MAX_QUEUED_REQUESTS = int(os.environ.get('TTS_MAX_QUEUE', 32))
+REQUEST_TIMEOUT = float(os.environ.get('TTS_REQUEST_TIMEOUT', 30))
+admission = AdmissionController(MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS)
+
+# Bulk synthesis (/synthesize-batch): items per request, and sentences a bulk job keeps
+# queued at once so it shares the model with interactive requests instead of starving them
+BATCH_MAX_ITEMS = int(os.environ.get('TTS_BATCH_MAX_ITEMS', 10000))
+BATCH_WINDOW = int(os.environ.get('TTS_BATCH_WINDOW', 0)) or MAX_BATCH_SIZE * max(1, NUM_WORKERS)
+
+# Payload limits (413 beyond them), so one request cannot hold unbounded memory
+MAX_TEXT_CHARS = int(os.environ.get('TTS_MAX_TEXT_CHARS', 5000))
+MAX_SPEAKER_WAV_BYTES = int(float(os.environ.get('TTS_MAX_SPEAKER_WAV_MB', 10)) * 1024 * 1024)
+# Base64 inflates the reference audio by 4/3; leave room for the text and JSON framing
+MAX_REQUEST_BYTES = MAX_SPEAKER_WAV_BYTES * 4 // 3 + MAX_TEXT_CHARS * 4 + 64 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# Startup: models load on a background thread after the port is bound. A warm-up
+# inference (per worker process) pays first-call costs before the instance reports
+# ready; synthesis requests arriving earlier get 503 with Retry-After
+WARMUP_ENABLED = os.environ.get('TTS_WARMUP', '1') != '0'
+WARMUP_TEXT = os.environ.get('TTS_WARMUP_TEXT', 'Welcome to Chikoro AI. Let us begin the lesson.')
+startup = StartupTracker(['importing', 'loading_model', 'starting_workers', 'warming_up'],
+                         retry_after=int(os.environ.get('TTS_STARTUP_RETRY_AFTER', 5)))
+
+# Prometheus metrics (served on /metrics); cache and queue gauges are collected from their stats
+REQUEST_SECONDS = REGISTRY.histogram('tts_request_seconds', 'Time to produce a response (time to first byte for streams)', ('endpoint',))
+REQUESTS = REGISTRY.counter('tts_requests_total', 'Requests by endpoint and HTTP status', ('endpoint', 'status'))
+STAGE_SECONDS = REGISTRY.histogram('tts_stage_seconds', 'Time spent per pipeline stage (queue_wait, inference, exclusive, encoding)', ('stage',))
+BYTES_OUT = REGISTRY.counter('tts_audio_bytes_out_total', 'Encoded audio bytes sent to clients', ('endpoint', 'format'))
+ERRORS = REGISTRY.counter('tts_errors_total', 'Failed requests by exception type', ('endpoint', 'type'))
+REJECTED = REGISTRY.counter('tts_rejected_total', 'Requests turned away by admission control', ('endpoint', 'reason'))
+
+def import_engines():
+    """Import torch and Coqui (or the stub); on failure fall back to pyttsx3"""
+    global TTS, COQUI_AVAILABLE
+    if not COQUI_AVAILABLE:
+        return
+    try:
+        import torch  # noqa: F401 -- the bulk of the import time
+        if os.environ.get('TTS_STUB_ENGINE'):
+            from tts_stub import StubTTS as TTS
+        else:
+            from TTS.api import TTS
+    except ImportError as e:
+        COQUI_AVAILABLE = False
+        print(f"Warning: Coqui TTS could not be imported ({e}). Install with: pip install TTS")
+
+def load_coqui_model(model_name):
+    """Load a Coqui model onto the GPU if available"""
+    import torch
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    tts = TTS(model_name).to(device)
+    install_phoneme_cache(tts, phoneme_cache)
+    return tts
+
+model_registry = ModelRegistry(load_coqui_model, MODEL_MEMORY_MB * 1024 * 1024, pinned=[DEFAULT_MODEL])
+speaker_latents = SpeakerLatentCache(SPEAKER_CACHE_SIZE)
+
 def initialize_tts():
     """Initialize TTS engine based on availability"""
-    global tts_engine, voice_engine
+    global tts_engine, tts_model_name, voice_engine
     
     if COQUI_AVAILABLE:
         try:
-            # Try to use GPU if available
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            print(f"Initializing Coqui TTS on {device}...")
+            print("Initializing Coqui TTS...")
             
             # Start with a fast, lightweight model
             # Options:
@@ -52,7 +162,8 @@ def initialize_tts():
             # - tts_models/en/ljspeech/tacotron2-DDC (better quality, slower)
             # - tts_models/multilingual/multi-dataset/xtts_v2 (best, supports voice cloning)
             
-            tts_engine = TTS("tts_models/en/ljspeech/glow-tts").to(device)
+            tts_engine = model_registry.get(DEFAULT_MODEL)
+            tts_model_name = DEFAULT_MODEL
             print("Coqui TTS initialized successfully!")
             return True
         except Exception as e:
@@ -62,6 +173,7 @@ def initialize_tts():
     if PYTTSX3_AVAILABLE and not tts_engine:
         try:
             print("Falling back to pyttsx3...")
+            import pyttsx3
             voice_engine = pyttsx3.init()
             voice_engine.setProperty('rate', 150)  # Speed
             voice_engine.setProperty('volume', 0.9)  # Volume
@@ -81,19 +193,381 @@ def initialize_tts():
     
     return False
 
-# Initialize on startup
-initialize_tts()
+def submit_sentence(sentence, speaker=None, deadline=None):
+    """Queue one sentence for Coqui (or serve it from the cache); returns a Future with its WAV bytes"""
+    key = SynthesisCache.make_key(sentence, tts_model_name, speaker or 'default', 'en', 'wav')
+    audio_data = sentence_cache.get(key)
+    if audio_data is not None:
+        future = Future()
+        future.set_result(audio_data)
+        return future
+
+    # The inference worker owns the model; concurrent identical sentences share one run.
+    # Still queued at the deadline -> DeadlineExceeded, without running the model
+    return scheduler.submit(key, (key, sentence, speaker), deadline=deadline)
+
+def synthesize_sentence(sentence, speaker=None, deadline=None):
+    """Synthesize one sentence with Coqui, reusing cached audio when possible"""
+    return submit_sentence(sentence, speaker, deadline).result()
+
+def synthesize_texts(jobs, audio_format='wav', bitrate=None, sample_rate=None):
+    """
+    Yield (audio bytes, None) or (None, exception) for each (text, voice_id) job, in order.
+    Sentences of the next texts are queued while earlier ones finish, up to BATCH_WINDOW,
+    so the scheduler can batch them. Results go into the response cache under the same
+    key as /synthesize, so pre-generated lesson audio is also instant there
+    """
+    cache_format = output_cache_format(audio_format, bitrate, sample_rate)
+    pending = deque()  # (cache key, sentence futures, cached audio)
+    queued = 0
+    
+    def finish():
+        nonlocal queued
+        cache_key, futures, cached_audio = pending.popleft()
+        queued -= len(futures)
+        if cached_audio is not None:
+            return cached_audio, None
+        try:
+            audio_data = transcode_wav(concat_wavs([f.result() for f in futures]), audio_format, bitrate, sample_rate)
+        except Exception as e:
+            return None, e
+        response_cache.put(cache_key, audio_data)
+        return audio_data, None
+    
+    for text, voice_id in jobs:
+        while pending and queued >= BATCH_WINDOW:
+            yield finish()
+        cache_key = SynthesisCache.make_key(text, tts_model_name, voice_id, 'en', cache_format)
+        cached_audio = response_cache.get(cache_key)
+        futures = []
+        if cached_audio is None:
+            speaker = voice_id if voice_id != 'default' else None
+            futures = [submit_sentence(sentence, speaker) for sentence in split_sentences(normalize_text(text)) or [text]]
+        pending.append((cache_key, futures, cached_audio))
+        queued += len(futures)
+    while pending:
+        yield finish()
+
+def synthesize_batch_local(items):
+    """
+    Synthesize a batch of (sentence, speaker) items with this process's model.
+    Coqui has no batched inference API for these models, so the batch runs
+    back to back under one inference_mode; per-item failures are returned as
+    exceptions so one bad sentence does not fail the whole batch
+    """
+    import torch
+    results = []
+    with torch.inference_mode():
+        for sentence, speaker in items:
+            try:
+                # Waveform goes straight to an in-memory encoder, no temp files
+                waveform = tts_engine.tts(text=sentence, speaker=speaker)
+                results.append(encode_wav(waveform, tts_engine.synthesizer.output_sample_rate))
+            except Exception as e:
+                # Plain error type so it pickles cleanly back from worker processes
+                results.append(WorkerProcessError(f"{type(e).__name__}: {e}"))
+    return results
+
+def run_sentence_batch(items):
+    """Run a batch of (cache_key, sentence, speaker) items in-process or on an idle worker process"""
+    work = [(sentence, speaker) for _, sentence, speaker in items]
+    if worker_pool:
+        results = worker_pool.call(work, timeout=WORKER_TIMEOUT)
+    else:
+        results = synthesize_batch_local(work)
+    
+    # The cache lives in this (parent) process, so fill it here
+    for (key, _, _), audio_data in zip(items, results):
+        if isinstance(audio_data, bytes):
+            sentence_cache.put(key, audio_data)
+    return results
+
+worker_pool = None
+
+# Inference worker thread(s) that own the model and batch pending sentences;
+# in pool mode there is one dispatch thread per worker process. Started by load_engines
+scheduler = InferenceScheduler(
+    run_sentence_batch,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_BATCH_WAIT_MS,
+    num_workers=1,
+    observe=lambda stage, seconds: STAGE_SECONDS.observe(seconds, stage=stage)
+)
+
+def warm_up():
+    """
+    Run one uncached inference per model process, and encode it in every format,
+    so lazy initialization, kernel selection and allocator growth happen before
+    the first student request rather than during it
+    """
+    work = [(WARMUP_TEXT, None)]
+    if worker_pool:
+        # Each call holds its worker until done, so concurrent calls reach every worker once
+        with ThreadPoolExecutor(worker_pool.num_workers) as pool:
+            results = list(pool.map(lambda _: worker_pool.call(work, timeout=WORKER_TIMEOUT)[0],
+                                    range(worker_pool.num_workers)))
+    else:
+        results = synthesize_batch_local(work)
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+    for audio_format in supported_formats():
+        transcode_wav(results[0], audio_format)
+
+def load_worker_engine():
+    """Worker pool initializer: load the model in the pool's loader process, for the workers to inherit"""
+    import_engines()
+    initialize_tts()
+    if not tts_engine:
+        raise RuntimeError('Coqui TTS could not be loaded')
+
+def load_engines():
+    """Startup thread: import and load the model, start workers, warm up; ready when this returns"""
+    global worker_pool
+    with startup.phase('importing'):
+        import_engines()
+    with startup.phase('loading_model'):
+        if not initialize_tts():
+            raise RuntimeError('No TTS engine could be initialized')
+
+    # The loader process has been loading its own copy alongside; it forks the workers from that
+    if worker_pool:
+        with startup.phase('starting_workers'):
+            try:
+                if not tts_engine:
+                    raise RuntimeError('Coqui TTS is not loaded in this process')
+                worker_pool.start_workers()
+                scheduler.num_workers = NUM_WORKERS
+            except Exception as e:
+                print(f"Failed to start worker pool, running in-process: {e}")
+                worker_pool.close()
+                worker_pool = None
+    scheduler.start()
+
+    if tts_engine and WARMUP_ENABLED:
+        with startup.phase('warming_up'):
+            warm_up()
+
+    # Warm extra models (e.g. XTTS) on the worker without holding back readiness
+    if tts_engine:
+        for preload_name in PRELOAD_MODELS:
+            scheduler.run_exclusive(lambda name=preload_name: model_registry.get(name))
+
+def parse_output_options(data):
+    """Read and validate the requested output format, bitrate (kbps) and sample rate"""
+    audio_format = str(data.get('format') or 'wav').lower()
+    if audio_format not in supported_formats():
+        raise AudioFormatError(f"Unsupported format '{audio_format}'. Use one of: {', '.join(supported_formats())}")
+    try:
+        bitrate = int(data['bitrate']) if data.get('bitrate') else None
+        sample_rate = int(data['sample_rate']) if data.get('sample_rate') else None
+    except (TypeError, ValueError):
+        raise AudioFormatError('bitrate and sample_rate must be integers')
+    if audio_format == 'wav' and bitrate:
+        raise AudioFormatError('bitrate only applies to compressed formats')
+    if sample_rate is not None and not 8000 <= sample_rate <= 48000:
+        raise AudioFormatError('sample_rate must be between 8000 and 48000')
+    return audio_format, bitrate, sample_rate
+
+def output_cache_format(audio_format, bitrate, sample_rate):
+    """Cache key component for an output encoding"""
+    if audio_format == 'wav' and not sample_rate:
+        return 'wav'
+    return f"{audio_format}:{bitrate or ''}:{sample_rate or ''}"
+
+def transcode_wav(wav_data, audio_format='wav', bitrate=None, sample_rate=None):
+    """Re-encode synthesized WAV bytes in the requested output format"""
+    if audio_format == 'wav' and not sample_rate:
+        return wav_data
+    with STAGE_SECONDS.time(stage='encoding'):
+        waveform, source_rate = decode_wav(wav_data)
+        audio_data, _ = encode_audio(waveform, source_rate, audio_format, bitrate, sample_rate)
+    return audio_data
+
+def endpoint_label():
+    """Route pattern of the current request, for metric labels"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def record_error(e):
+    ERRORS.inc(endpoint=endpoint_label(), type=type(e).__name__)
+
+def request_deadline():
+    """time.monotonic() by which this request's synthesis must have started"""
+    timeout = REQUEST_TIMEOUT
+    requested = request.headers.get('X-Request-Timeout')
+    if requested:
+        try:
+            timeout = min(timeout, max(0.0, float(requested)))
+        except ValueError:
+            pass
+    return time.monotonic() + timeout - (time.perf_counter() - g.request_started)
+
+def rejection_response(e):
+    """429/503 with a Retry-After hint for a request shed under overload"""
+    if isinstance(e, Overloaded):
+        status, reason, retry_after = e.status, e.reason, e.retry_after
+    else:
+        status, reason, retry_after = 503, 'deadline', admission.retry_after()
+    REJECTED.inc(endpoint=endpoint_label(), reason=reason)
+    response = jsonify({'error': str(e), 'retry_after': retry_after})
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def too_large_response(message):
+    REJECTED.inc(endpoint=endpoint_label(), reason='too_large')
+    return jsonify({'error': message}), 413
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def reject_oversized_body():
+    # Refuse from the headers alone, before the body is read into memory
+    if request.content_length and request.content_length > MAX_REQUEST_BYTES:
+        return too_large_response(f'Request body exceeds {MAX_REQUEST_BYTES} bytes')
+    if request.method == 'POST' and request.content_length is None:
+        # Chunked upload: read it here (bounded by MAX_CONTENT_LENGTH) so an oversized
+        # body becomes a 413 instead of failing inside an endpoint
+        request.get_data(cache=True)
+
+# Endpoints that need the model; until startup completes they answer 503
+MODEL_ENDPOINTS = {'synthesize', 'synthesize_streaming', 'synthesize_batch', 'clone_voice'}
+
+@app.before_request
+def require_ready():
+    if request.endpoint not in MODEL_ENDPOINTS or startup.ready:
+        return None
+    status = startup.status()
+    REJECTED.inc(endpoint=endpoint_label(), reason='not_ready')
+    if status['state'] == 'failed':
+        return jsonify({'error': 'No TTS engine available', 'startup': status}), 503
+    response = jsonify({'error': 'TTS model is still loading, try again shortly', 'startup': status})
+    return response, 503, {'Retry-After': str(startup.retry_after)}
+
+@app.errorhandler(413)
+def body_too_large(e):
+    return too_large_response(f'Request body exceeds {MAX_REQUEST_BYTES} bytes')
+
+@app.after_request
+def observe_request(response):
+    endpoint = endpoint_label()
+    if endpoint != '/metrics':
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+def collect_service_metrics():
+    """Export cache, queue, model and worker statistics at scrape time"""
+    families = []
+    cache_samples, cache_bytes = [], []
+    for name, cache in (('responses', response_cache), ('sentences', sentence_cache)):
+        stats = cache.stats()
+        for result in ('memory_hits', 'disk_hits', 'misses'):
+            cache_samples.append(({'cache': name, 'result': result}, stats[result]))
+        cache_bytes.append(({'cache': name, 'tier': 'memory'}, stats['memory_bytes']))
+        cache_bytes.append(({'cache': name, 'tier': 'disk'}, stats['disk_bytes']))
+    phonemes = phoneme_cache.stats()
+    for result in ('clause_hits', 'word_hits', 'misses'):
+        cache_samples.append(({'cache': 'phonemes', 'result': result}, phonemes[result]))
+    latents = speaker_latents.stats()
+    cache_samples.append(({'cache': 'speaker_latents', 'result': 'hits'}, latents['hits']))
+    cache_samples.append(({'cache': 'speaker_latents', 'result': 'misses'}, latents['misses']))
+    families.append(('tts_cache_lookups_total', 'counter', 'Cache lookups by cache and result', cache_samples))
+    families.append(('tts_cache_bytes', 'gauge', 'Bytes held per cache tier', cache_bytes))
+
+    scheduler_stats = scheduler.stats()
+    families.append(('tts_queue_pending', 'gauge', 'Jobs waiting for the inference worker', [({}, scheduler_stats['pending'])]))
+    families.append(('tts_batched_items_total', 'counter', 'Sentences run through the batch scheduler', [({}, scheduler_stats['items'])]))
+    families.append(('tts_deduplicated_items_total', 'counter', 'Sentences shared with an identical in-flight request', [({}, scheduler_stats['deduplicated'])]))
+    families.append(('tts_expired_items_total', 'counter', 'Queued jobs dropped because their deadline passed', [({}, scheduler_stats['expired'])]))
+    startup_status = startup.status()
+    families.append(('tts_ready', 'gauge', '1 once the model is loaded and warmed up', [({}, 1 if startup.ready else 0)]))
+    families.append(('tts_startup_phase_seconds', 'gauge', 'Time spent in each startup phase',
+                     [({'phase': name}, seconds) for name, seconds in startup_status['phases'].items()]))
+    admission_stats = admission.stats()
+    families.append(('tts_admission_active', 'gauge', 'Requests holding a synthesis slot', [({}, admission_stats['active'])]))
+    families.append(('tts_admission_waiting', 'gauge', 'Requests waiting for a synthesis slot', [({}, admission_stats['waiting'])]))
+    families.append(('tts_model_resident_bytes', 'gauge', 'Parameter memory of resident models', [({}, model_registry.stats()['resident_bytes'])]))
+    if worker_pool:
+        worker_stats = worker_pool.stats()
+        families.append(('tts_worker_restarts_total', 'counter', 'Worker processes restarted after a crash or timeout', [({}, worker_stats['restarts'])]))
+        families.append(('tts_workers_idle', 'gauge', 'Idle worker processes', [({}, worker_stats['idle'])]))
+    return families
+
+REGISTRY.add_collector(collect_service_metrics)
+
+def wants_binary_audio(audio_format='wav'):
+    """True if the client's Accept header prefers raw audio over JSON"""
+    best = request.accept_mimetypes.best_match(['application/json', MIME_TYPES[audio_format]])
+    return best == MIME_TYPES[audio_format]
+
+def audio_response(audio_data, engine, audio_format='wav', cached=False):
+    """
+    Return raw audio bytes when the client asks for them (Accept: audio/wav,
+    audio/ogg, audio/mpeg), otherwise the backward-compatible base64 JSON body
+    """
+    BYTES_OUT.inc(len(audio_data), endpoint=endpoint_label(), format=audio_format)
+    if wants_binary_audio(audio_format):
+        mimetype = MIME_TYPES[audio_format]
+        if audio_format == 'opus':
+            mimetype += '; codecs=opus'
+        return Response(audio_data, mimetype=mimetype, headers={
+            'X-TTS-Engine': engine,
+            'X-TTS-Cached': 'true' if cached else 'false'
+        })
+    
+    body = {
+        'audio': base64.b64encode(audio_data).decode('utf-8'),
+        'format': audio_format,
+        'engine': engine
+    }
+    if cached:
+        body['cached'] = True
+    return jsonify(body)
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (always 200; see /health/ready for a routing decision)"""
+    status = startup.status()
     return jsonify({
-        'status': 'healthy',
+        'status': {'ready': 'healthy', 'starting': 'starting', 'failed': 'unhealthy'}[status['state']],
+        'startup': status,
         'coqui_available': COQUI_AVAILABLE and tts_engine is not None,
         'pyttsx3_available': PYTTSX3_AVAILABLE and voice_engine is not None,
+        'cache': {
+            'responses': response_cache.stats(),
+            'sentences': sentence_cache.stats()
+        },
+        'scheduler': scheduler.stats(),
+        'admission': admission.stats(),
+        'models': model_registry.stats(),
+        'speaker_latents': speaker_latents.stats(),
+        'phonemes': phoneme_cache.stats(),
+        'workers': worker_pool.stats() if worker_pool else None,
         'timestamp': datetime.utcnow().isoformat()
     })
 
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """Liveness: 200 while the process is up, including while the model loads; 503 if startup failed"""
+    status = startup.status()
+    return jsonify(status), 503 if status['state'] == 'failed' else 200
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    """Readiness: 200 only once the model is loaded and warmed up"""
+    status = startup.status()
+    if status['state'] == 'ready':
+        return jsonify(status)
+    return jsonify(status), 503, {'Retry-After': str(startup.retry_after)}
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), mimetype=METRICS_CONTENT_TYPE)
+
 @app.route('/synthesize', methods=['POST'])
 def synthesize():
     """Basic text-to-speech synthesis"""
@@ -104,51 +578,67 @@ def synthesize():
         
         if not text:
             return jsonify({'error': 'No text provided'}), 400
+        if len(text) > MAX_TEXT_CHARS:
+            return too_large_response(f'Text exceeds {MAX_TEXT_CHARS} characters')
+        
+        try:
+            audio_format, bitrate, sample_rate = parse_output_options(data)
+        except AudioFormatError as e:
+            return jsonify({'error': str(e)}), 400
         
+        # Serve repeated requests straight from the cache
+        engine_name = 'coqui' if tts_engine else 'pyttsx3'
+        model_name = tts_model_name if tts_engine else 'pyttsx3'
+        cache_format = output_cache_format(audio_format, bitrate, sample_rate)
+        cache_key = SynthesisCache.make_key(text, model_name, voice_id, 'en', cache_format)
+        cached_audio = response_cache.get(cache_key)
+        if cached_audio is not None:
+            return audio_response(cached_audio, engine_name, audio_format, cached=True)
+
+        # Cache misses need the model: wait for a slot (or be turned away) first
+        deadline = request_deadline()
+
         # Use Coqui if available
         if tts_engine:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                # Generate speech
-                tts_engine.tts_to_file(
-                    text=text,
-                    file_path=tmp_file.name,
-                    speaker=voice_id if voice_id != 'default' else None
-                )
-                
-                # Read and encode
-                with open(tmp_file.name, 'rb') as f:
-                    audio_data = f.read()
-                
-                # Clean up
-                os.unlink(tmp_file.name)
-                
-                return jsonify({
-                    'audio': base64.b64encode(audio_data).decode('utf-8'),
-                    'format': 'wav',
-                    'engine': 'coqui'
-                })
-        
-        # Fallback to pyttsx3
+            with admission.admit(deadline):
+                # Synthesize sentence by sentence so previously seen sentences are reused
+                speaker = voice_id if voice_id != 'default' else None
+                sentences = split_sentences(normalize_text(text)) or [text]
+                chunks = [synthesize_sentence(sentence, speaker, deadline) for sentence in sentences]
+                # Sentences are cached as WAV; encode the joined result once
+                audio_data = transcode_wav(concat_wavs(chunks), audio_format, bitrate, sample_rate)
+            response_cache.put(cache_key, audio_data)
+
+            return audio_response(audio_data, 'coqui', audio_format)
+
+        # Fallback to pyttsx3 (it can only write to a file)
         elif voice_engine:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                voice_engine.save_to_file(text, tmp_file.name)
-                voice_engine.runAndWait()
-                
-                with open(tmp_file.name, 'rb') as f:
-                    audio_data = f.read()
-                
-                os.unlink(tmp_file.name)
-                
-                return jsonify({
-                    'audio': base64.b64encode(audio_data).decode('utf-8'),
-                    'format': 'wav',
-                    'engine': 'pyttsx3'
-                })
+            def run_pyttsx3():
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
+                    voice_engine.save_to_file(normalize_text(text), tmp_file.name)
+                    voice_engine.runAndWait()
+                    
+                    with open(tmp_file.name, 'rb') as f:
+                        audio_data = f.read()
+                    
+                    os.unlink(tmp_file.name)
+                    return audio_data
+            
+            # pyttsx3 is not thread-safe either, so it also runs on the inference worker
+            with admission.admit(deadline):
+                audio_data = scheduler.run_exclusive(run_pyttsx3, deadline).result()
+                audio_data = transcode_wav(audio_data, audio_format, bitrate, sample_rate)
+            response_cache.put(cache_key, audio_data)
+            
+            return audio_response(audio_data, 'pyttsx3', audio_format)
         
         else:
             return jsonify({'error': 'No TTS engine available'}), 500
             
+    except (Overloaded, DeadlineExceeded) as e:
+        return rejection_response(e)
     except Exception as e:
+        record_error(e)
         print(f"Synthesis error: {e}")
         return jsonify({'error': str(e)}), 500
 
@@ -161,32 +651,215 @@ def synthesize_streaming():
         
         if not text or not tts_engine:
             return jsonify({'error': 'Streaming not available'}), 400
+        if len(text) > MAX_TEXT_CHARS:
+            return too_large_response(f'Text exceeds {MAX_TEXT_CHARS} characters')
+        
+        try:
+            audio_format, bitrate, sample_rate = parse_output_options(data)
+        except AudioFormatError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def synthesize_chunk(sentence, deadline=None):
+            # Each chunk is a self-contained file in the requested format
+            return transcode_wav(synthesize_sentence(sentence, deadline=deadline), audio_format, bitrate, sample_rate)
         
         # Split text into sentences for streaming
-        sentences = text.replace('!', '.').replace('?', '.').split('.')
-        sentences = [s.strip() for s in sentences if s.strip()]
+        sentences = split_sentences(normalize_text(text))
+        if not sentences:
+            return jsonify({'error': 'No text provided'}), 400
         
-        audio_chunks = []
+        deadline = request_deadline()
         
-        for sentence in sentences:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                tts_engine.tts_to_file(text=sentence, file_path=tmp_file.name)
-                
-                with open(tmp_file.name, 'rb') as f:
-                    chunk_data = base64.b64encode(f.read()).decode('utf-8')
-                    audio_chunks.append(chunk_data)
-                
-                os.unlink(tmp_file.name)
+        # Legacy clients can still ask for every chunk in one JSON body
+        if data.get('stream') is False:
+            audio_chunks = []
+            
+            with admission.admit(deadline):
+                for sentence in sentences:
+                    audio_data = synthesize_chunk(sentence, deadline)
+                    BYTES_OUT.inc(len(audio_data), endpoint=endpoint_label(), format=audio_format)
+                    audio_chunks.append(base64.b64encode(audio_data).decode('utf-8'))
+            
+            return jsonify({
+                'chunks': audio_chunks,
+                'format': audio_format,
+                'engine': 'coqui'
+            })
         
-        return jsonify({
-            'chunks': audio_chunks,
-            'format': 'wav',
-            'engine': 'coqui'
-        })
+        # Server-sent events if the client asks for them, NDJSON otherwise
+        use_sse = 'text/event-stream' in request.headers.get('Accept', '')
+        
+        # The slot is held until the stream is closed. Only the first sentence has a
+        # deadline: once audio is flowing, the client is listening, not waiting
+        ticket = admission.acquire(deadline)
+        
+        def synthesize_numbered(item):
+            index, sentence = item
+            return synthesize_chunk(sentence, deadline if index == 0 else None)
+        
+        def generate():
+            count = 0
+            try:
+                for (index, sentence), audio_data in pipelined(list(enumerate(sentences)), synthesize_numbered):
+                    BYTES_OUT.inc(len(audio_data), endpoint=endpoint_label(), format=audio_format)
+                    chunk = {
+                        'index': index,
+                        'text': sentence,
+                        'audio': base64.b64encode(audio_data).decode('utf-8'),
+                        'format': audio_format,
+                        'engine': 'coqui'
+                    }
+                    count += 1
+                    yield format_stream_event('audio', chunk, use_sse)
+            except DeadlineExceeded as e:
+                # Headers are already sent, so report the failure in-band
+                REJECTED.inc(endpoint=endpoint_label(), reason='deadline')
+                yield format_stream_event('error', {'error': str(e), 'retry_after': admission.retry_after()}, use_sse)
+                return
+            except Exception as e:
+                record_error(e)
+                print(f"Streaming synthesis error: {e}")
+                yield format_stream_event('error', {'error': str(e)}, use_sse)
+                return
+            finally:
+                ticket.release()
+            yield format_stream_event('done', {'done': True, 'chunks': count}, use_sse)
+        
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        # Also frees the slot if the client disconnects before the stream starts
+        response.call_on_close(ticket.release)
+        return response
+        
+    except (Overloaded, DeadlineExceeded) as e:
+        return rejection_response(e)
+    except Exception as e:
+        record_error(e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/synthesize-batch', methods=['POST'])
+def synthesize_batch():
+    """
+    Bulk synthesis for lessons and question banks: a JSON body with 'items'
+    (strings or {id, text, voice_id}) or a multipart upload of an items file.
+    Streams back a zip of audio files with manifest.json as the last entry
+    """
+    try:
+        if not tts_engine:
+            return jsonify({'error': 'Batch synthesis not available'}), 400
+        
+        upload = request.files.get('file')
+        try:
+            if upload:
+                data = request.form.to_dict()
+                entries = read_items(upload.read().decode('utf-8'), upload.filename or '')
+            else:
+                data = request.json or {}
+                entries = data.get('items', [])
+            items = parse_items(entries, data.get('voice_id') or 'default')
+            audio_format, bitrate, sample_rate = parse_output_options(data)
+        except (ValueError, UnicodeDecodeError) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not items:
+            return jsonify({'error': 'No text provided'}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return too_large_response(f'Batch exceeds {BATCH_MAX_ITEMS} items')
+        if any(len(item['text']) > MAX_TEXT_CHARS for item in items):
+            return too_large_response(f'Text exceeds {MAX_TEXT_CHARS} characters')
+        
+        # Identical (text, voice) items are synthesized once; one id with two texts is an error
+        try:
+            jobs, _ = plan_batch(items, audio_format)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        endpoint = endpoint_label()
+        
+        # The whole batch holds one slot: interactive requests keep the others
+        ticket = admission.acquire(request_deadline())
+        
+        def files():
+            entries = []
+            results = synthesize_texts(list(jobs), audio_format, bitrate, sample_rate)
+            for group, (audio_data, error) in zip(jobs.values(), results):
+                for item in group:
+                    entries.append(manifest_entry(item, audio_data, error))
+                    if error is not None:
+                        ERRORS.inc(endpoint=endpoint, type=type(error).__name__)
+                        continue
+                    BYTES_OUT.inc(len(audio_data), endpoint=endpoint, format=audio_format)
+                    yield item['file'], audio_data
+            manifest = {'format': audio_format, 'bitrate': bitrate, 'sample_rate': sample_rate,
+                        'engine': 'coqui', 'model': tts_model_name, 'items': entries}
+            yield MANIFEST_NAME, json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8')
         
+        def generate():
+            try:
+                yield from stream_zip(files())
+            finally:
+                ticket.release()
+        
+        response = Response(stream_with_context(generate()), mimetype='application/zip', headers={
+            'Content-Disposition': 'attachment; filename="tts-batch.zip"',
+            'X-TTS-Batch-Items': str(len(items)),
+            'X-TTS-Batch-Unique': str(len(jobs))
+        })
+        response.call_on_close(ticket.release)
+        return response
+    
+    except (Overloaded, DeadlineExceeded) as e:
+        return rejection_response(e)
     except Exception as e:
+        record_error(e)
+        print(f"Batch synthesis error: {e}")
         return jsonify({'error': str(e)}), 500
 
+def pipelined(items, work):
+    """
+    Yield (item, work(item)) in order while the next item is already being
+    processed on a background thread, so output starts after the first item
+    """
+    results = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    
+    def produce():
+        for item in items:
+            if stop.is_set():
+                return
+            try:
+                results.put((item, work(item), None))
+            except Exception as e:
+                results.put((item, None, e))
+                return
+        results.put(None)
+    
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            entry = results.get()
+            if entry is None:
+                return
+            item, result, error = entry
+            if error:
+                raise error
+            yield item, result
+    finally:
+        # Client went away (or we finished): stop the producer and unblock it
+        stop.set()
+        try:
+            results.get_nowait()
+        except queue.Empty:
+            pass
+
+def format_stream_event(event, payload, use_sse):
+    """Encode one streamed message as an SSE event or an NDJSON line"""
+    if use_sse:
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    return json.dumps(payload) + '\n'
+
 @app.route('/clone-voice', methods=['POST'])
 def clone_voice():
     """Voice cloning endpoint (requires XTTS model)"""
@@ -194,12 +867,6 @@ def clone_voice():
         if not COQUI_AVAILABLE:
             return jsonify({'error': 'Voice cloning not available'}), 400
         
-        # For voice cloning, we need XTTS
-        global tts_engine
-        if not tts_engine or 'xtts' not in str(type(tts_engine)).lower():
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            tts_engine = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
-        
         data = request.json
         text = data.get('text', '')
         speaker_wav_base64 = data.get('speaker_wav', '')
@@ -207,37 +874,67 @@ def clone_voice():
         
         if not text or not speaker_wav_base64:
             return jsonify({'error': 'Text and speaker_wav required'}), 400
+        if len(text) > MAX_TEXT_CHARS:
+            return too_large_response(f'Text exceeds {MAX_TEXT_CHARS} characters')
+        # Checked on the encoded length, before decoding allocates the audio
+        if len(speaker_wav_base64) * 3 // 4 > MAX_SPEAKER_WAV_BYTES:
+            return too_large_response(f'speaker_wav exceeds {MAX_SPEAKER_WAV_BYTES} bytes')
+        
+        try:
+            audio_format, bitrate, sample_rate = parse_output_options(data)
+        except AudioFormatError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Decode speaker audio
         speaker_wav = base64.b64decode(speaker_wav_base64)
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as speaker_file:
-            speaker_file.write(speaker_wav)
-            speaker_file.flush()
+        # The reference audio identifies the voice, so repeat requests hit the cache
+        voice_hash = hashlib.sha256(speaker_wav).hexdigest()
+        cache_format = output_cache_format(audio_format, bitrate, sample_rate)
+        cache_key = SynthesisCache.make_key(text, XTTS_MODEL, voice_hash, language, cache_format)
+        cached_audio = response_cache.get(cache_key)
+        if cached_audio is not None:
+            return audio_response(cached_audio, 'xtts', audio_format, cached=True)
+        
+        def run_clone():
+            # XTTS stays resident alongside the default model instead of replacing it
+            xtts = model_registry.get(XTTS_MODEL)
+            model = xtts.synthesizer.tts_model
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as output_file:
-                # Generate with cloned voice
-                tts_engine.tts_to_file(
-                    text=text,
-                    speaker_wav=speaker_file.name,
-                    language=language,
-                    file_path=output_file.name
-                )
-                
-                with open(output_file.name, 'rb') as f:
-                    audio_data = f.read()
-                
-                # Clean up
-                os.unlink(speaker_file.name)
-                os.unlink(output_file.name)
-                
-                return jsonify({
-                    'audio': base64.b64encode(audio_data).decode('utf-8'),
-                    'format': 'wav',
-                    'engine': 'xtts'
-                })
+            def compute_latents():
+                # XTTS reads the reference audio from a path; only needed on a cache miss
+                with tempfile.NamedTemporaryFile(suffix='.wav') as speaker_file:
+                    speaker_file.write(speaker_wav)
+                    speaker_file.flush()
+                    return model.get_conditioning_latents(audio_path=[speaker_file.name])
+            
+            gpt_cond_latent, speaker_embedding = speaker_latents.get_or_compute((XTTS_MODEL, voice_hash), compute_latents)
+            
+            # Generate with cloned voice, sentence by sentence like Coqui's tts() does
+            import torch
+            with torch.inference_mode():
+                waveforms = [
+                    model.inference(sentence, language, gpt_cond_latent, speaker_embedding)['wav']
+                    for sentence in (split_sentences(normalize_text(text)) or [text])
+                ]
+            sample_rate = xtts.synthesizer.output_sample_rate
+            return join_waveforms(waveforms, sample_rate, SENTENCE_GAP_SECONDS), sample_rate
+        
+        # Model loading and XTTS inference happen on the worker that owns the models;
+        # encoding does not need the model, so it runs on the request thread
+        deadline = request_deadline()
+        with admission.admit(deadline):
+            waveform, model_rate = scheduler.run_exclusive(run_clone, deadline).result()
+            with STAGE_SECONDS.time(stage='encoding'):
+                audio_data, _ = encode_audio(waveform, model_rate, audio_format, bitrate, sample_rate)
+        response_cache.put(cache_key, audio_data)
+        
+        return audio_response(audio_data, 'xtts', audio_format)
                 
+    except (Overloaded, DeadlineExceeded) as e:
+        return rejection_response(e)
     except Exception as e:
+        record_error(e)
         print(f"Voice cloning error: {e}")
         return jsonify({'error': str(e)}), 500
 
@@ -296,8 +993,24 @@ def list_models():
                 'features': ['multi-speaker', 'high-quality']
             }
         ]
+        for model in models:
+            model['loaded'] = model_registry.is_loaded(model['id'])
     
-    return jsonify({'models': models})
+    return jsonify({'models': models, 'formats': format_info()})
+
+# Fork the worker pool's loader now, while this process has no other threads
+# (see tts_workers.py); it loads the model and forks the workers from there
+if NUM_WORKERS > 1 and COQUI_AVAILABLE:
+    try:
+        worker_pool = ProcessWorkerPool(synthesize_batch_local, NUM_WORKERS, THREADS_PER_WORKER,
+                                        initializer=load_worker_engine)
+        worker_pool.start()
+    except Exception as e:
+        print(f"Failed to start worker pool, running in-process: {e}")
+        worker_pool = None
+
+# Models load in the background: the server binds, and /health/live answers, right away
+startup.start(load_engines)
 
 if __name__ == '__main__':
     port = int(os.environ.get('TTS_PORT', 5001))
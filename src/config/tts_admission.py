@@ -0,0 +1,114 @@
+# ============================================
+# ADMISSION CONTROL FOR THE TTS SERVICE
+# ============================================
+#
+# A fixed number of requests may be doing synthesis work at once; a bounded
+# number more may wait for a slot, each until its own deadline. Anything
+# beyond that is turned away immediately with a Retry-After hint instead of
+# queueing without limit, so requests that are accepted keep a predictable
+# latency during a classroom spike and rejected clients know when to retry.
+#
+# The hint is an estimate: the backlog ahead of a new request times the
+# recent average time a request holds its slot, spread over all slots.
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """A request was not admitted; carries the HTTP status, metric reason and Retry-After seconds"""
+
+    def __init__(self, message, status=429, reason='queue_full', retry_after=1):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """An admitted request's slot; release() is idempotent"""
+
+    def __init__(self, controller):
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._started)
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, deadline-aware wait queue in front of it"""
+
+    def __init__(self, max_active, max_queue, service_seconds_hint=1.0, smoothing=0.2):
+        self.max_active = max(1, max_active)
+        self.max_queue = max(0, max_queue)
+        self.smoothing = smoothing
+        self._avg_service = service_seconds_hint  # moving average of slot hold time
+        self._active = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {'admitted': 0, 'rejected_queue_full': 0, 'rejected_timeout': 0}
+
+    def acquire(self, deadline):
+        """Wait for a slot until deadline (time.monotonic() value); returns a Ticket or raises Overloaded"""
+        with self._cond:
+            if self._active >= self.max_active or self._waiting:
+                if self._waiting >= self.max_queue:
+                    self._stats['rejected_queue_full'] += 1
+                    raise Overloaded('Server busy: synthesis queue is full', 429, 'queue_full', self._retry_after_locked())
+                self._waiting += 1
+                try:
+                    while self._active >= self.max_active:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats['rejected_timeout'] += 1
+                            raise Overloaded('Server busy: timed out waiting for a synthesis slot', 503, 'deadline',
+                                             self._retry_after_locked())
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._active += 1
+            self._stats['admitted'] += 1
+        return Ticket(self)
+
+    @contextmanager
+    def admit(self, deadline):
+        """Hold a slot for the duration of the with-block"""
+        ticket = self.acquire(deadline)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def retry_after(self):
+        """Seconds a client turned away now should wait before retrying"""
+        with self._cond:
+            return self._retry_after_locked()
+
+    def _retry_after_locked(self):
+        backlog = self._waiting + max(0, self._active - self.max_active) + 1
+        return max(1, math.ceil(self._avg_service * backlog / self.max_active))
+
+    def _release(self, held_seconds):
+        with self._cond:
+            self._active -= 1
+            self._avg_service += self.smoothing * (held_seconds - self._avg_service)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'active': self._active,
+                'waiting': self._waiting,
+                'max_active': self.max_active,
+                'max_queue': self.max_queue,
+                'avg_service_seconds': round(self._avg_service, 3)
+            })
+        return stats
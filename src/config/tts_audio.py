@@ -0,0 +1,203 @@
+# ============================================
+# IN-MEMORY AUDIO ENCODING FOR THE TTS SERVICES
+# ============================================
+#
+# Coqui returns the synthesized waveform as a float array. These helpers turn
+# it straight into encoded bytes in memory, with no temporary files on disk.
+#
+# Besides WAV, compressed formats for students on mobile data are encoded
+# in-process by libsndfile (via soundfile), so no encoder process is spawned
+# per request:
+#   - opus: Opus in an OGG container (best quality per bit for speech)
+#   - ogg:  Vorbis in an OGG container
+#   - mp3:  MPEG layer III (needs libsndfile >= 1.1)
+
+import io
+import wave
+
+import numpy as np
+
+SENTENCE_GAP_SECONDS = 0.45  # Matches the silence Coqui inserts between sentences
+
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except (ImportError, OSError):
+    SOUNDFILE_AVAILABLE = False
+
+# format -> (libsndfile container, subtype, default bitrate kbps, (min kbps, max kbps))
+COMPRESSED_FORMATS = {
+    'opus': ('OGG', 'OPUS', 32, (6, 256)),
+    'ogg': ('OGG', 'VORBIS', 64, (32, 256)),
+    'mp3': ('MP3', 'MPEG_LAYER_III', 64, (32, 320)),
+}
+
+MIME_TYPES = {
+    'wav': 'audio/wav',
+    'opus': 'audio/ogg',
+    'ogg': 'audio/ogg',
+    'mp3': 'audio/mpeg',
+}
+
+# Opus only runs at these rates; other input is resampled to the nearest one above
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def bitrate_range(audio_format, sample_rate):
+    """Bitrates (kbps) libsndfile spreads its compression level over for this format and rate"""
+    if audio_format == 'mp3':
+        # MPEG-1 above 24 kHz, MPEG-2 at 16-24 kHz, MPEG-2.5 below
+        if sample_rate > 24000:
+            return 32, 320
+        if sample_rate >= 16000:
+            return 8, 160
+        return 8, 64
+    return COMPRESSED_FORMATS[audio_format][3]
+
+
+class AudioFormatError(ValueError):
+    """Requested output format or option is not supported"""
+
+
+def supported_formats():
+    """Output formats this process can encode"""
+    formats = ['wav']
+    if SOUNDFILE_AVAILABLE:
+        for name, (container, subtype, _, _) in COMPRESSED_FORMATS.items():
+            if sf.check_format(container, subtype):
+                formats.append(name)
+    return formats
+
+
+def format_info():
+    """Describe the supported formats and their options (for /models)"""
+    info = [{'id': 'wav', 'mime_type': MIME_TYPES['wav'], 'bitrate_kbps': None, 'sample_rates': 'any'}]
+    for name in supported_formats()[1:]:
+        _, _, default_kbps, (min_kbps, max_kbps) = COMPRESSED_FORMATS[name]
+        info.append({
+            'id': name,
+            'mime_type': MIME_TYPES[name],
+            'bitrate_kbps': {'default': default_kbps, 'min': min_kbps, 'max': max_kbps},
+            'sample_rates': list(OPUS_SAMPLE_RATES) if name == 'opus' else 'any'
+        })
+    return info
+
+
+def normalize_peak(waveform):
+    """Scale a float waveform to full range (same scaling as Coqui's save_wav)"""
+    samples = np.asarray(waveform, dtype=np.float32).reshape(-1)
+    if samples.size == 0:
+        return samples
+    return samples * (32767 / 32768 / max(0.01, float(np.max(np.abs(samples)))))
+
+
+def to_pcm16(waveform):
+    """Peak-normalize a float waveform and convert it to 16-bit PCM bytes"""
+    samples = normalize_peak(waveform) * 32768
+    return np.clip(samples, -32768, 32767).astype('<i2').tobytes()
+
+
+def resample(samples, source_rate, target_rate):
+    """Resample a float waveform (soxr if installed, linear interpolation otherwise)"""
+    if source_rate == target_rate or samples.size == 0:
+        return samples
+    try:
+        import soxr
+        return soxr.resample(samples, source_rate, target_rate).astype(np.float32)
+    except ImportError:
+        duration = samples.size / source_rate
+        target_times = np.arange(int(duration * target_rate)) / target_rate
+        source_times = np.arange(samples.size) / source_rate
+        return np.interp(target_times, source_times, samples).astype(np.float32)
+
+
+def decode_wav(data):
+    """Decode a 16-bit PCM WAV file into (float waveform, sample rate)"""
+    with wave.open(io.BytesIO(data), 'rb') as reader:
+        sample_rate = reader.getframerate()
+        pcm = reader.readframes(reader.getnframes())
+    return np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768, sample_rate
+
+
+def encode_audio(waveform, sample_rate, audio_format='wav', bitrate_kbps=None, target_sample_rate=None):
+    """
+    Encode a float waveform in the requested format, optionally resampled.
+    Returns (encoded bytes, output sample rate)
+    """
+    if audio_format not in MIME_TYPES:
+        raise AudioFormatError(f"Unsupported format '{audio_format}'. Use one of: {', '.join(MIME_TYPES)}")
+    samples = normalize_peak(waveform)
+
+    output_rate = int(target_sample_rate or sample_rate)
+    if audio_format == 'opus' and output_rate not in OPUS_SAMPLE_RATES:
+        if target_sample_rate:
+            raise AudioFormatError(f"Opus sample rate must be one of {OPUS_SAMPLE_RATES}")
+        output_rate = next((r for r in OPUS_SAMPLE_RATES if r >= output_rate), OPUS_SAMPLE_RATES[-1])
+    samples = resample(samples, sample_rate, output_rate)
+
+    if audio_format == 'wav':
+        return encode_wav(samples, output_rate), output_rate
+
+    if audio_format not in supported_formats():
+        raise AudioFormatError(f"Format '{audio_format}' is not supported by the installed libsndfile")
+    container, subtype, default_kbps, _ = COMPRESSED_FORMATS[audio_format]
+    min_kbps, max_kbps = bitrate_range(audio_format, output_rate)
+    kbps = min(max(float(bitrate_kbps or default_kbps), min_kbps), max_kbps)
+    # libsndfile takes a compression level (0 = highest bitrate, 1 = lowest) and maps
+    # it onto the codec's bitrate range, so translate the requested bitrate into it
+    # (1.0 itself is rejected by the MP3 encoder)
+    compression_level = min((max_kbps - kbps) / (max_kbps - min_kbps), 0.99)
+    options = {'compression_level': compression_level}
+    if audio_format == 'mp3':
+        # Constant bitrate, so the requested bitrate is what is sent
+        options['bitrate_mode'] = 'CONSTANT'
+
+    buffer = io.BytesIO()
+    try:
+        sf.write(buffer, samples, output_rate, format=container, subtype=subtype, **options)
+    except TypeError:
+        # soundfile < 0.13 has no compression_level/bitrate_mode; use the codec default
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, output_rate, format=container, subtype=subtype)
+    return buffer.getvalue(), output_rate
+
+
+def concat_wavs(chunks, gap_seconds=SENTENCE_GAP_SECONDS):
+    """Join WAV files (same format) into one, with silence between them"""
+    if len(chunks) == 1:
+        return chunks[0]
+    out = io.BytesIO()
+    writer = None
+    for i, chunk in enumerate(chunks):
+        with wave.open(io.BytesIO(chunk), 'rb') as reader:
+            if writer is None:
+                writer = wave.open(out, 'wb')
+                writer.setparams(reader.getparams())
+                silence = b'\x00' * (int(reader.getframerate() * gap_seconds) * reader.getsampwidth() * reader.getnchannels())
+            elif i:
+                writer.writeframes(silence)
+            writer.writeframes(reader.readframes(reader.getnframes()))
+    writer.close()
+    return out.getvalue()
+
+
+def join_waveforms(waveforms, sample_rate, gap_seconds=0.0):
+    """Concatenate float waveforms with optional silence between them"""
+    gap = np.zeros(int(sample_rate * gap_seconds), dtype=np.float32)
+    parts = []
+    for i, waveform in enumerate(waveforms):
+        if i and gap.size:
+            parts.append(gap)
+        parts.append(np.asarray(waveform, dtype=np.float32).reshape(-1))
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+
+
+def encode_wav(waveform, sample_rate, channels=1):
+    """Encode a float waveform as a 16-bit PCM WAV file in memory"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as writer:
+        writer.setnchannels(channels)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(to_pcm16(waveform))
+    return buffer.getvalue()
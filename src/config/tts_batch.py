@@ -0,0 +1,243 @@
+# ============================================
+# BULK SYNTHESIS FOR LESSONS AND QUESTION BANKS
+# ============================================
+#
+# Shared by the /synthesize-batch endpoint in tts.py and the command-line
+# client below. Items are deduplicated on (text, voice), every item gets a
+# deterministic output file name (its id, or a hash of voice + text), and
+# results are packed into a zip that is streamed while synthesis is still
+# running, with manifest.json as the last entry.
+#
+# Usage (against a running service):
+#   python tts_batch.py lesson.txt --out-dir audio/lesson-3
+#   python tts_batch.py questions.jsonl --out-dir audio/bank --format mp3 --url http://localhost:5001
+#
+# Input files: .jsonl (one {"id", "text", "voice_id"} object or string per
+# line), .json (a list of those) or plain text (one item per line).
+# Re-running a command skips items whose files already exist in --out-dir,
+# so an interrupted run resumes where it stopped; work is sent in chunks so
+# at most one chunk is lost to an interruption.
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.request
+import zipfile
+from collections import OrderedDict
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def parse_items(entries, default_voice='default'):
+    """Normalize strings or {'id', 'text', 'voice_id'} dicts; raises ValueError on bad entries"""
+    if not isinstance(entries, list):
+        raise ValueError('items must be a list')
+    items = []
+    for index, entry in enumerate(entries):
+        if isinstance(entry, str):
+            entry = {'text': entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get('text'), str):
+            raise ValueError(f'Item {index} has no text')
+        text = entry['text'].strip()
+        if not text:
+            continue
+        item_id = entry.get('id')
+        items.append({
+            'id': str(item_id) if item_id not in (None, '') else None,
+            'text': text,
+            'voice_id': str(entry.get('voice_id') or default_voice)
+        })
+    return items
+
+
+def read_items(content, filename=''):
+    """Parse an uploaded or local items file (.jsonl, .json or one text per line)"""
+    if filename.endswith('.json'):
+        return json.loads(content)
+    if filename.endswith('.jsonl'):
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    return [line for line in content.splitlines() if line.strip()]
+
+
+def output_name(item, extension):
+    """File name for an item: its id when given, else a hash of voice and text"""
+    if item['id']:
+        stem = re.sub(r'[^A-Za-z0-9._-]+', '_', item['id']).strip('._') or 'item'
+    else:
+        stem = hashlib.sha256(f"{item['voice_id']}\0{item['text']}".encode('utf-8')).hexdigest()[:16]
+    return f'{stem}.{extension}'
+
+
+def plan_batch(items, extension, skip=()):
+    """
+    Group items into unique (text, voice) jobs, each with the items (and
+    files) it fills. Items whose file name is in skip are left out.
+    Returns (jobs, skipped); raises ValueError when two items with different
+    text or voice would write the same file (a repeated or clashing id)
+    """
+    jobs = OrderedDict()
+    skipped = []
+    files = {}  # file name -> the first item writing it
+    for item in items:
+        item = dict(item, file=output_name(item, extension))
+        first = files.get(item['file'])
+        if first is not None:
+            if (first['text'], first['voice_id']) != (item['text'], item['voice_id']):
+                same = 'is repeated' if first['id'] == item['id'] else f"and id '{first['id']}' both map to {item['file']}"
+                raise ValueError(f"Item id '{item['id']}' {same} with different text or voice")
+            continue  # Exact repeat: one file serves both
+        files[item['file']] = item
+        if item['file'] in skip:
+            skipped.append(item)
+            continue
+        jobs.setdefault((item['text'], item['voice_id']), []).append(item)
+    return jobs, skipped
+
+
+def manifest_entry(item, audio_data=None, error=None):
+    entry = {'id': item['id'], 'text': item['text'], 'voice_id': item['voice_id'], 'file': item['file']}
+    if error is not None:
+        entry.update({'status': 'error', 'error': str(error)})
+    else:
+        entry.update({'status': 'ok', 'bytes': len(audio_data)})
+    return entry
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable target for ZipFile; the bytes are drained by the streamer"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def drain(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stream_zip(files):
+    """Yield a zip archive of (name, bytes) pairs chunk by chunk, as the pairs are produced"""
+    sink = _ChunkSink()
+    # Stored, not deflated: the audio is either PCM that deflates poorly or already compressed
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    yield sink.drain()
+
+
+# --- command-line client ---
+
+def write_atomic(path, data):
+    # A half-written file would count as done on the next run
+    tmp = path + '.part'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def post_batch(url, items, options, timeout, max_retries=5):
+    """POST one chunk to /synthesize-batch, honouring Retry-After on 429/503; returns the zip bytes"""
+    payload = json.dumps(dict(options, items=items)).encode('utf-8')
+    for attempt in range(max_retries + 1):
+        request = urllib.request.Request(
+            url.rstrip('/') + '/synthesize-batch', data=payload,
+            headers={'Content-Type': 'application/json', 'Accept': 'application/zip'}, method='POST'
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code not in (429, 503) or attempt == max_retries:
+                detail = e.read().decode('utf-8', 'replace')
+                raise RuntimeError(f'HTTP {e.code}: {detail}') from None
+            wait = float(e.headers.get('Retry-After') or 2 ** attempt)
+            print(f'Service busy (HTTP {e.code}), retrying in {wait:.0f}s', file=sys.stderr)
+            time.sleep(wait)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-generate audio for a list of texts via /synthesize-batch')
+    parser.add_argument('input', help='Items file (.jsonl, .json or one text per line), or - for stdin')
+    parser.add_argument('--out-dir', required=True, help='Directory for the audio files and manifest.json')
+    parser.add_argument('--url', default=os.environ.get('TTS_URL', 'http://localhost:5001'), help='Service base URL')
+    parser.add_argument('--format', default='wav', help='wav, opus, ogg or mp3')
+    parser.add_argument('--bitrate', type=int, help='kbps, compressed formats only')
+    parser.add_argument('--sample-rate', type=int)
+    parser.add_argument('--voice-id', default='default', help='Voice for items that do not name one')
+    parser.add_argument('--chunk-size', type=int, default=100, help='Items per request')
+    parser.add_argument('--timeout', type=float, default=3600, help='Seconds per request')
+    parser.add_argument('--force', action='store_true', help='Regenerate files that already exist')
+    args = parser.parse_args(argv)
+
+    if args.input == '-':
+        content, filename = sys.stdin.read(), ''
+    else:
+        with open(args.input, encoding='utf-8') as f:
+            content, filename = f.read(), args.input
+    items = parse_items(read_items(content, filename), args.voice_id)
+    audio_format = args.format.lower()
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    existing = set() if args.force else {
+        name for name in os.listdir(args.out_dir) if name != MANIFEST_NAME and not name.endswith('.part')
+    }
+    try:
+        jobs, skipped = plan_batch(items, audio_format, skip=existing)
+    except ValueError as e:
+        parser.error(str(e))
+    todo = [item for group in jobs.values() for item in group]
+    print(f'{len(items)} items: {len(jobs)} to synthesize, {len(skipped)} already done', file=sys.stderr)
+
+    # Keep earlier runs' entries for files that are still on disk
+    entries = {entry['file']: entry for entry in load_manifest(args.out_dir).get('items', [])
+               if entry.get('file') in existing}
+    options = {'format': audio_format, 'bitrate': args.bitrate, 'sample_rate': args.sample_rate}
+    failed = 0
+    for start in range(0, len(todo), max(1, args.chunk_size)):
+        chunk = todo[start:start + args.chunk_size]
+        started = time.perf_counter()
+        archive = zipfile.ZipFile(io.BytesIO(post_batch(args.url, chunk, options, args.timeout)))
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+        for entry in manifest['items']:
+            if entry['status'] == 'ok':
+                write_atomic(os.path.join(args.out_dir, entry['file']), archive.read(entry['file']))
+            else:
+                failed += 1
+                print(f"Failed: {entry['id'] or entry['text'][:60]}: {entry['error']}", file=sys.stderr)
+            entries[entry['file']] = entry
+        done = min(start + len(chunk), len(todo))
+        print(f'{done}/{len(todo)} items ({time.perf_counter() - started:.1f}s for this chunk)', file=sys.stderr)
+        # Rewritten after every chunk so an interrupted run still has a current manifest
+        write_atomic(os.path.join(args.out_dir, MANIFEST_NAME), json.dumps(
+            dict(options, items=[entries[name] for name in sorted(entries)]), indent=2, ensure_ascii=False
+        ).encode('utf-8'))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
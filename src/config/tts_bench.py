@@ -0,0 +1,459 @@
+# ============================================
+# TTS LOAD TEST AND REAL-TIME-FACTOR BENCHMARK
+# ============================================
+#
+# Drives /synthesize, /synthesize-streaming and /clone-voice with a fixed
+# concurrency and a mix of text lengths, then reports latency percentiles,
+# time-to-first-audio, throughput, real-time factor and peak RSS as JSON.
+#
+# Usage:
+#   python tts_bench.py --stub                         # start tts.py on the stub engine
+#   python tts_bench.py --url http://localhost:5001 --server-pid 1234
+#   python tts_bench.py --stub --output run.json --compare baseline.json
+#
+# The client only uses the standard library. With --stub the service runs
+# with TTS_STUB_ENGINE=1 (see tts_stub.py), so results are deterministic
+# and need no model downloads; numbers then measure the service itself
+# (caching, batching, encoding, streaming), not Coqui.
+
+import argparse
+import base64
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = {
+    'synthesize': '/synthesize',
+    'streaming': '/synthesize-streaming',
+    'clone': '/clone-voice',
+}
+
+# Words per text for each length class
+TEXT_LENGTHS = {
+    'short': (3, 8),
+    'medium': (15, 40),
+    'long': (60, 150),
+}
+
+VOCABULARY = (
+    "the a of to and in is that for it as with on this are be by photosynthesis "
+    "plants use sunlight water carbon dioxide make glucose oxygen fraction "
+    "numerator denominator equation solve for x multiply divide add subtract "
+    "history Zimbabwe Great empire trade gold river Zambezi energy force mass "
+    "acceleration velocity cell nucleus membrane student teacher lesson "
+    "question answer remember example practice well done try again"
+).split()
+
+# Regressions are flagged when a metric moves the wrong way by more than the tolerance
+# /health must answer this fast while the model loads, or probes time out on a healthy instance
+HEALTH_WHILE_STARTING_MAX_SECONDS = 1.0
+
+COMPARED_METRICS = {
+    'latency_p95': 'lower',
+    'ttfa_p95': 'lower',
+    'rtf': 'lower',
+    'throughput_rps': 'higher',
+}
+
+
+def parse_mix(spec):
+    """Parse 'short=0.6,medium=0.3,long=0.1' into normalized weights"""
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in TEXT_LENGTHS:
+            raise ValueError(f"Unknown text length '{name}'. Use: {', '.join(TEXT_LENGTHS)}")
+        mix[name] = float(weight or 1)
+    total = sum(mix.values())
+    return {name: weight / total for name, weight in mix.items()}
+
+
+def make_texts(count, mix, seed=0, repeat_ratio=0.0, tag='Item'):
+    """
+    Deterministic (length class, text) workload. repeat_ratio of the requests
+    reuse an earlier text, to model cache hits. The service caches per
+    sentence and the tag only makes the first sentence unique, so workloads
+    that must not pre-cache each other need different seeds (see endpoint_seed)
+    """
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    texts = []
+    for index in range(count):
+        if texts and rng.random() < repeat_ratio:
+            texts.append(rng.choice(texts))
+            continue
+        length = rng.choices(names, weights)[0]
+        low, high = TEXT_LENGTHS[length]
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(low, high))]
+        # Break into sentences of up to 12 words, tagged with the index so texts are unique
+        sentences = [' '.join(words[i:i + 12]).capitalize() + '.' for i in range(0, len(words), 12)]
+        texts.append((length, f"{tag} {index}. " + ' '.join(sentences)))
+    return texts
+
+
+def endpoint_seed(seed, index):
+    """Seed for the index-th endpoint's workload, so endpoints never share sentences"""
+    return seed + index * 7919
+
+
+def make_speaker_wav(seconds=3.0, sample_rate=22050):
+    """Reference audio for /clone-voice: a plain tone"""
+    frames = bytearray()
+    for n in range(int(seconds * sample_rate)):
+        sample = int(8000 * math.sin(2 * math.pi * 180 * n / sample_rate))
+        frames += sample.to_bytes(2, 'little', signed=True)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as writer:
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(sample_rate)
+        writer.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+def wav_duration(data):
+    """Length of a WAV file in seconds"""
+    with wave.open(io.BytesIO(data), 'rb') as reader:
+        return reader.getnframes() / reader.getframerate()
+
+
+def percentile(values, p):
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _post(url, payload, timeout):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
+        method='POST'
+    )
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def run_request(base_url, endpoint, length, text, speaker_wav, timeout):
+    """Send one request and measure it; never raises"""
+    payload = {'text': text}
+    if endpoint == 'clone':
+        payload.update({'speaker_wav': speaker_wav, 'language': 'en'})
+    result = {'endpoint': endpoint, 'length': length, 'chars': len(text), 'ok': False}
+
+    started = time.perf_counter()
+    try:
+        with _post(base_url + ENDPOINTS[endpoint], payload, timeout) as response:
+            result['status'] = response.status
+            if endpoint == 'streaming':
+                audio_seconds, ttfa = 0.0, None
+                for line in response:
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if 'error' in event:
+                        raise RuntimeError(event['error'])
+                    if 'audio' in event:
+                        if ttfa is None:
+                            ttfa = time.perf_counter() - started
+                        audio_seconds += wav_duration(base64.b64decode(event['audio']))
+            else:
+                body = json.loads(response.read())
+                ttfa = time.perf_counter() - started
+                audio_seconds = wav_duration(base64.b64decode(body['audio']))
+                result['cached'] = bool(body.get('cached'))
+        result['latency'] = time.perf_counter() - started
+        result['ttfa'] = ttfa
+        result['audio_seconds'] = audio_seconds
+        result['ok'] = True
+    except urllib.error.HTTPError as e:
+        result['status'] = e.code
+        result['error'] = e.read().decode('utf-8', 'replace')[:200]
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def run_load(base_url, endpoint, texts, concurrency, speaker_wav, timeout):
+    """Run every text against one endpoint with a fixed number of concurrent clients"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(
+            lambda item: run_request(base_url, endpoint, item[0], item[1], speaker_wav, timeout),
+            texts
+        ))
+    return results, time.perf_counter() - started
+
+
+def summarize(results, wall_seconds):
+    """Aggregate per-request measurements into the reported metrics"""
+    ok = [r for r in results if r['ok']]
+    latencies = [r['latency'] for r in ok]
+    ttfas = [r['ttfa'] for r in ok if r['ttfa'] is not None]
+    audio_seconds = sum(r['audio_seconds'] for r in ok)
+
+    def rounded(value):
+        return round(value, 4) if value is not None else None
+
+    return {
+        'requests': len(results),
+        'errors': len(results) - len(ok),
+        'cached': sum(1 for r in ok if r.get('cached')),
+        'latency_p50': rounded(percentile(latencies, 50)),
+        'latency_p95': rounded(percentile(latencies, 95)),
+        'latency_p99': rounded(percentile(latencies, 99)),
+        'ttfa_p50': rounded(percentile(ttfas, 50)),
+        'ttfa_p95': rounded(percentile(ttfas, 95)),
+        'throughput_rps': rounded(len(ok) / wall_seconds) if wall_seconds else None,
+        'audio_seconds_per_second': rounded(audio_seconds / wall_seconds) if wall_seconds else None,
+        # Wall-clock time per second of audio, as seen by the client (includes queueing)
+        'rtf': rounded(sum(latencies) / audio_seconds) if audio_seconds else None,
+        'wall_seconds': rounded(wall_seconds),
+    }
+
+
+def peak_rss_mb(pid=None):
+    """Peak resident memory of a process (this one if pid is None)"""
+    if pid is None:
+        # ru_maxrss is kilobytes on Linux, bytes on macOS
+        scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def get_json(url, timeout=5):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_server(port, extra_env=None, startup_timeout=60):
+    """
+    Start tts.py with the stub engine and wait until /health/ready answers 200.
+    Returns (process, base_url, startup) with the seconds until the server first
+    answered (live) and until it was ready, and the slowest /health response
+    while it was starting (more than HEALTH_WHILE_STARTING_MAX_SECONDS fails)
+    """
+    env = dict(os.environ)
+    env.update({
+        'TTS_STUB_ENGINE': '1',
+        'TTS_PORT': str(port),
+        'TTS_CACHE_DIR': tempfile.mkdtemp(prefix='tts-bench-cache-'),
+    })
+    env.update(extra_env or {})
+    here = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(here, 'tts.py')],
+        cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    # Drain stderr so a chatty server never blocks on a full pipe
+    log = []
+    threading.Thread(target=lambda: log.extend(process.stderr), daemon=True).start()
+
+    started = time.monotonic()
+    deadline = started + startup_timeout
+    base_url = f'http://127.0.0.1:{port}'
+    live_after = None
+    slowest_health = 0.0
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('Stub TTS server exited:\n' + b''.join(log[-20:]).decode('utf-8', 'replace'))
+        try:
+            status = get_json(base_url + '/health/ready', timeout=1)
+            startup = {
+                'live_seconds': round(live_after if live_after is not None else time.monotonic() - started, 3),
+                'ready_seconds': round(time.monotonic() - started, 3),
+                'slowest_health_while_starting_seconds': round(slowest_health, 3),
+                'phases': status.get('phases'),
+            }
+            return process, base_url, startup
+        except urllib.error.HTTPError as e:
+            # 503 while loading: the port is bound, the model is not ready yet
+            if live_after is None:
+                live_after = time.monotonic() - started
+            if e.code != 503:
+                raise
+            # /health must keep answering (with progress) throughout the load
+            asked = time.monotonic()
+            try:
+                get_json(base_url + '/health', timeout=startup_timeout)
+            finally:
+                slowest_health = max(slowest_health, time.monotonic() - asked)
+            if slowest_health > HEALTH_WHILE_STARTING_MAX_SECONDS:
+                process.kill()
+                raise RuntimeError(f'/health took {slowest_health:.1f}s while the server was starting '
+                                   f'(limit {HEALTH_WHILE_STARTING_MAX_SECONDS}s)')
+            time.sleep(0.05)
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f'Stub TTS server did not become ready within {startup_timeout}s')
+
+
+def compare(summary, baseline, tolerance):
+    """List metrics that regressed against a baseline results file by more than tolerance"""
+    regressions = []
+    for endpoint, current in summary.items():
+        previous = baseline.get('summary', {}).get(endpoint)
+        if not previous:
+            continue
+        for metric, better in COMPARED_METRICS.items():
+            old, new = previous['overall'].get(metric), current['overall'].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (better == 'lower' and change > tolerance) or (better == 'higher' and change < -tolerance):
+                regressions.append({'endpoint': endpoint, 'metric': metric, 'baseline': old,
+                                    'current': new, 'change': round(change, 4)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the Chikoro TTS service')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running service')
+    target.add_argument('--stub', action='store_true', help='Start tts.py on the stub engine')
+    parser.add_argument('--server-pid', type=int, help='PID of the service, for peak RSS (--url mode)')
+    parser.add_argument('--endpoints', default='synthesize,streaming,clone',
+                        help=f"Comma-separated subset of: {', '.join(ENDPOINTS)}")
+    parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--mix', default='short=0.6,medium=0.3,long=0.1', help='Text length distribution')
+    parser.add_argument('--repeat-ratio', type=float, default=0.0, help='Fraction of requests that repeat a text')
+    parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per endpoint')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--stub-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for the stub server (e.g. TTS_WORKERS=2)')
+    parser.add_argument('--output', help='Write JSON results here (default: stdout)')
+    parser.add_argument('--compare', help='Baseline JSON results to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative regression')
+    args = parser.parse_args(argv)
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(unknown)}")
+    mix = parse_mix(args.mix)
+
+    process = None
+    startup = None
+    if args.stub:
+        stub_env = dict(item.split('=', 1) for item in args.stub_env)
+        process, base_url, startup = start_stub_server(free_port(), stub_env)
+        print(f"   startup: live after {startup['live_seconds']}s, ready after {startup['ready_seconds']}s",
+              file=sys.stderr)
+        server_pid = process.pid
+    else:
+        base_url, server_pid = args.url.rstrip('/'), args.server_pid
+
+    speaker_wav = base64.b64encode(make_speaker_wav()).decode('utf-8')
+    summary = {}
+    try:
+        for index, endpoint in enumerate(endpoints):
+            # Warm-up texts use another seed, so they never pre-fill the cache for measured ones
+            seed = endpoint_seed(args.seed, index)
+            warmup = make_texts(args.warmup, mix, seed + 1_000_003, tag=f'Warmup {endpoint}')
+            run_load(base_url, endpoint, warmup, args.concurrency, speaker_wav, args.timeout)
+
+            texts = make_texts(args.requests, mix, seed, args.repeat_ratio, tag=endpoint.capitalize())
+            results, wall = run_load(base_url, endpoint, texts, args.concurrency, speaker_wav, args.timeout)
+            by_length = {
+                length: summarize([r for r in results if r['length'] == length], wall)
+                for length in mix
+            }
+            summary[endpoint] = {
+                'overall': summarize(results, wall),
+                'by_length': by_length,
+                'sample_errors': sorted({r['error'] for r in results if not r['ok']})[:5],
+            }
+            overall = summary[endpoint]['overall']
+            print(f"{endpoint:>10}: p50 {overall['latency_p50']}s  p95 {overall['latency_p95']}s  "
+                  f"ttfa p50 {overall['ttfa_p50']}s  {overall['throughput_rps']} req/s  "
+                  f"rtf {overall['rtf']}  errors {overall['errors']}", file=sys.stderr)
+
+        try:
+            health = get_json(base_url + '/health')
+        except (urllib.error.URLError, OSError, ValueError):
+            health = None
+        server_rss = peak_rss_mb(server_pid) if server_pid else None
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=10)
+
+    results = {
+        'config': {
+            'target': 'stub' if args.stub else base_url,
+            'endpoints': endpoints,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'mix': mix,
+            'repeat_ratio': args.repeat_ratio,
+            'seed': args.seed,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'summary': summary,
+        'server': {
+            'peak_rss_mb': server_rss,
+            'startup': startup,
+            'health': health,
+        },
+        'client_peak_rss_mb': peak_rss_mb(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            results['regressions'] = compare(summary, json.load(f), args.tolerance)
+        for regression in results['regressions']:
+            print(f"REGRESSION {regression['endpoint']} {regression['metric']}: "
+                  f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})",
+                  file=sys.stderr)
+        exit_code = 1 if results['regressions'] else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# ============================================
+# SYNTHESIS RESULT CACHE FOR THE TTS SERVICES
+# ============================================
+#
+# Lesson prompts, greetings and feedback phrases repeat constantly, so
+# synthesized audio is cached by everything that affects the output:
+# normalized text, model, voice, language and output format.
+#
+# Two tiers:
+#   - memory: an LRU bounded by total bytes
+#   - disk:   one file per entry under a cache directory, bounded by total
+#             bytes and evicted least-recently-used (by mtime)
+#
+# The lock only guards the in-memory index; file reads and writes happen
+# outside it, so a lookup never waits on another request's disk I/O.
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+ENTRY_NAME = re.compile(r'[0-9a-f]{64}')
+TEMP_PREFIX = '.tts-cache-tmp-'  # Files being written; renamed to their key when complete
+STALE_TEMP_SECONDS = 3600  # Older temp files are left over from an interrupted write
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different inputs share a cache entry"""
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class SynthesisCache:
+    """Byte-bounded memory LRU backed by an optional disk directory"""
+
+    def __init__(self, name, max_memory_bytes=64 * 1024 * 1024, disk_dir=None, max_disk_bytes=1024 * 1024 * 1024):
+        self.name = name
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = os.path.join(disk_dir, name) if disk_dir else None
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> bytes
+        self._memory_bytes = 0
+        self._disk_index = OrderedDict()  # key -> size, oldest first
+        self._disk_bytes = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                self._load_disk_index()
+            except OSError as e:
+                print(f"Warning: disk cache at {self.disk_dir} unavailable: {e}")
+                self.disk_dir = None
+
+    @staticmethod
+    def make_key(text, model, voice='default', language='en', audio_format='wav'):
+        """Hash every input that changes the synthesized audio"""
+        raw = '\x1f'.join([normalize_text(text), model or '', voice or 'default', language or '', audio_format or ''])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return data
+            on_disk = self.disk_dir is not None and key in self._disk_index
+            if not on_disk:
+                self._stats['misses'] += 1
+                return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # mtime doubles as the LRU clock across restarts
+        except OSError:
+            data = None
+
+        with self._lock:
+            if data is None:
+                self._disk_bytes -= self._disk_index.pop(key, 0)
+                self._stats['misses'] += 1
+                return None
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+            self._store_memory(key, data)
+            self._stats['disk_hits'] += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._store_memory(key, data)
+        if self.disk_dir:
+            self._store_disk(key, data)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+            stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_bytes
+            stats['disk_entries'] = len(self._disk_index)
+            stats['disk_bytes'] = self._disk_bytes
+            return stats
+
+    # --- internals ---
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _store_memory(self, key, data):
+        # Caller holds the lock
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats['evictions'] += 1
+
+    def _store_disk(self, key, data):
+        # Called without the lock: the file is written first, then indexed
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write-then-rename so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            print(f"Warning: could not write cache entry: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk_index.pop(key, 0)
+            self._disk_index[key] = len(data)
+            while self._disk_bytes > self.max_disk_bytes and self._disk_index:
+                old_key, size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= size
+                self._stats['evictions'] += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.unlink(self._path(old_key))
+            except OSError:
+                pass
+
+    def _load_disk_index(self):
+        entries = []
+        now = time.time()
+        for root, _, files in os.walk(self.disk_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # Renamed or evicted by another process meanwhile
+                if filename.startswith(TEMP_PREFIX):
+                    # Another worker may be writing it right now; only old ones are abandoned
+                    if now - st.st_mtime > STALE_TEMP_SECONDS:
+                        try:
+                            os.unlink(path)
+                        except OSError:
+                            pass
+                    continue
+                if ENTRY_NAME.fullmatch(filename):
+                    entries.append((st.st_mtime, filename, st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
@@ -0,0 +1,168 @@
+# ============================================
+# TEXT FRONT-END FOR THE TTS SERVICE
+# ============================================
+#
+# Runs before the model sees any text:
+#   - normalization: unicode, typographic quotes/dashes and markdown left
+#     over from the tutor's answers
+#   - sentence segmentation that does not break on decimals ("3.14"),
+#     abbreviations ("Dr.", "e.g.") or lowercase continuations
+#   - a phoneme cache: glow-tts phonemizes every input with espeak (one
+#     subprocess per clause), yet lesson vocabulary repeats constantly, so
+#     clause- and word-level phoneme sequences are kept in a bounded LRU and
+#     handed to the model instead of calling espeak again
+
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Words ending in '.' that rarely end a sentence
+ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'mt', 'vs', 'etc',
+    'fig', 'eq', 'approx', 'dept', 'est', 'vol', 'ch', 'pp', 'cf', 'ca',
+    'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec',
+}
+
+_REPLACEMENTS = {
+    '‘': "'", '’': "'", '“': '"', '”': '"', '…': '...',
+}
+# En/em dashes: "pages 3–5" -> "pages 3 to 5"; "water — the key" -> "water, the key".
+# Any other dash (e.g. "1990s—2000s", "well–known") becomes a hyphen.
+_DASHES = [
+    (re.compile(r'(?<=\d)\s*[–—]\s*(?=\d)'), ' to '),
+    (re.compile(r'\s+[–—]+\s+'), ', '),
+    (re.compile(r'[–—]'), '-'),
+]
+# Abbreviations only when a number follows: "No. 5", but "The answer is no. Try again."
+NUMBER_ABBREVIATIONS = {'no', 'nos'}
+# Markdown syntax only, so "3 * 4 = 12" and "C#" are read as written
+_MARKDOWN = [
+    (re.compile(r'^\s*#{1,6}\s+', re.MULTILINE), ''),  # headings
+    (re.compile(r'^\s*[-+*]\s+', re.MULTILINE), ''),  # list bullets
+    (re.compile(r'(?<![\w*])(\*{1,3})(?=\S)(.+?)(?<=\S)\1(?![\w*])'), r'\2'),  # *emphasis*, **bold**, ***both***
+    (re.compile(r'^\s*```.*$', re.MULTILINE), ''),  # code fences
+    (re.compile(r'`([^`\n]+)`'), r'\1'),  # inline code
+]
+_PARAGRAPH = re.compile(r'\n\s*\n')
+_BOUNDARY = re.compile(r'[.!?]+["\')\]]*\s+')
+
+
+def normalize_text(text):
+    """Clean text for synthesis; paragraph breaks are kept as blank lines"""
+    text = unicodedata.normalize('NFKC', text)
+    for old, new in _REPLACEMENTS.items():
+        text = text.replace(old, new)
+    for pattern, replacement in _DASHES:
+        text = pattern.sub(replacement, text)
+    for pattern, replacement in _MARKDOWN:
+        text = pattern.sub(replacement, text)
+    paragraphs = (re.sub(r'\s+', ' ', p).strip() for p in _PARAGRAPH.split(text))
+    return '\n\n'.join(p for p in paragraphs if p)
+
+
+def _is_boundary(text, match):
+    """Decide whether a punctuation + whitespace match really ends a sentence"""
+    punctuation = match.group().rstrip()
+    following = text[match.end():match.end() + 1]
+    if following.islower():
+        return False
+    if punctuation.rstrip('"\')]') != '.':
+        return True
+    # Word before the period: "Dr", "e.g", "U.S"
+    word = text[:match.start()].rsplit(None, 1)[-1].lstrip('"\'([').lower() if match.start() else ''
+    if word in NUMBER_ABBREVIATIONS:
+        return not following.isdigit()
+    return word not in ABBREVIATIONS and not re.fullmatch(r'(?:[a-z]\.)+[a-z]', word)
+
+
+def split_sentences(text):
+    """Split text into sentences, treating paragraph breaks as hard boundaries"""
+    sentences = []
+    for paragraph in _PARAGRAPH.split(text):
+        start = 0
+        for match in _BOUNDARY.finditer(paragraph):
+            if _is_boundary(paragraph, match):
+                sentences.append(paragraph[start:match.end()])
+                start = match.end()
+        sentences.append(paragraph[start:])
+    return [s.strip() for s in sentences if s.strip()]
+
+
+class PhonemeCache:
+    """Bounded LRU of phoneme sequences for clauses and single words"""
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (language, separator, text) -> phonemes
+        self._lock = threading.Lock()
+        self._stats = {'clause_hits': 0, 'word_hits': 0, 'misses': 0}
+
+    def get(self, key):
+        with self._lock:
+            phonemes = self._entries.get(key)
+            if phonemes is not None:
+                self._entries.move_to_end(key)
+            return phonemes
+
+    def put(self, key, phonemes):
+        with self._lock:
+            self._entries[key] = phonemes
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def wrap(self, phonemize, language):
+        """
+        Wrap a phonemizer's per-clause function (text, separator) -> phonemes.
+        A clause is served whole from the cache, or assembled from cached words;
+        otherwise it is phonemized once and its words are learned from the output
+        """
+        def cached_phonemize(text, separator=None):
+            key = (language, separator, text)
+            phonemes = self.get(key)
+            if phonemes is not None:
+                self._count('clause_hits')
+                return phonemes
+
+            words = text.split()
+            word_phonemes = [self.get((language, separator, word)) for word in words]
+            if words and all(p is not None for p in word_phonemes):
+                self._count('word_hits')
+                phonemes = ' '.join(word_phonemes)
+            else:
+                self._count('misses')
+                phonemes = phonemize(text, separator)
+                # espeak keeps word boundaries, so a 1:1 split maps phonemes back to words
+                output_words = phonemes.split(' ')
+                if len(output_words) == len(words):
+                    for word, p in zip(words, output_words):
+                        self.put((language, separator, word), p)
+            self.put(key, phonemes)
+            return phonemes
+
+        return cached_phonemize
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            return stats
+
+
+def install_phoneme_cache(tts, cache):
+    """
+    Route a Coqui model's phonemizer through the cache. Returns False for
+    models that do not phonemize (e.g. XTTS, which uses its own BPE tokenizer)
+    """
+    model = getattr(getattr(tts, 'synthesizer', None), 'tts_model', None)
+    phonemizer = getattr(getattr(model, 'tokenizer', None), 'phonemizer', None)
+    if phonemizer is None or not hasattr(phonemizer, '_phonemize'):
+        return False
+    # BasePhonemizer.phonemize strips punctuation and calls _phonemize per clause
+    phonemizer._phonemize = cache.wrap(phonemizer._phonemize, getattr(phonemizer, 'language', None))
+    return True
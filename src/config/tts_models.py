@@ -0,0 +1,153 @@
+# ============================================
+# MODEL REGISTRY AND SPEAKER LATENT CACHE
+# ============================================
+#
+# Several Coqui models can stay resident at once (e.g. glow-tts for normal
+# synthesis and XTTS v2 for voice cloning). Models are loaded lazily on first
+# use and evicted least-recently-used when their combined parameter memory
+# exceeds the budget; pinned models are never evicted. Loading runs outside
+# the registry lock, so stats (and /health) never wait for a model load;
+# concurrent requests for a model that is loading wait on the same load.
+#
+# XTTS conditions every synthesis on latents computed from the reference
+# audio. Those are cached by a hash of the audio so repeat cloning requests
+# for the same teacher voice skip speaker encoding entirely.
+
+import gc
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def model_size_bytes(model):
+    """Parameter + buffer memory of a torch module (0 if it is not one)"""
+    total = 0
+    for tensors in (getattr(model, 'parameters', None), getattr(model, 'buffers', None)):
+        if tensors is None:
+            continue
+        for tensor in tensors():
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class ModelRegistry:
+    """Lazily loaded, memory-bounded LRU of resident TTS models"""
+
+    def __init__(self, loader, max_bytes, pinned=()):
+        # loader(model_name) -> loaded model
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.pinned = set(pinned)
+
+        self._models = OrderedDict()  # name -> (model, size_bytes)
+        self._loading = {}  # name -> Future of a load in progress
+        self._lock = threading.Lock()
+        self._stats = {'loads': 0, 'hits': 0, 'evictions': 0, 'load_failures': 0}
+
+    def get(self, name):
+        """Return a resident model, loading it (and evicting others) if needed"""
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                self._models.move_to_end(name)
+                self._stats['hits'] += 1
+                return entry[0]
+            pending = self._loading.get(name)
+            if pending is None:
+                pending = self._loading[name] = Future()
+                loading = True
+            else:
+                loading = False
+        if not loading:
+            # Someone else is loading it: share their result (or their error)
+            return pending.result()
+
+        print(f"Loading TTS model {name}...")
+        try:
+            model = self.loader(name)
+            size = model_size_bytes(model)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[name]
+                self._stats['load_failures'] += 1
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._models[name] = (model, size)
+            del self._loading[name]
+            self._stats['loads'] += 1
+            evicted = self._evict(keep=name)
+        pending.set_result(model)
+        print(f"Loaded {name} ({size / 1024 / 1024:.0f} MB)")
+        if evicted:
+            self._release_memory()
+        return model
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._models
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['resident'] = {name: size for name, (_, size) in self._models.items()}
+            stats['resident_bytes'] = sum(size for _, size in self._models.values())
+            stats['loading'] = sorted(self._loading)
+            stats['max_bytes'] = self.max_bytes
+            return stats
+
+    def _evict(self, keep):
+        # Caller holds the lock; returns how many models were dropped
+        total = sum(size for _, size in self._models.values())
+        evicted = 0
+        for name in list(self._models):
+            if total <= self.max_bytes:
+                break
+            if name == keep or name in self.pinned:
+                continue
+            _, size = self._models.pop(name)
+            total -= size
+            evicted += 1
+            self._stats['evictions'] += 1
+            print(f"Evicted TTS model {name} to stay within memory budget")
+        return evicted
+
+    def _release_memory(self):
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+
+class SpeakerLatentCache:
+    """LRU of XTTS conditioning latents keyed by (model, reference audio hash)"""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return self._entries[key]
+            self._stats['misses'] += 1
+
+        latents = compute()
+        with self._lock:
+            self._entries[key] = latents
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return latents
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            return stats
@@ -0,0 +1,195 @@
+# ============================================
+# MICRO-BATCHING INFERENCE SCHEDULER FOR TTS
+# ============================================
+#
+# One worker thread owns the model. Request threads never call it directly:
+# they submit work items and wait on a Future. The worker takes the first
+# pending item, keeps collecting more until the batch is full or the wait
+# budget runs out, removes duplicates (the same sentence requested by
+# several students at once is synthesized once) and hands the batch to the
+# engine's batch function, then fans the results back out.
+#
+# With num_workers > 1 (process pool mode) several dispatch threads pull
+# batches concurrently; run_batch then routes each batch to an idle worker
+# process, and exclusive jobs are still serialized among themselves.
+#
+# Jobs may carry a deadline (a time.monotonic() value). Work still queued
+# when its deadline passes is failed with DeadlineExceeded instead of being
+# run: its client has given up, and running it would only delay everyone
+# queued behind it. A deduplicated item keeps the latest of its requesters'
+# deadlines.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class DeadlineExceeded(Exception):
+    """The job's deadline passed while it was still queued, so it was never run"""
+
+
+class InferenceScheduler:
+    """Queue + single model-owning worker that runs requests in micro-batches"""
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10, name='tts-inference', num_workers=1, observe=None):
+        # run_batch(items) -> list of results, one per item, in order
+        self.run_batch = run_batch
+        # observe(stage, seconds) receives per-item 'queue_wait' and per-batch 'inference' timings
+        self.observe = observe
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.num_workers = num_workers
+
+        self._queue = queue.Queue()
+        self._inflight = {}  # key -> Future, so identical pending items share one inference
+        self._deadlines = {}  # key -> latest deadline of an in-flight item (None = no deadline)
+        self._lock = threading.Lock()
+        self._exclusive_lock = threading.Lock()
+        self._threads = []
+        self._stats = {'batches': 0, 'items': 0, 'deduplicated': 0, 'exclusive': 0, 'expired': 0}
+
+    def start(self):
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            for i in range(self.num_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, item, deadline=None):
+        """Queue a batchable item; returns a Future with its result"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._stats['deduplicated'] += 1
+                previous = self._deadlines.get(key)
+                if previous is not None:
+                    self._deadlines[key] = None if deadline is None else max(previous, deadline)
+                return future
+            future = Future()
+            self._inflight[key] = future
+            self._deadlines[key] = deadline
+        self._queue.put(('batch', key, item, future, time.monotonic(), deadline))
+        return future
+
+    def run_exclusive(self, fn, deadline=None):
+        """Run fn() on the worker thread (e.g. model swaps, voice cloning); returns a Future"""
+        future = Future()
+        self._queue.put(('exclusive', None, fn, future, time.monotonic(), deadline))
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pending'] = self.pending()
+        stats['avg_batch_size'] = round(stats['items'] / stats['batches'], 2) if stats['batches'] else 0.0
+        return stats
+
+    def _observe(self, stage, seconds):
+        if self.observe:
+            try:
+                self.observe(stage, seconds)
+            except Exception:
+                pass
+
+    # --- worker ---
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job[0] == 'exclusive':
+                self._run_exclusive(job)
+                continue
+
+            batch = [job]
+            deferred = None
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job[0] == 'exclusive':
+                    # Keep ordering simple: run it right after this batch
+                    deferred = job
+                    break
+                batch.append(job)
+
+            self._run_batch(batch)
+            if deferred:
+                self._run_exclusive(deferred)
+
+    def _expire(self, job):
+        """Fail a job whose deadline has passed; True if it was dropped"""
+        kind, key, _, future, _, deadline = job
+        now = time.monotonic()
+        with self._lock:
+            if kind == 'batch':
+                deadline = self._deadlines.get(key)
+            if deadline is None or now < deadline:
+                return False
+            self._stats['expired'] += 1
+            if kind == 'batch':
+                self._inflight.pop(key, None)
+                self._deadlines.pop(key, None)
+        future.set_exception(DeadlineExceeded('Request deadline passed before synthesis started'))
+        return True
+
+    def _run_batch(self, batch):
+        batch = [job for job in batch if not self._expire(job)]
+        if not batch:
+            return
+        keys = [key for _, key, _, _, _, _ in batch]
+        items = [item for _, _, item, _, _, _ in batch]
+        started = time.monotonic()
+        for _, _, _, _, enqueued, _ in batch:
+            self._observe('queue_wait', started - enqueued)
+        try:
+            results = self.run_batch(items)
+            errors = [None] * len(batch)
+        except Exception as e:
+            results, errors = [None] * len(batch), [e] * len(batch)
+        self._observe('inference', time.monotonic() - started)
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['items'] += len(batch)
+            for key in keys:
+                self._inflight.pop(key, None)
+                self._deadlines.pop(key, None)
+
+        for (_, _, _, future, _, _), result, error in zip(batch, results, errors):
+            if error is not None:
+                future.set_exception(error)
+            elif isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _run_exclusive(self, job):
+        if self._expire(job):
+            return
+        _, _, fn, future, enqueued, _ = job
+        with self._lock:
+            self._stats['exclusive'] += 1
+        try:
+            with self._exclusive_lock:
+                started = time.monotonic()
+                self._observe('queue_wait', started - enqueued)
+                try:
+                    result = fn()
+                finally:
+                    self._observe('exclusive', time.monotonic() - started)
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
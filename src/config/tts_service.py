@@ -1,34 +1,124 @@
-from flask import Flask, request, jsonify, send_file
-from TTS.api import TTS
-import torch  # <-- ADDED THIS LINE
+from flask import Flask, Response, request, jsonify, send_file
 import base64
 import io
 import os
 import tempfile
+import hashlib
+
+from tts_audio import MIME_TYPES, concat_wavs, encode_wav
+from tts_cache import SynthesisCache
+from tts_frontend import normalize_text, split_sentences
+from tts_startup import StartupTracker
 
 app = Flask(__name__)
 
-# Check if CUDA is available and set the device
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Using device: {device}")
+# Cache synthesized audio so repeated phrases skip the model entirely: whole
+# responses, plus individual sentences so long texts reuse sentences synthesized before
+CACHE_DIR = os.environ.get('TTS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'chikoro-tts-cache'))
+CACHE_MEMORY_BYTES = int(os.environ.get('TTS_CACHE_MEMORY_MB', 64)) * 1024 * 1024
+CACHE_DISK_BYTES = int(os.environ.get('TTS_CACHE_DISK_MB', 1024)) * 1024 * 1024
+cache = SynthesisCache('responses', CACHE_MEMORY_BYTES // 2, CACHE_DIR, CACHE_DISK_BYTES // 2)
+sentence_cache = SynthesisCache('sentences', CACHE_MEMORY_BYTES // 2, CACHE_DIR, CACHE_DISK_BYTES // 2)
 
-# Initialize TTS with a good model and move it to the selected device
 # Options: tts_models/en/ljspeech/glow-tts (fast)
 #          tts_models/multilingual/multi-dataset/xtts_v2 (best quality, supports voice cloning)
-try:
-    # Note: If you are using the XTTS model, you might need to install additional dependencies
-    # pip install pydub
-    tts = TTS("tts_models/en/ljspeech/glow-tts").to(device)
-except Exception as e:
-    print(f"Error initializing TTS: {e}")
-    # Fallback to a CPU-only model or handle the error as needed
-    tts = None
+MODEL_NAME = os.environ.get('TTS_MODEL', 'tts_models/en/ljspeech/glow-tts')
+WARMUP_TEXT = 'Mhoroi, welcome to Chikoro.'
+
+# torch and Coqui are imported and the model loaded on a background thread,
+# so the port opens immediately; /health/ready turns 200 once it is warm
+startup = StartupTracker(['importing', 'loading_model', 'warming_up'])
+tts = None
+
+
+def load_model():
+    """Startup thread: import torch and Coqui, load the model, run one warm-up inference"""
+    global tts
+    with startup.phase('importing'):
+        import torch
+        if os.environ.get('TTS_STUB_ENGINE'):
+            from tts_stub import StubTTS as TTS
+        else:
+            # Note: If you are using the XTTS model, you might need to install additional dependencies
+            # pip install pydub
+            from TTS.api import TTS
+    with startup.phase('loading_model'):
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"Using device: {device}")
+        model = TTS(MODEL_NAME).to(device)
+    with startup.phase('warming_up'):
+        # The first inference pays for lazy initialization; do it before a student does
+        if "xtts" not in model.model_name:
+            encode_wav(model.tts(text=WARMUP_TEXT), model.synthesizer.output_sample_rate)
+    tts = model
+
+
+def synthesize_sentences(text, voice='default', **tts_kwargs):
+    """WAV for text, running the model only for sentences not in the sentence cache"""
+    chunks = []
+    for sentence in split_sentences(normalize_text(text)) or [text]:
+        key = SynthesisCache.make_key(sentence, tts.model_name, voice, 'en', 'wav')
+        audio_data = sentence_cache.get(key)
+        if audio_data is None:
+            audio_data = encode_wav(tts.tts(text=sentence, **tts_kwargs), tts.synthesizer.output_sample_rate)
+            sentence_cache.put(key, audio_data)
+        chunks.append(audio_data)
+    return concat_wavs(chunks)
+
+
+def not_ready_response():
+    """503 for requests that arrive before the model is loaded (or after loading failed)"""
+    status = startup.status()
+    if status['state'] == 'failed':
+        return jsonify({'error': 'TTS model is not available.', 'startup': status}), 503
+    return (jsonify({'error': 'TTS model is still loading, try again shortly', 'startup': status}), 503,
+            {'Retry-After': str(startup.retry_after)})
+
+
+def audio_response(audio_data, cached=False):
+    """Raw WAV bytes if the client sends Accept: audio/wav, else the base64 JSON body"""
+    if request.accept_mimetypes.best_match(['application/json', MIME_TYPES['wav']]) == MIME_TYPES['wav']:
+        return Response(audio_data, mimetype=MIME_TYPES['wav'],
+                        headers={'X-TTS-Cached': 'true' if cached else 'false'})
+    body = {
+        'audio': base64.b64encode(audio_data).decode('utf-8'),
+        'format': 'wav'
+    }
+    if cached:
+        body['cached'] = True
+    return jsonify(body)
+
+@app.route('/health', methods=['GET'])
+def health():
+    status = startup.status()
+    return jsonify({
+        'status': {'ready': 'healthy', 'starting': 'starting', 'failed': 'degraded'}[status['state']],
+        'startup': status,
+        'model': tts.model_name if tts else None,
+        'cache': {
+            'responses': cache.stats(),
+            'sentences': sentence_cache.stats()
+        }
+    })
 
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """200 while the process is up, including while the model loads; 503 if loading failed"""
+    status = startup.status()
+    return jsonify(status), 503 if status['state'] == 'failed' else 200
+
+@app.route('/health/ready', methods=['GET'])
+def readiness():
+    """200 only once the model is loaded and warmed up"""
+    status = startup.status()
+    if status['state'] == 'ready':
+        return jsonify(status)
+    return jsonify(status), 503, {'Retry-After': str(startup.retry_after)}
 
 @app.route('/synthesize', methods=['POST'])
 def synthesize():
-    if not tts:
-        return jsonify({'error': 'TTS model is not available.'}), 503
+    if not startup.ready:
+        return not_ready_response()
 
     try:
         data = request.json
@@ -36,22 +126,16 @@ def synthesize():
         if not text:
             return jsonify({'error': 'No text provided.'}), 400
 
-        # Generate speech
-        # tts.tts_to_file returns the path to the file
-        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.wav').name
-        tts.tts_to_file(text=text, file_path=output_path)
-        
-        # Read the file and convert to base64
-        with open(output_path, 'rb') as f:
-            audio_data = f.read()
-        
-        # Clean up the temporary file
-        os.unlink(output_path)
+        cache_key = SynthesisCache.make_key(text, tts.model_name, 'default', 'en', 'wav')
+        audio_data = cache.get(cache_key)
+        if audio_data is not None:
+            return audio_response(audio_data, cached=True)
+
+        # Generate speech sentence by sentence and encode it in memory (no temp files)
+        audio_data = synthesize_sentences(text)
+        cache.put(cache_key, audio_data)
         
-        return jsonify({
-            'audio': base64.b64encode(audio_data).decode('utf-8'),
-            'format': 'wav'
-        })
+        return audio_response(audio_data)
             
     except Exception as e:
         print(f"Error during synthesis: {e}")
@@ -62,7 +146,9 @@ def synthesize():
 @app.route('/synthesize-with-voice', methods=['POST'])
 def synthesize_with_voice():
     """For voice cloning with XTTS v2"""
-    if not tts or "xtts" not in tts.model_name:
+    if not startup.ready:
+        return not_ready_response()
+    if "xtts" not in tts.model_name:
         return jsonify({'error': 'Voice cloning model (XTTS) is not loaded.'}), 503
 
     try:
@@ -75,39 +161,34 @@ def synthesize_with_voice():
         
         # Decode speaker wav
         speaker_wav_data = base64.b64decode(speaker_wav_base64)
-        
-        # Create temporary files for speaker and output
-        speaker_file_path = tempfile.NamedTemporaryFile(delete=False, suffix='.wav').name
-        output_file_path = tempfile.NamedTemporaryFile(delete=False, suffix='.wav').name
 
-        try:
-            with open(speaker_file_path, 'wb') as speaker_file:
-                speaker_file.write(speaker_wav_data)
+        voice_hash = hashlib.sha256(speaker_wav_data).hexdigest()
+        cache_key = SynthesisCache.make_key(text, tts.model_name, voice_hash, 'en', 'wav')
+        audio_data = cache.get(cache_key)
+        if audio_data is not None:
+            return audio_response(audio_data, cached=True)
+        
+        # XTTS reads the reference audio from a path; the output stays in memory
+        with tempfile.NamedTemporaryFile(suffix='.wav') as speaker_file:
+            speaker_file.write(speaker_wav_data)
+            speaker_file.flush()
             
-            tts.tts_to_file(
-                text=text,
-                speaker_wav=speaker_file_path,
-                language="en",  # Adjust language if needed
-                file_path=output_file_path
+            audio_data = synthesize_sentences(
+                text,
+                voice=voice_hash,
+                speaker_wav=speaker_file.name,
+                language="en"  # Adjust language if needed
             )
-            
-            with open(output_file_path, 'rb') as f:
-                audio_data = f.read()
-
-            return jsonify({
-                'audio': base64.b64encode(audio_data).decode('utf-8'),
-                'format': 'wav'
-            })
-        finally:
-            # Clean up temporary files
-            if os.path.exists(speaker_file_path):
-                os.unlink(speaker_file_path)
-            if os.path.exists(output_file_path):
-                os.unlink(output_file_path)
+        
+        cache.put(cache_key, audio_data)
+
+        return audio_response(audio_data)
                 
     except Exception as e:
         print(f"Error during voice cloning: {e}")
         return jsonify({'error': str(e)}), 500
 
+startup.start(load_model)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,101 @@
+# ============================================
+# BACKGROUND STARTUP AND READINESS FOR TTS
+# ============================================
+#
+# Importing torch and Coqui and loading model weights takes seconds to
+# minutes. Doing it at import time kept the port closed the whole time, so a
+# restarting container looked exactly like a dead one. Instead the service
+# binds straight away and a loader thread works through named phases
+# (importing, loading_model, starting_workers, warming_up):
+#   - liveness (/health/live) is 200 while the process is up and loading,
+#     and 503 only if startup failed;
+#   - readiness (/health/ready) is 200 only once the model is loaded and
+#     warmed up, so load balancers and rolling deploys keep traffic on warm
+#     instances until then.
+
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+
+class StartupTracker:
+    """Thread-safe record of startup phases and whether the service is ready"""
+
+    def __init__(self, phases, retry_after=5):
+        self.phases = list(phases)  # expected phases, in order, for the progress figure
+        self.retry_after = retry_after  # Retry-After hint (seconds) for requests turned away while starting
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._state = 'starting'
+        self._phase = None
+        self._timings = {}  # phase -> seconds (running phases: seconds so far)
+        self._phase_started = None
+        self._ready_after = None
+        self._error = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._state == 'ready'
+
+    @property
+    def failed(self):
+        return self._state == 'failed'
+
+    @contextmanager
+    def phase(self, name):
+        """Time a startup phase"""
+        with self._lock:
+            self._phase = name
+            self._phase_started = time.monotonic()
+        print(f"Startup: {name}...")
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._timings[name] = round(time.monotonic() - self._phase_started, 3)
+                self._phase_started = None
+
+    def start(self, load):
+        """Run load() on a daemon thread; ready when it returns, failed if it raises"""
+        def run():
+            try:
+                load()
+            except Exception as e:
+                traceback.print_exc()
+                with self._lock:
+                    self._state = 'failed'
+                    self._error = f"{type(e).__name__}: {e}"
+                print(f"Startup failed during {self._phase}: {e}")
+                return
+            with self._lock:
+                self._state = 'ready'
+                self._phase = None
+                self._ready_after = round(time.monotonic() - self._started, 3)
+            print(f"Startup complete in {self._ready_after:.1f}s, ready for requests")
+
+        self._thread = threading.Thread(target=run, name='tts-startup', daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until startup has finished (ready or failed); returns True if ready"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def status(self):
+        with self._lock:
+            timings = dict(self._timings)
+            if self._phase_started is not None:
+                timings[self._phase] = round(time.monotonic() - self._phase_started, 3)
+            done = sum(1 for name in self.phases if name in self._timings)
+            return {
+                'state': self._state,
+                'phase': self._phase,
+                'progress': 1.0 if self._state == 'ready' else round(done / max(1, len(self.phases)), 2),
+                'phases': timings,
+                'uptime_seconds': round(time.monotonic() - self._started, 3),
+                'ready_after_seconds': self._ready_after,
+                'error': self._error
+            }
@@ -0,0 +1,70 @@
+# ============================================
+# DETERMINISTIC STUB TTS ENGINE
+# ============================================
+#
+# Stands in for Coqui's TTS class (TTS_STUB_ENGINE=1) so the service, and
+# the benchmarks in tts_bench.py, run offline without model downloads or a
+# GPU. Output length and compute time depend only on the input text:
+#   - audio lasts len(text) / STUB_CHARS_PER_SECOND seconds
+#   - synthesis takes audio seconds * STUB_RTF (real-time factor) seconds
+# The waveform is a tone whose pitch is derived from a hash of the text.
+# TTS_STUB_LOAD_SECONDS adds a model load delay, for exercising startup.
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+STUB_SAMPLE_RATE = int(os.environ.get('TTS_STUB_SAMPLE_RATE', 22050))
+STUB_CHARS_PER_SECOND = float(os.environ.get('TTS_STUB_CHARS_PER_SECOND', 15))
+STUB_RTF = float(os.environ.get('TTS_STUB_RTF', 0.1))
+STUB_LATENT_SECONDS = float(os.environ.get('TTS_STUB_LATENT_SECONDS', 0.2))
+STUB_LOAD_SECONDS = float(os.environ.get('TTS_STUB_LOAD_SECONDS', 0))  # stands in for reading weights
+
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:4], 'big')
+
+
+def stub_waveform(text, voice='', sample_rate=STUB_SAMPLE_RATE):
+    """Deterministic float waveform for a piece of text in a given voice"""
+    duration = max(len(text), 1) / STUB_CHARS_PER_SECOND
+    time.sleep(duration * STUB_RTF)
+    frequency = 120 + _seed(f"{text}\x1f{voice}") % 180
+    t = np.arange(int(duration * sample_rate), dtype=np.float32) / sample_rate
+    return (0.3 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+class StubXTTSModel:
+    """Mimics the parts of Coqui's Xtts model the cloning endpoint uses"""
+
+    def get_conditioning_latents(self, audio_path):
+        time.sleep(STUB_LATENT_SECONDS)
+        with open(audio_path[0], 'rb') as f:
+            seed = _seed(hashlib.sha256(f.read()).hexdigest())
+        return np.full(4, seed % 97, dtype=np.float32), np.full(4, seed % 89, dtype=np.float32)
+
+    def inference(self, text, language, gpt_cond_latent, speaker_embedding):
+        return {'wav': stub_waveform(text, float(speaker_embedding[0]))}
+
+
+class StubSynthesizer:
+    def __init__(self):
+        self.output_sample_rate = STUB_SAMPLE_RATE
+        self.tts_model = StubXTTSModel()
+
+
+class StubTTS:
+    """Drop-in for TTS.api.TTS: TTS(model_name).to(device).tts(text=..., speaker=...)"""
+
+    def __init__(self, model_name=None):
+        time.sleep(STUB_LOAD_SECONDS)
+        self.model_name = model_name
+        self.synthesizer = StubSynthesizer()
+
+    def to(self, device):
+        return self
+
+    def tts(self, text, speaker=None, **kwargs):
+        return stub_waveform(text, speaker or '')
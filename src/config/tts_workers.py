@@ -0,0 +1,241 @@
+# ============================================
+# PRE-FORK CPU WORKER POOL FOR TTS
+# ============================================
+#
+# On CPU-only nodes one process running one model leaves most cores idle
+# (or has every request thrash inside the same torch call). In pool mode a
+# loader process loads the model once, then forks N worker processes that
+# inherit the weights copy-on-write. Each worker pins torch to a small,
+# explicit number of threads, and the parent routes each job to an idle
+# worker over a pipe.
+#
+# Workers are forked, not spawned: spawning would re-import the service
+# module in every child (reloading the model and restarting the server).
+# The server itself never forks once it has threads (HTTP, scheduler,
+# startup), since a child could inherit a lock some other thread held. The
+# loader is forked at import time while the parent is still single-threaded,
+# stays single-threaded, and forks every worker, including replacements for
+# workers that die or time out.
+
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+
+
+def default_threads_per_worker(num_workers):
+    """Split the machine's cores evenly between workers"""
+    return max(1, (os.cpu_count() or 1) // max(1, num_workers))
+
+
+def _loader_main(handler, initializer, commands, address, authkey, threads):
+    """Loader process: run the initializer once, then fork a worker per index received"""
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # exited workers are reaped automatically
+    try:
+        if initializer:
+            initializer()
+        commands.send((True, None))
+    except Exception as e:
+        traceback.print_exc()
+        commands.send((False, f"{type(e).__name__}: {e}"))
+        return
+
+    while True:
+        try:
+            index = commands.recv()
+        except (EOFError, OSError):
+            return
+        if index is None:
+            return
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                commands.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                conn = Client(address, authkey=authkey)
+                conn.send(index)
+                _worker_main(handler, conn, threads)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        commands.send(pid)
+
+
+def _worker_main(handler, conn, threads):
+    """Worker process loop: receive a payload, run the handler, send the result back"""
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+
+    while True:
+        try:
+            payload = conn.recv()
+        except (EOFError, OSError):
+            return
+        if payload is None:
+            return
+        try:
+            conn.send((True, handler(payload)))
+        except Exception as e:
+            # Exceptions may not survive pickling, so send a description instead
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class WorkerProcessError(RuntimeError):
+    """A job failed inside, or because of, a worker process"""
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class ProcessWorkerPool:
+    """
+    Fixed set of forked worker processes with idle-worker dispatch.
+    initializer (e.g. loading the model) runs once in the loader process,
+    and its state is inherited by every worker
+    """
+
+    def __init__(self, handler, num_workers, threads_per_worker=None, initializer=None):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("Process pool mode needs the 'fork' start method (Linux/macOS)")
+        self.handler = handler
+        self.initializer = initializer
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or default_threads_per_worker(num_workers)
+
+        self._ctx = multiprocessing.get_context('fork')
+        self._loader = None
+        self._commands = None  # parent end of the pipe to the loader
+        self._listener = None  # workers connect back here
+        self._workers = [None] * num_workers  # index -> (pid, parent end of pipe)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._spawn_lock = threading.Lock()
+        self._stats = {'jobs': 0, 'failures': 0, 'restarts': 0, 'busy_seconds': 0.0}
+
+    def start(self):
+        """Fork the loader process. Call before this process starts any other thread"""
+        authkey = os.urandom(32)
+        self._listener = Listener(family='AF_UNIX', authkey=authkey)
+        self._commands, loader_conn = self._ctx.Pipe()
+        self._loader = self._ctx.Process(
+            target=_loader_main,
+            args=(self.handler, self.initializer, loader_conn, self._listener.address, authkey,
+                  self.threads_per_worker),
+            name='tts-worker-loader',
+            daemon=True
+        )
+        self._loader.start()
+        loader_conn.close()
+
+    def start_workers(self):
+        """Wait for the loader to finish initializing, then have it fork the workers"""
+        try:
+            ok, error = self._commands.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerProcessError(f"Worker loader died: {e}")
+        if not ok:
+            raise WorkerProcessError(f"Worker loader failed: {error}")
+        for index in range(self.num_workers):
+            self._spawn(index)
+            self._idle.put(index)
+        print(f"Started {self.num_workers} TTS worker processes ({self.threads_per_worker} torch threads each)")
+
+    def _spawn(self, index):
+        with self._spawn_lock:
+            try:
+                self._commands.send(index)
+                pid = self._commands.recv()
+            except (EOFError, OSError) as e:
+                raise WorkerProcessError(f"Worker loader died: {e}")
+            conn = self._listener.accept()
+            if conn.recv() != index:
+                conn.close()
+                raise WorkerProcessError(f"Worker {index} did not connect")
+        self._workers[index] = (pid, conn)
+
+    def _restart(self, index):
+        pid, conn = self._workers[index]
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        conn.close()
+        self._spawn(index)
+        with self._lock:
+            self._stats['restarts'] += 1
+
+    def call(self, payload, timeout=None):
+        """Run the handler on an idle worker and return its result (blocks until one is free)"""
+        index = self._idle.get()
+        started = time.monotonic()
+        try:
+            _, conn = self._workers[index]
+            try:
+                conn.send(payload)
+                if not conn.poll(timeout):
+                    self._restart(index)
+                    raise WorkerProcessError(f"Worker {index} timed out after {timeout}s")
+                ok, result = conn.recv()
+            except (EOFError, OSError, BrokenPipeError) as e:
+                self._restart(index)
+                raise WorkerProcessError(f"Worker {index} died: {e}")
+            if not ok:
+                with self._lock:
+                    self._stats['failures'] += 1
+                raise WorkerProcessError(result)
+            return result
+        finally:
+            with self._lock:
+                self._stats['jobs'] += 1
+                self._stats['busy_seconds'] += time.monotonic() - started
+            self._idle.put(index)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['busy_seconds'] = round(stats['busy_seconds'], 3)
+        stats['workers'] = self.num_workers
+        stats['idle'] = self._idle.qsize()
+        stats['threads_per_worker'] = self.threads_per_worker
+        stats['alive'] = sum(1 for pid, _ in filter(None, self._workers) if _pid_alive(pid))
+        return stats
+
+    def close(self):
+        for entry in self._workers:
+            if entry is None:
+                continue
+            pid, conn = entry
+            try:
+                conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            deadline = time.monotonic() + 2
+            while _pid_alive(pid) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            if _pid_alive(pid):
+                os.kill(pid, signal.SIGKILL)
+        if self._loader is not None:
+            try:
+                self._commands.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+            self._loader.join(timeout=2)
+            if self._loader.is_alive():
+                self._loader.kill()
+            self._listener.close()
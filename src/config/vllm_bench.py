@@ -0,0 +1,293 @@
+"""
+Throughput benchmark for the chat model server (vLLM or Ollama).
+
+Sweeps concurrency levels and, at each one, keeps that many streaming chat
+requests in flight until the level's requests are done. Reported per level:
+
+- output tokens/sec across all requests (what continuous batching raises),
+- tokens/sec seen by a single request (what batching costs each student),
+- requests/sec, and p50/p95/p99 latency and time to first token.
+
+Tokens are counted as streamed content chunks, which vLLM and Ollama send
+one per generated token.
+
+Without --url the benchmark starts a local stand-in for vLLM's
+OpenAI-compatible API that imitates continuous batching: every running
+sequence gets one token per decode step, a step slows down a little as the
+batch grows, and at most --standin-max-seqs sequences run at once (the
+rest queue, like vLLM's --max-num-seqs). Useful to check the harness and
+the client side; point --url at a real server for real numbers.
+
+Usage:
+    python vllm_bench.py
+    python vllm_bench.py --url http://localhost:8000/v1 --model chikoro-ai --concurrency 1,8,32,64
+    python vllm_bench.py --backend ollama --url http://localhost:11434/api/chat --model chikoro-ai
+"""
+
+import argparse
+import json
+import math
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client import HTTPClient
+from model_backend import BACKENDS, create_backend
+
+DEFAULT_PROMPT = "mwana wembudzi anonzi chii"
+DEFAULT_MODEL = "llava-hf/llava-v1.6-mistral-7b-hf"
+STANDIN_WORDS = ("Mwana", " wembudzi", " anonzi", " kudzana", ".", " A", " young", " goat", " is", " called",
+                 " a", " kid", ".")
+
+
+# --- stand-in server ---
+
+class _BatchEmulator:
+    """Continuous-batching timing model shared by all stand-in requests."""
+
+    def __init__(self, max_num_seqs: int, step_seconds: float, batch_cost: float):
+        self.slots = threading.Semaphore(max_num_seqs)
+        self.step = step_seconds
+        self.batch_cost = batch_cost
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def join(self):
+        self.slots.acquire()
+        with self.lock:
+            self.running += 1
+
+    def leave(self):
+        with self.lock:
+            self.running -= 1
+        self.slots.release()
+
+    def step_seconds(self) -> float:
+        # One decode step serves the whole batch; it only gets slightly slower per extra sequence.
+        return self.step * (1 + self.batch_cost * max(0, self.running - 1))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """/v1/chat/completions, streaming (SSE) and non-streaming, timed by a _BatchEmulator."""
+
+    protocol_version = "HTTP/1.1"
+    emulator = None
+    prefill = 0.0
+    default_tokens = 128
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        count = int(body.get("max_tokens") or self.default_tokens)
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in body.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": count, "total_tokens": prompt_tokens + count}
+        tokens = (STANDIN_WORDS[i % len(STANDIN_WORDS)] for i in range(count))
+
+        self.emulator.join()
+        try:
+            time.sleep(self.prefill)
+            if not body.get("stream"):
+                text = ""
+                for token in tokens:
+                    time.sleep(self.emulator.step_seconds())
+                    text += token
+                self._send_json(200, {
+                    "object": "chat.completion", "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "length"}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                time.sleep(self.emulator.step_seconds())
+                self._event({"object": "chat.completion.chunk", "model": body.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            self._event({"object": "chat.completion.chunk", "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "length"}]})
+            self._event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        finally:
+            self.emulator.leave()
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _event(self, payload):
+        data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_standin(max_num_seqs: int, step_ms: float, prefill_ms: float, batch_cost: float) -> ThreadingHTTPServer:
+    """Starts the stand-in server on a free local port in a daemon thread."""
+    handler = type("StandInHandler", (StandInHandler,), {
+        "emulator": _BatchEmulator(max_num_seqs, step_ms / 1000, batch_cost),
+        "prefill": prefill_ms / 1000,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- benchmark ---
+
+def _percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1], 4)
+
+
+def timed_request(backend, messages: list[dict]) -> dict:
+    """Streams one reply and returns its latency, time to first token and token count."""
+    started = time.perf_counter()
+    first_token, tokens = None, 0
+    try:
+        for _ in backend.chat_stream(messages):
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            tokens += 1
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    latency = time.perf_counter() - started
+    return {"latency": latency, "ttft": first_token, "tokens": tokens}
+
+
+def run_level(backend, messages: list[dict], concurrency: int, requests: int) -> dict:
+    """Issues `requests` requests with `concurrency` of them in flight at a time."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: timed_request(backend, messages), range(requests)))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in results if "error" not in r]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    tokens = sum(r["tokens"] for r in ok)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(results) - len(ok),
+        "first_error": next((r["error"] for r in results if "error" in r), None),
+        "wall_seconds": round(wall, 4),
+        "output_tokens": tokens,
+        "tokens_per_second": round(tokens / wall, 2) if wall else None,
+        "per_request_tokens_per_second": round(statistics.mean(r["tokens"] / r["latency"] for r in ok), 2) if ok else None,
+        "requests_per_second": round(len(ok) / wall, 3) if wall else None,
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p95": _percentile(latencies, 95),
+        "latency_p99": _percentile(latencies, 99),
+        "ttft_p50": _percentile(ttfts, 50),
+        "ttft_p95": _percentile(ttfts, 95),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Sweep concurrency against a chat model server")
+    parser.add_argument("--url", help="API base (openai, e.g. http://localhost:8000/v1) or /api/chat endpoint "
+                                      "(ollama); default: start a local stand-in server")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="openai")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--api-key", help="Bearer token for hosted OpenAI-compatible endpoints")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32,64", help="Comma-separated levels to sweep")
+    parser.add_argument("--rounds", type=int, default=4, help="Requests per level = rounds x concurrency")
+    parser.add_argument("--max-tokens", type=int, default=256, help="Tokens generated per request")
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests before the sweep")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait between bytes of a reply")
+    parser.add_argument("--standin-max-seqs", type=int, default=256, help="Stand-in: sequences batched at once")
+    parser.add_argument("--standin-step-ms", type=float, default=20, help="Stand-in: decode step time for one sequence")
+    parser.add_argument("--standin-prefill-ms", type=float, default=50, help="Stand-in: delay before the first token")
+    parser.add_argument("--standin-batch-cost", type=float, default=0.03,
+                        help="Stand-in: step slowdown per extra running sequence (0.03 = 3%%)")
+    parser.add_argument("--output", help="Write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    try:
+        levels = sorted({int(level) for level in args.concurrency.split(",") if level.strip()})
+    except ValueError:
+        parser.error("--concurrency must be comma-separated integers")
+    if not levels or levels[0] < 1:
+        parser.error("--concurrency levels must be positive")
+    if args.url is None and args.backend != "openai":
+        parser.error("the stand-in server speaks the OpenAI API only; pass --url for other backends")
+
+    standin = None
+    url = args.url
+    if url is None:
+        standin = start_standin(args.standin_max_seqs, args.standin_step_ms, args.standin_prefill_ms,
+                                args.standin_batch_cost)
+        url = f"http://127.0.0.1:{standin.server_address[1]}/v1"
+        print(f"Using stand-in server at {url}", file=sys.stderr)
+
+    # One connection per in-flight request and no retries, so failures show up as errors.
+    http = HTTPClient(default_pool_size=levels[-1], read_timeout=args.timeout, retries=0)
+    backend = create_backend(args.backend, url, args.model, http, api_key=args.api_key,
+                             options={"max_tokens": args.max_tokens, "temperature": 0})
+    messages = [{"role": "user", "content": args.prompt}]
+
+    results = []
+    try:
+        for _ in range(args.warmup):
+            warm = timed_request(backend, messages)
+            if "error" in warm:
+                print(f"Warm-up request failed: {warm['error']}", file=sys.stderr)
+                return 1
+        for concurrency in levels:
+            level = run_level(backend, messages, concurrency, concurrency * max(1, args.rounds))
+            results.append(level)
+            print(f"concurrency {concurrency:>4}: {level['tokens_per_second']} tok/s total, "
+                  f"{level['per_request_tokens_per_second']} tok/s per request, "
+                  f"latency p50 {level['latency_p50']}s p95 {level['latency_p95']}s, "
+                  f"ttft p50 {level['ttft_p50']}s, errors {level['errors']}", file=sys.stderr)
+    finally:
+        http.close()
+        if standin is not None:
+            standin.shutdown()
+
+    output = json.dumps({
+        "config": {
+            "url": args.url or "stand-in",
+            "backend": args.backend,
+            "model": args.model,
+            "max_tokens": args.max_tokens,
+            "rounds": args.rounds,
+            "prompt": args.prompt,
+        },
+        "levels": results,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Two-tier (memory + SQLite) TTL cache for the research agent's web tools.
+
+Values are JSON-serialisable objects. The memory tier is an LRU bounded by
+the encoded size of its entries; the disk tier is a SQLite table bounded the
+same way and evicted least-recently-used first. Both tiers honour a per-entry
+TTL, and every lookup is counted so hit rates can be reported.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "chikoro-ai", "web_cache.sqlite3")
+
+# Query parameters that identify a campaign or click, not the content.
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|msclkid|mc_cid|mc_eid|ref|ref_src)$', re.IGNORECASE)
+
+
+def normalize_query(query: str) -> str:
+    """Case-folds a search query and collapses whitespace and edge punctuation."""
+    query = re.sub(r'\s+', ' ', query.casefold()).strip()
+    return query.strip(' ?!.,;:')
+
+
+def canonical_url(url: str) -> str:
+    """
+    Reduces a URL to a canonical form so equivalent links share a cache entry.
+
+    Lower-cases the scheme and host, drops default ports, fragments and
+    tracking parameters, sorts the remaining query parameters and removes a
+    trailing slash from non-root paths.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    params = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not TRACKING_PARAMS.match(k))
+    return urlunsplit((scheme, host, path, urlencode(params), ''))
+
+
+class TwoTierCache:
+    """
+    An in-memory LRU in front of a SQLite table, both with TTL expiry.
+
+    Args:
+        namespace: Table name for this cache's entries (e.g. "search").
+        ttl: Seconds an entry stays fresh.
+        path: SQLite file for the disk tier, or None for memory only.
+        max_memory_bytes: Size bound for the memory tier.
+        max_disk_bytes: Size bound for the disk tier.
+    """
+
+    def __init__(self, namespace: str, ttl: float, path: str | None = DEFAULT_CACHE_PATH,
+                 max_memory_bytes: int = 16 * 1024 * 1024, max_disk_bytes: int = 256 * 1024 * 1024):
+        if not re.fullmatch(r'[A-Za-z_]\w*', namespace):
+            raise ValueError(f"Invalid cache namespace: {namespace!r}")
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, size, value)
+        self._memory_bytes = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        self._db = None
+        self._disk_bytes = 0
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    f"CREATE TABLE IF NOT EXISTS {namespace} ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                    "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                self._disk_bytes = self._db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {namespace}").fetchone()[0]
+            except sqlite3.Error as e:
+                print(f"⚠️  [CACHE] Disk cache unavailable ({e}); using memory only.")
+                self._db = None
+
+    def get(self, key: str):
+        """Returns the cached value for `key`, or None if absent or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires_at, _, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                self._drop_memory(key)
+
+            if self._db:
+                row = self._db.execute(
+                    f"SELECT value, expires_at FROM {self.namespace} WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] > now:
+                    self._db.execute(f"UPDATE {self.namespace} SET accessed_at = ? WHERE key = ?", (now, key))
+                    value = json.loads(row[0])
+                    self._store_memory(key, row[1], len(row[0]), value)
+                    self._counters["disk_hits"] += 1
+                    return value
+                if row:
+                    self._db.execute(f"DELETE FROM {self.namespace} WHERE key = ?", (key,))
+                    self._disk_bytes -= len(row[0])
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value):
+        """Stores `value` under `key` in both tiers."""
+        encoded = json.dumps(value, ensure_ascii=False)
+        size = len(encoded)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._store_memory(key, expires_at, size, value)
+            if self._db:
+                old = self._db.execute(f"SELECT size FROM {self.namespace} WHERE key = ?", (key,)).fetchone()
+                self._disk_bytes += size - (old[0] if old else 0)
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.namespace} (key, value, size, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, encoded, size, expires_at, now)
+                )
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict_disk(now)
+
+    def delete(self, key: str):
+        """Removes `key` from both tiers."""
+        with self._lock:
+            self._drop_memory(key)
+            if self._db:
+                row = self._db.execute(f"SELECT size FROM {self.namespace} WHERE key = ?", (key,)).fetchone()
+                if row:
+                    self._db.execute(f"DELETE FROM {self.namespace} WHERE key = ?", (key,))
+                    self._disk_bytes -= row[0]
+
+    def items(self, limit: int | None = None) -> list[tuple[str, object]]:
+        """
+        Returns up to `limit` unexpired (key, value) pairs, least recently
+        used first, without counting as lookups. Reads the disk tier when
+        there is one, else memory.
+        """
+        now = time.time()
+        with self._lock:
+            if self._db:
+                rows = self._db.execute(
+                    f"SELECT key, value FROM {self.namespace} WHERE expires_at > ? ORDER BY accessed_at DESC LIMIT ?",
+                    (now, -1 if limit is None else limit),
+                ).fetchall()
+                return [(key, json.loads(value)) for key, value in reversed(rows)]
+            entries = [(key, value) for key, (expires_at, _, value) in self._memory.items() if expires_at > now]
+            return entries[-limit:] if limit else entries
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and current tier sizes."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            stats["disk_bytes"] = self._disk_bytes
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            return stats
+
+    # --- internals (caller holds self._lock) ---
+
+    def _store_memory(self, key, expires_at, size, value):
+        if size > self.max_memory_bytes:
+            return
+        self._drop_memory(key)
+        self._memory[key] = (expires_at, size, value)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+            self._counters["evictions"] += 1
+
+    def _drop_memory(self, key):
+        entry = self._memory.pop(key, None)
+        if entry:
+            self._memory_bytes -= entry[1]
+
+    def _evict_disk(self, now):
+        # Expired rows go first; only then fall back to least-recently-used.
+        self._db.execute(f"DELETE FROM {self.namespace} WHERE expires_at <= ?", (now,))
+        total = self._db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.namespace}").fetchone()[0]
+        if total > self.max_disk_bytes:
+            rows = self._db.execute(f"SELECT key, size FROM {self.namespace} ORDER BY accessed_at").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= self.max_disk_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            self._db.executemany(f"DELETE FROM {self.namespace} WHERE key = ?", doomed)
+            self._counters["evictions"] += len(doomed)
+        self._disk_bytes = total